@@ -0,0 +1,406 @@
+# ==== Benchmark offline de la ingesta ====
+#
+# Mide el pipeline de embed.py sin gastar cuota de OCI ni levantar Oracle:
+#   1) corpus sintético de PDFs (nº de ficheros, páginas y palabras por página)
+#   2) servicio de embeddings local con el perfil de latencia de OCI
+#      (latencia base + coste por input + jitter lognormal + 429 ocasionales),
+#      detrás del OCIBatchEmbeddings real: lotes, concurrencia, rate limit y
+#      reintentos son los de producción
+#   3) vector store local: una conexión falsa que acepta los executemany del
+#      BulkLoader con una latencia de round trip configurable
+#
+# Cada etapa corre en su propio proceso para que el pico de RSS sea el suyo:
+#   extract   PDFs -> texto (procesos de extract.py)         pages/s
+#   chunk     texto -> chunks (CharacterTextSplitter)         chunks/s
+#   embed     chunks -> vectores (servicio falso)             embeddings/s
+#   insert    vectores -> BulkLoader (vector store falso)     rows/s
+#   pipeline  run_ingestion de punta a punta                  rows/s
+#
+# Uso:
+#   python3 bench_ingest.py [--env .env_<COSTUMER>] [--files 20 --pages 50 --words 400]
+#                           [--output bench.json] [--baseline bench_anterior.json]
+# Con --baseline sale con código 1 si alguna etapa pierde más de --tolerance.
+import argparse
+import array
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from types import SimpleNamespace
+
+STAGES = ("extract", "chunk", "embed", "insert", "pipeline")
+THROUGHPUT = {
+    "extract": "pages_per_second",
+    "chunk": "chunks_per_second",
+    "embed": "embeddings_per_second",
+    "insert": "rows_per_second",
+    "pipeline": "rows_per_second",
+}
+WORDS = (
+    "siebel oracle database vector index query session server client workflow "
+    "configuration repository object business component applet view screen "
+    "integration interface message channel deployment release upgrade patch "
+    "user role access security audit report dashboard record field value "
+    "service request account contact order asset product price quote"
+).split()
+
+
+def load_env_vars(env_file):
+    env_vars = {}
+    try:
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    env_vars[key] = value
+    except FileNotFoundError:
+        print(f"⚠️ File {env_file} not found")
+    return env_vars
+
+
+# ---- 1. Corpus sintético ----
+def page_text(rng, words):
+    sentences, sentence = [], []
+    for _ in range(words):
+        sentence.append(rng.choice(WORDS))
+        if len(sentence) >= rng.randint(8, 20):
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+    if sentence:
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def make_pdf(path, pages, words_per_line=12):
+    # PDF mínimo: catálogo, árbol de páginas, una fuente y un stream de texto por página
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for i, text in enumerate(pages):
+        page_id = 4 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        words = text.split()
+        lines = [" ".join(words[j:j + words_per_line]) for j in range(0, len(words), words_per_line)]
+        stream = "BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_corpus(folder, files, pages, words, seed=42):
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    names = []
+    for i in range(files):
+        name = f"bench_{i:04d}.pdf"
+        path = os.path.join(folder, name)
+        make_pdf(path, [page_text(rng, words) for _ in range(pages)])
+        names.append(name)
+    return names
+
+
+# ---- 2. Servicio de embeddings local ----
+class FakeEmbedClient:
+    """Responde a embed_text como GenerativeAiInferenceClient, con latencia de OCI."""
+
+    def __init__(self, dim=1024, latency_ms=300.0, ms_per_input=3.0, jitter=0.25, throttle_rate=0.01, seed=7):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.ms_per_input = ms_per_input
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+
+    def embed_text(self, details):
+        import oci
+
+        texts = details.inputs
+        delay = (self.latency_ms + self.ms_per_input * len(texts)) / 1000.0
+        time.sleep(delay * self.rng.lognormvariate(0.0, self.jitter))
+        if self.rng.random() < self.throttle_rate:
+            raise oci.exceptions.ServiceError(429, "TooManyRequests", {}, "Fake throttling")
+        return SimpleNamespace(data=SimpleNamespace(embeddings=[fake_vector(text, self.dim) for text in texts]))
+
+
+def fake_vector(text, dim):
+    rng = random.Random(zlib.crc32(text.encode("utf-8")))
+    return [rng.uniform(-0.05, 0.05) for _ in range(dim)]
+
+
+# ---- 3. Vector store local ----
+class FakeCursor:
+    def __init__(self, store):
+        self.store = store
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def execute(self, sql, *args, **kwargs):
+        self.rowcount = 0
+
+    def fetchall(self):
+        return []
+
+    def executemany(self, sql, rows):
+        time.sleep((self.store.batch_ms + self.store.row_us * len(rows) / 1000.0) / 1000.0)
+        for _, vector, metadata, text in rows:
+            self.store.rows += 1
+            self.store.bytes += len(vector) * vector.itemsize + len(metadata) + len(text)
+        self.rowcount = len(rows)
+
+
+class FakeConnection:
+    """Acepta lo que BulkLoader y el manifest le piden a Oracle y sólo cuenta filas."""
+
+    def __init__(self, batch_ms=5.0, row_us=20.0):
+        self.batch_ms = batch_ms
+        self.row_us = row_us
+        self.rows = 0
+        self.bytes = 0
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+# ---- Etapas (cada una en su proceso) ----
+def _peak_rss_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return round(own, 1), round(children, 1)
+
+
+def _read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def _write_jsonl(path, items):
+    with open(path, "w") as f:
+        for item in items:
+            f.write(json.dumps(item) + "\n")
+
+
+def _splitter(args):
+    from langchain.text_splitter import CharacterTextSplitter
+    return CharacterTextSplitter(separator=args.chunk_separator, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+
+
+def _embed_model(args, env_vars):
+    from embed_client import OCIBatchEmbeddings, embed_settings
+    client = FakeEmbedClient(
+        dim=args.dim, latency_ms=args.embed_latency_ms, ms_per_input=args.embed_ms_per_input,
+        jitter=args.embed_jitter, throttle_rate=args.embed_429_rate,
+    )
+    return OCIBatchEmbeddings(client, "bench", "bench", **embed_settings(env_vars))
+
+
+def _batches(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def run_stage(stage, args, env_vars, files):
+    from bulk_loader import BulkLoader, loader_settings
+    from extract import extraction_settings, iter_extracted
+    from ingest import pipeline_settings, run_ingestion
+
+    workdir = args.workdir
+    corpus = os.path.join(workdir, "corpus")
+    batch_size = pipeline_settings(env_vars)["batch_size"]
+    result = {}
+
+    if stage == "extract":
+        t0 = time.perf_counter()
+        pages, texts = 0, []
+        for filename, page_texts, stats in iter_extracted(corpus, files, **extraction_settings(env_vars)):
+            pages += stats["pages"]
+            texts.append({"file": filename, "text": "".join(page + "\n" for page in page_texts if page)})
+        seconds = time.perf_counter() - t0
+        _write_jsonl(os.path.join(workdir, "texts.jsonl"), texts)
+        result = {"pages": pages, "pages_per_second": pages / seconds}
+
+    elif stage == "chunk":
+        texts = _read_jsonl(os.path.join(workdir, "texts.jsonl"))
+        splitter = _splitter(args)
+        t0 = time.perf_counter()
+        chunks = [chunk for item in texts for chunk in splitter.split_text(item["text"])]
+        seconds = time.perf_counter() - t0
+        _write_jsonl(os.path.join(workdir, "chunks.jsonl"), chunks)
+        result = {"chunks": len(chunks), "chunks_per_second": len(chunks) / seconds}
+
+    elif stage == "embed":
+        chunks = _read_jsonl(os.path.join(workdir, "chunks.jsonl"))
+        embed_model = _embed_model(args, env_vars)
+        t0 = time.perf_counter()
+        for batch in _batches(chunks, batch_size):
+            embed_model.embed_documents(batch)
+        seconds = time.perf_counter() - t0
+        metrics = embed_model.metrics()
+        result = {
+            "embeddings": metrics["vectors"], "calls": metrics["calls"], "retries": metrics["retries"],
+            "embeddings_per_second": metrics["vectors"] / seconds,
+        }
+
+    elif stage == "insert":
+        from langchain_core.documents import Document
+        chunks = _read_jsonl(os.path.join(workdir, "chunks.jsonl"))
+        docs = [Document(page_content=text, metadata={"source": "bench", "chunk_id": f"bench_chunk_{i}"})
+                for i, text in enumerate(chunks)]
+        vectors = [array.array("f", fake_vector(text, args.dim)) for text in chunks]
+        conn = FakeConnection(args.insert_batch_ms, args.insert_row_us)
+        loader = BulkLoader(conn, "MY_DEMO", **loader_settings(env_vars))
+        t0 = time.perf_counter()
+        for i in range(0, len(docs), batch_size):
+            loader.add(docs[i:i + batch_size], vectors[i:i + batch_size])
+        loader.finish()
+        seconds = time.perf_counter() - t0
+        result = {"rows": conn.rows, "bytes": conn.bytes, "commits": conn.commits, "rows_per_second": conn.rows / seconds}
+
+    elif stage == "pipeline":
+        conn = FakeConnection(args.insert_batch_ms, args.insert_row_us)
+        stats = run_ingestion(
+            conn, _embed_model(args, env_vars), "MY_DEMO", corpus, files,
+            {name: "bench" for name in files}, "bench", _splitter(args),
+            extraction_settings(env_vars), loader_config=loader_settings(env_vars),
+            **pipeline_settings(env_vars)
+        )
+        result = {
+            "files": stats["files"], "chunks": stats["chunks"], "rows": stats["rows"],
+            "seconds": round(stats["seconds"], 3), "rows_per_second": stats["rows"] / stats["seconds"],
+        }
+
+    result["peak_rss_mb"], result["peak_rss_children_mb"] = _peak_rss_mb()
+    return result
+
+
+# ---- Informe ----
+def print_report(report, baseline=None, tolerance=0.2):
+    print(f"\n📊 Ingestion benchmark — {report['corpus']['files']} files x {report['corpus']['pages']} pages, "
+          f"{report['corpus']['words']} words/page")
+    print(f"  {'stage':<9} {'throughput':>26} {'peak RSS':>10} {'children':>10}  vs baseline")
+    regressions = []
+    for stage in STAGES:
+        result = report["stages"].get(stage)
+        if result is None:
+            continue
+        metric = THROUGHPUT[stage]
+        line = (f"  {stage:<9} {result[metric]:>12.1f} {metric.split('_')[0] + '/s':<13} "
+                f"{result['peak_rss_mb']:>7.1f} MB {result['peak_rss_children_mb']:>7.1f} MB")
+        old = (baseline or {}).get("stages", {}).get(stage)
+        if old:
+            change = result[metric] / old[metric] - 1 if old[metric] else 0.0
+            line += f"  {change:+.1%}"
+            if change < -tolerance:
+                line += " ⚠️"
+                regressions.append(stage)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the embed.py ingestion pipeline")
+    parser.add_argument("--env", help=".env_<COSTUMER> whose EXTRACT_*/EMBED_*/BULK_* settings to use")
+    parser.add_argument("--workdir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_work"))
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--words", type=int, default=400, help="words per page")
+    parser.add_argument("--chunk-separator", default=".")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--embed-latency-ms", type=float, default=300.0)
+    parser.add_argument("--embed-ms-per-input", type=float, default=3.0)
+    parser.add_argument("--embed-jitter", type=float, default=0.25, help="sigma of the lognormal latency jitter")
+    parser.add_argument("--embed-429-rate", type=float, default=0.01)
+    parser.add_argument("--insert-batch-ms", type=float, default=5.0, help="round trip per executemany")
+    parser.add_argument("--insert-row-us", type=float, default=20.0)
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="previous --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop before failing")
+    parser.add_argument("--stage", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    env_vars = load_env_vars(args.env) if args.env else {}
+    corpus = os.path.join(args.workdir, "corpus")
+    files = sorted(f for f in os.listdir(corpus) if f.endswith(".pdf")) if args.stage else None
+
+    # Proceso hijo: una sola etapa, resultado como JSON por stdout
+    if args.stage:
+        result = run_stage(args.stage, args, env_vars, files)
+        sys.stdout.flush()
+        print("BENCH_RESULT " + json.dumps(result))
+        return
+
+    print(f"🧪 Generating corpus in {corpus}...")
+    if os.path.isdir(corpus):
+        for name in os.listdir(corpus):
+            os.remove(os.path.join(corpus, name))
+    generate_corpus(corpus, args.files, args.pages, args.words)
+
+    report = {
+        "corpus": {"files": args.files, "pages": args.pages, "words": args.words},
+        "settings": env_vars,
+        "stages": {},
+    }
+    for stage in [s for s in STAGES if s in args.stages.split(",")]:
+        print(f"⏱️ Stage {stage}...")
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--stage", stage],
+            stdout=subprocess.PIPE, text=True,
+        )
+        lines = [line for line in child.stdout.splitlines() if line.startswith("BENCH_RESULT ")]
+        if child.returncode != 0 or not lines:
+            print(f"❌ Stage {stage} failed (exit {child.returncode})")
+            sys.exit(1)
+        report["stages"][stage] = json.loads(lines[-1][len("BENCH_RESULT "):])
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = print_report(report, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+    if regressions:
+        print(f"❌ Throughput regression in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# ==== Carga masiva de vectores en MY_DEMO ====
+#
+# executemany con array binding: cada lote de BULK_BATCH_SIZE filas va en
+# un solo round trip, con el embedding enlazado como VECTOR nativo
+# (array.array float32) y un commit por lote.
+#
+# BULK_DIRECT_PATH=1 usa INSERT /*+ APPEND_VALUES */ (direct-path): los
+# índices secundarios de la tabla (p.ej. el índice vectorial) se eliminan
+# antes de cargar y se recrean con su DDL original al terminar. El DDL se
+# guarda antes en <VECTOR_TABLE>_INDEX_DDL y el loader se usa como context
+# manager: los índices se recrean aunque la carga falle, y si el proceso
+# muere los recrea restore_indexes en el siguiente run.
+import array
+import hashlib
+import json
+import time
+
+import oracledb
+
+from manifest import forget_index_ddl, pending_index_ddl, save_index_ddl
+
+
+def loader_settings(env_vars):
+    return {
+        "batch_size": int(env_vars.get("BULK_BATCH_SIZE", 1000)),
+        "direct_path": env_vars.get("BULK_DIRECT_PATH", "0") == "1",
+    }
+
+
+def _index_exists(cursor, index_name):
+    cursor.execute("SELECT COUNT(*) FROM user_indexes WHERE index_name = :name", name=index_name)
+    return bool(cursor.fetchone()[0])
+
+
+def _recreate(conn, vector_table, indexes):
+    with conn.cursor() as cursor:
+        for name, ddl in indexes:
+            if not _index_exists(cursor, name):
+                t0 = time.perf_counter()
+                cursor.execute(ddl)
+                print(f"🧱 Rebuilt index {name} in {time.perf_counter() - t0:.1f}s")
+            forget_index_ddl(conn, vector_table, name)
+
+
+def restore_indexes(conn, vector_table):
+    """Recrea los índices que dejó quitados una carga direct-path interrumpida."""
+    pending = pending_index_ddl(conn, vector_table)
+    if pending:
+        print(f"🧱 Restoring {len(pending)} index(es) dropped by an interrupted direct-path load")
+        _recreate(conn, vector_table, pending)
+    return len(pending)
+
+
+def row_id(chunk_id):
+    # Mismo formato de id que OracleVS.add_texts
+    return hashlib.sha256(chunk_id.encode("utf-8")).hexdigest()[:16].upper()
+
+
+class BulkLoader:
+    def __init__(self, conn, vector_table, batch_size=1000, direct_path=False, on_commit=None):
+        self.conn = conn
+        self.vector_table = vector_table
+        self.batch_size = max(1, int(batch_size))
+        self.direct_path = direct_path
+        # on_commit(files) se ejecuta en la misma transacción que el lote que completa esos ficheros
+        self.on_commit = on_commit
+        self.rows = []
+        self.markers = []  # (posición final en self.rows, [ficheros completos])
+        self.index_ddl = []  # [(index_name, ddl)] pendientes de recrear
+        self.stats = {"rows": 0, "batches": 0, "seconds": 0.0}
+        self.started = time.perf_counter()
+
+        hint = "/*+ APPEND_VALUES */ " if direct_path else ""
+        self.sql = f"INSERT {hint}INTO {vector_table} (id, embedding, metadata, text) VALUES (:1, :2, :3, :4)"
+
+        if direct_path:
+            self._drop_secondary_indexes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Con o sin error la tabla no se queda sin sus índices
+        if self.index_ddl:
+            self._recreate_indexes()
+
+    def add(self, docs, vectors, completed=()):
+        self.rows.extend(
+            (row_id(doc.metadata["chunk_id"]), array.array("f", vector), json.dumps(doc.metadata), doc.page_content)
+            for doc, vector in zip(docs, vectors)
+        )
+        if completed:
+            self.markers.append((len(self.rows), list(completed)))
+        while len(self.rows) >= self.batch_size:
+            self._flush(self.batch_size)
+
+    def finish(self):
+        if self.rows or self.markers:
+            self._flush(len(self.rows))
+        if self.index_ddl:
+            self._recreate_indexes()
+        elapsed = time.perf_counter() - self.started
+        self.stats["wall_seconds"] = elapsed
+        self.stats["rows_per_second"] = self.stats["rows"] / elapsed if elapsed > 0 else 0.0
+        return self.stats
+
+    def _flush(self, size):
+        batch = self.rows[:size]
+        del self.rows[:size]
+        completed = [name for end, files in self.markers if end <= size for name in files]
+        self.markers = [(end - size, files) for end, files in self.markers if end > size]
+
+        t0 = time.perf_counter()
+        if batch:
+            with self.conn.cursor() as cursor:
+                cursor.setinputsizes(None, oracledb.DB_TYPE_VECTOR, None, None)
+                cursor.executemany(self.sql, batch)
+        if completed and self.on_commit:
+            self.on_commit(completed)
+        self.conn.commit()
+
+        self.stats["seconds"] += time.perf_counter() - t0
+        self.stats["rows"] += len(batch)
+        self.stats["batches"] += 1
+
+    def _drop_secondary_indexes(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT index_name FROM user_indexes WHERE table_name = :name AND uniqueness = 'NONUNIQUE'",
+                name=self.vector_table.upper(),
+            )
+            names = [row[0] for row in cursor.fetchall()]
+            for name in names:
+                cursor.execute("SELECT DBMS_METADATA.GET_DDL('INDEX', :name) FROM dual", name=name)
+                ddl = cursor.fetchone()[0].read()
+                # Primero a la tabla, luego el DROP: un run que muera aquí no pierde el índice
+                save_index_ddl(self.conn, self.vector_table, name, ddl)
+                self.index_ddl.append((name, ddl))
+                print(f"🧱 Dropping index {name} for direct-path load")
+                cursor.execute(f"DROP INDEX {name}")
+
+    def _recreate_indexes(self):
+        indexes, self.index_ddl = self.index_ddl, []
+        _recreate(self.conn, self.vector_table, indexes)
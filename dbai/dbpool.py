@@ -0,0 +1,92 @@
+# ==== Pool de conexiones Oracle compartido ====
+#
+# Lo usan embed.py (app Flask) y front/api/retrivalai.py (montado en
+# /app/backend dentro del contenedor). Los tamaños se configuran por
+# cliente en .env_<COSTUMER>:
+#
+#   POOL_MIN=1              conexiones abiertas al crear el pool
+#   POOL_MAX=4              máximo de conexiones simultáneas
+#   POOL_INCREMENT=1        conexiones nuevas cuando el pool crece
+#   POOL_STMT_CACHE=50      sentencias cacheadas por conexión
+#   POOL_PING_INTERVAL=0    segundos sin uso antes de hacer ping al sacar
+#                           una conexión (0 = ping en cada checkout)
+#   POOL_WAIT_TIMEOUT=10000 ms máximos esperando una conexión libre
+import threading
+import time
+from contextlib import contextmanager
+
+import oracledb
+
+POOL_DEFAULTS = {
+    "POOL_MIN": 1,
+    "POOL_MAX": 4,
+    "POOL_INCREMENT": 1,
+    "POOL_STMT_CACHE": 50,
+    "POOL_PING_INTERVAL": 0,
+    "POOL_WAIT_TIMEOUT": 10000,
+}
+
+_counters_lock = threading.Lock()
+_counters = {"checkouts": 0, "checkout_wait_ms": 0.0, "max_checkout_wait_ms": 0.0}
+
+
+def pool_settings(env_vars):
+    settings = {}
+    for key, default in POOL_DEFAULTS.items():
+        try:
+            settings[key] = int(env_vars.get(key, default))
+        except (TypeError, ValueError):
+            settings[key] = default
+    return settings
+
+
+def create_pool_from_env(env_vars, user="sys"):
+    settings = pool_settings(env_vars)
+    dsn = f"{env_vars['IP']}:{env_vars['PORT']}/freepdb1"
+    pool = oracledb.create_pool(
+        user=user,
+        password=env_vars["ORACLE_PWD"],
+        dsn=dsn,
+        mode=oracledb.AUTH_MODE_SYSDBA,
+        min=settings["POOL_MIN"],
+        max=settings["POOL_MAX"],
+        increment=settings["POOL_INCREMENT"],
+        stmtcachesize=settings["POOL_STMT_CACHE"],
+        ping_interval=settings["POOL_PING_INTERVAL"],
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+        wait_timeout=settings["POOL_WAIT_TIMEOUT"],
+    )
+    return pool
+
+
+@contextmanager
+def connection(pool):
+    start = time.perf_counter()
+    conn = pool.acquire()
+    waited_ms = (time.perf_counter() - start) * 1000
+    with _counters_lock:
+        _counters["checkouts"] += 1
+        _counters["checkout_wait_ms"] += waited_ms
+        _counters["max_checkout_wait_ms"] = max(_counters["max_checkout_wait_ms"], waited_ms)
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def pool_stats(pool):
+    with _counters_lock:
+        counters = dict(_counters)
+    checkouts = counters["checkouts"]
+    return {
+        "opened": pool.opened,
+        "busy": pool.busy,
+        "min": pool.min,
+        "max": pool.max,
+        "increment": pool.increment,
+        "stmtcachesize": pool.stmtcachesize,
+        "ping_interval": pool.ping_interval,
+        "checkouts": checkouts,
+        "avg_checkout_wait_ms": round(counters["checkout_wait_ms"] / checkouts, 3) if checkouts else 0.0,
+        "max_checkout_wait_ms": round(counters["max_checkout_wait_ms"], 3),
+    }
@@ -1,17 +1,22 @@
 import os
 import sys
 import json
-import oracledb
-from PyPDF2 import PdfReader
 from langchain.text_splitter import CharacterTextSplitter
-from langchain_core.documents import Document
 from langchain_community.vectorstores.oraclevs import OracleVS
 from langchain_community.vectorstores.utils import DistanceStrategy
-from langchain_community.embeddings import OCIGenAIEmbeddings
-from langchain.chains import RetrievalQA
-from langchain_community.llms import OCIGenAI
 import oci
-from flask import Flask, request, jsonify
+from dbpool import create_pool_from_env
+from bulk_loader import loader_settings, restore_indexes
+from embed_client import OCIBatchEmbeddings
+from embedding_store import EmbeddingStore, StoredEmbeddings
+from extract import extraction_settings
+from ingest import pipeline_settings, run_ingestion
+from vector_index import index_settings, refresh_after_ingestion
+from text_index import text_index_settings, refresh_text_index
+from manifest import (
+    ensure_manifest_table, params_hash, plan_ingestion, print_plan,
+    delete_source_rows, forget_file, bump_corpus_version, table_exists,
+)
 
 # ==== Cargar archivo .env personalizado ====
 def load_env_vars(env_file=".env"):
@@ -31,10 +36,11 @@ def load_env_vars(env_file=".env"):
 
 # ==== Leer COSTUMER desde argumento ====
 if len(sys.argv) < 2:
-    print("❌ Missing COSTUMER argument. Usage: python3 embed.py <COSTUMER>")
+    print("❌ Missing COSTUMER argument. Usage: python3 embed.py <COSTUMER> [--dry-run]")
     sys.exit(1)
 
 costumer = sys.argv[1]
+DRY_RUN = "--dry-run" in sys.argv[2:]
 env_file = f".env_{costumer}"
 print(f"📦 Loading environment variables from {env_file}...")
 
@@ -62,123 +68,123 @@ FOLDER_PATH = VOLUME_PATH
 DSN = f"{IP}:{PORT}/freepdb1"
 USER = "sys"
 EMBED_MODEL_ID = "cohere.embed-english-v3.0"
-LLM_MODEL_ID = "cohere.command-english-v3.0"
 ENDPOINT = "https://inference.generativeai.us-chicago-1.oci.oraclecloud.com"
 
-# ==== CONEXIÓN A ORACLE DB ====
-print(f"🔌 Configuring Oracle DB connection on port {PORT}...")
-try:
-    conn = oracledb.connect(user=USER, password=PASS, dsn=DSN, mode=oracledb.AUTH_MODE_SYSDBA)
-    print("✅ Oracle DB connection successful")
-except Exception as e:
-    print("❌ Connection error:", e)
-    sys.exit(1)
-
-# ========== CONFIG ==========
-CONFIG_PROFILE = "DEFAULT"
-COMPARTMENT_ID = "ocid1.compartment.oc1..aaaaaaaanb4wwcxt27nwxmwad6ddxckr6f6h7biazhouccnfjfq5acvbjd6q"
-VECTOR_TABLE = "MY_DEMO"
-FOLDER_PATH = VOLUME_PATH
-DSN = f"{IP}:{PORT}/freepdb1"  # Dynamic port from .env
-USER = "sys"
-EMBED_MODEL_ID = "cohere.embed-english-v3.0"
-LLM_MODEL_ID = "cohere.command-english-v3.0"
-ENDPOINT = "https://inference.generativeai.us-chicago-1.oci.oraclecloud.com"
-
-# ========== ORACLE CONNECTION ==========
-print(f"🔌 Configuring Oracle DB connection on port {PORT}...")
+# Chunking: si cambia cualquiera de estos valores se re-ingestan todos los PDFs
+CHUNK_SEPARATOR = "."
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 100
+CHUNK_PARAMS_HASH = params_hash(
+    separator=CHUNK_SEPARATOR,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    embed_model=EMBED_MODEL_ID,
+)
 
+# ==== POOL DE CONEXIONES A ORACLE DB ====
+# Tamaños por cliente con POOL_MIN / POOL_MAX / POOL_INCREMENT / POOL_STMT_CACHE en .env_<COSTUMER>
+print(f"🔌 Configuring Oracle DB connection pool on port {PORT}...")
 try:
-    conn = oracledb.connect(user=USER, password=PASS, dsn=DSN, mode=oracledb.AUTH_MODE_SYSDBA)
-    print("✅ Oracle DB connection successful")
+    pool = create_pool_from_env(env_vars, user=USER)
+    conn = pool.acquire()
+    print(f"✅ Oracle DB connection pool ready ({pool.opened} open, max {pool.max})")
 except Exception as e:
     print("❌ Connection error:", e)
-    exit()
+    sys.exit(1)
 
 # ========== OCI CONFIG ==========
 config = oci.config.from_file("~/.oci/config", CONFIG_PROFILE)
 
-# ========== EMBEDDINGS ==========
-pdf_files = [f for f in os.listdir(FOLDER_PATH) if f.endswith(".pdf")]
-all_chunks = []
-
-for filename in pdf_files:
-    filepath = os.path.join(FOLDER_PATH, filename)
-    print(f"📄 Processing file: {filename}")
-    reader = PdfReader(filepath)
-    text = ""
-    for page in reader.pages:
-        extracted = page.extract_text()
-        if extracted:
-            text += extracted + "\n"
-
-    splitter = CharacterTextSplitter(separator=".", chunk_size=2000, chunk_overlap=100)
-    chunks = splitter.split_text(text)
-
-    for i, chunk in enumerate(chunks):
-        all_chunks.append(Document(
-            page_content=chunk,
-            metadata={"source": filename, "chunk_id": f"{filename}_chunk_{i}"}
-        ))
-
-print("🔖 Chunks generated")
-
-embed_model = OCIGenAIEmbeddings(
-    model_id=EMBED_MODEL_ID,
-    service_endpoint=ENDPOINT,
-    compartment_id=COMPARTMENT_ID
-)
-
-print("🚀 Starting embedding and chunk insertion...")
-OracleVS.from_documents(
-    all_chunks,
-    embed_model,
-    client=conn,
-    table_name=VECTOR_TABLE,
-    distance_strategy=DistanceStrategy.DOT_PRODUCT
-)
-
-print("✅ Vector store completed and inserted into table MY_DEMO")
-
-# ========== FLASK BACKEND ==========
-app = Flask(__name__)
-
-llm = OCIGenAI(
-    model_id=LLM_MODEL_ID,
-    service_endpoint=ENDPOINT,
-    compartment_id=COMPARTMENT_ID
-)
-
-qa = RetrievalQA.from_chain_type(
-    llm=llm,
-    retriever=OracleVS(
-        embedding_function=embed_model,
+# ========== INGESTION PLAN (manifest) ==========
+pdf_files = sorted(f for f in os.listdir(FOLDER_PATH) if f.endswith(".pdf"))
+
+plan = plan_ingestion(conn, VECTOR_TABLE, FOLDER_PATH, pdf_files, CHUNK_PARAMS_HASH)
+print_plan(plan, dry_run=DRY_RUN)
+
+if DRY_RUN:
+    pool.release(conn)
+    sys.exit(0)
+
+ensure_manifest_table(conn, VECTOR_TABLE)
+# Índices que dejó quitados una carga direct-path que murió a mitad
+restore_indexes(conn, VECTOR_TABLE)
+
+# Borrar filas de PDFs modificados o eliminados antes de volver a insertar.
+# También las de los "nuevos": un run que falló a mitad de un PDF deja sus
+# lotes ya confirmados sin entrada en el manifest (y los ids son deterministas)
+stale_sources = plan["changed"] + plan["deleted"]
+if plan["new"] and table_exists(conn, VECTOR_TABLE):
+    stale_sources = plan["new"] + stale_sources
+for filename in stale_sources:
+    removed = delete_source_rows(conn, VECTOR_TABLE, filename)
+    if removed or filename not in plan["new"]:
+        print(f"🧹 Removed {removed} rows for {filename}")
+for filename in plan["deleted"]:
+    forget_file(conn, VECTOR_TABLE, filename)
+conn.commit()
+
+# ========== EMBEDDINGS (pipeline en streaming) ==========
+files_to_process = plan["new"] + plan["changed"]
+
+# Lotes de EMBED_MAX_INPUTS, EMBED_CONCURRENCY en vuelo, rate limit y reintentos en 429/5xx
+embed_model = OCIBatchEmbeddings.from_env(env_vars, config, ENDPOINT, EMBED_MODEL_ID, COMPARTMENT_ID)
+
+# Chunks ya embebidos en runs anteriores (mismo modelo y mismo texto) no se vuelven a pedir
+embed_store = EmbeddingStore.from_env(env_vars, EMBED_MODEL_ID)
+if embed_store is not None:
+    print(f"🗃️ Embedding store: {len(embed_store)} vectors in {embed_store.directory}")
+    embed_model = StoredEmbeddings(embed_model, embed_store)
+
+if files_to_process:
+    # Crea MY_DEMO si aún no existe (OracleVS detecta la dimensión del modelo)
+    OracleVS(
         client=conn,
+        embedding_function=embed_model,
         table_name=VECTOR_TABLE,
         distance_strategy=DistanceStrategy.DOT_PRODUCT
-    ).as_retriever(search_kwargs={"k": 1}),
-    return_source_documents=True
-)
-
-@app.route("/api/v1/chatbot", methods=["POST"])
-def chatbot():
-    data = request.get_json()
-    question = data.get("question", "")
-
-    if not question:
-        return jsonify({"success": False, "error": "Question is empty"}), 400
-
-    result = qa.invoke({"query": question})
-    source_doc = result["source_documents"][0]
-    source_file = source_doc.metadata.get("source", "unknown")
-
-    return jsonify({
-        "success": True,
-        "question": question,
-        "response": result["result"],
-        "source_file": source_file
-    })
-
-# Don't run the server automatically — you trigger it manually with curl
-
-
+    )
+
+    extract_config = extraction_settings(env_vars)
+    print(f"🚀 Starting streaming ingestion of {len(files_to_process)} files with {extract_config['workers']} extraction workers...")
+    splitter = CharacterTextSplitter(separator=CHUNK_SEPARATOR, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    stats = run_ingestion(
+        conn, embed_model, VECTOR_TABLE, FOLDER_PATH, files_to_process,
+        plan["hashes"], CHUNK_PARAMS_HASH, splitter, extract_config,
+        loader_config=loader_settings(env_vars),
+        **pipeline_settings(env_vars)
+    )
+    print(
+        f"✅ Vector store completed: {stats['rows']} chunks from {stats['files']} files inserted into table MY_DEMO "
+        f"in {stats['seconds']:.1f}s (embed {stats['embed_seconds']:.1f}s, insert {stats['insert_seconds']:.1f}s)"
+    )
+    print(
+        f"📈 Bulk load: {stats['loader']['rows_per_second']:.1f} rows/s over {stats['loader']['batches']} batches"
+    )
+    embed_metrics = embed_model.metrics()
+    print(
+        f"📈 Embeddings: {embed_metrics['texts_per_second']:.1f} texts/s, {embed_metrics['vectors_per_second']:.1f} vectors/s, "
+        f"{embed_metrics['calls']} calls, {embed_metrics['retries']} retries"
+    )
+    if embed_store is not None:
+        print(f"🗃️ Embedding store: {embed_metrics['reused']} vectors reused, {embed_metrics['computed']} freshly computed")
+else:
+    print("✅ Nothing new to embed, MY_DEMO is up to date")
+
+# ========== VECTOR INDEX ==========
+# Si hubo carga en direct-path el BulkLoader ya recreó el índice al terminar
+# (después de los borrados); un run que sólo borra filas sí tiene que refrescarlo
+index_rebuilt = bool(files_to_process) and loader_settings(env_vars)["direct_path"]
+table_changed = bool(files_to_process or plan["deleted"])
+refresh_after_ingestion(conn, VECTOR_TABLE, index_settings(env_vars), table_changed and not index_rebuilt)
+
+# Índice léxico para la búsqueda híbrida: SYNC (ON COMMIT) lo mantiene al día, aquí sólo se crea u optimiza
+refresh_text_index(conn, VECTOR_TABLE, text_index_settings(env_vars), table_changed)
+
+# Nueva versión del corpus: invalida la cache de respuestas de la retrieval
+if table_changed:
+    print(f"🔖 Corpus version {bump_corpus_version(conn, VECTOR_TABLE)}")
+pool.release(conn)
+
+# La parte de chat (antes una app Flask que nunca se servía) está en
+# front/api/chat_service.py: este script sólo ingesta
+pool.close()
@@ -0,0 +1,131 @@
+# ==== Cliente de embeddings por lotes para la ingesta ====
+#
+# Sustituye a OCIGenAIEmbeddings en embed.py:
+#   - parte la lista en lotes de EMBED_MAX_INPUTS (límite del servicio)
+#   - mantiene hasta EMBED_CONCURRENCY lotes en vuelo
+#   - limita las llamadas con un token bucket (EMBED_RATE_PER_SEC / EMBED_BURST)
+#   - reintenta 429 y 5xx con backoff exponencial + jitter (EMBED_MAX_RETRIES)
+#   - cuenta textos, vectores, llamadas y reintentos para sacar texts/s y vectors/s
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import oci
+from langchain_core.embeddings import Embeddings
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate = float(rate_per_second)
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def embed_settings(env_vars):
+    burst = env_vars.get("EMBED_BURST")
+    return {
+        "max_inputs": int(env_vars.get("EMBED_MAX_INPUTS", 96)),
+        "concurrency": int(env_vars.get("EMBED_CONCURRENCY", 4)),
+        "rate_per_second": float(env_vars.get("EMBED_RATE_PER_SEC", 10)),
+        "burst": int(burst) if burst else None,
+        "max_retries": int(env_vars.get("EMBED_MAX_RETRIES", 6)),
+    }
+
+
+class OCIBatchEmbeddings(Embeddings):
+    def __init__(self, client, model_id, compartment_id, max_inputs=96, concurrency=4,
+                 rate_per_second=10.0, burst=None, max_retries=6, truncate="END"):
+        self.client = client
+        self.model_id = model_id
+        self.compartment_id = compartment_id
+        self.max_inputs = max(1, int(max_inputs))
+        self.concurrency = max(1, int(concurrency))
+        self.max_retries = int(max_retries)
+        self.truncate = truncate
+        self.bucket = TokenBucket(rate_per_second, burst if burst is not None else concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        self._lock = threading.Lock()
+        self._metrics = {"texts": 0, "vectors": 0, "calls": 0, "retries": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_env(cls, env_vars, config, endpoint, model_id, compartment_id):
+        client = oci.generative_ai_inference.GenerativeAiInferenceClient(
+            config=config,
+            service_endpoint=endpoint,
+            retry_strategy=oci.retry.NoneRetryStrategy(),
+            timeout=(10, 240)
+        )
+        return cls(client, model_id, compartment_id, **embed_settings(env_vars))
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._metrics[key] += value
+
+    def _embed_batch(self, texts):
+        details = oci.generative_ai_inference.models.EmbedTextDetails(
+            serving_mode=oci.generative_ai_inference.models.OnDemandServingMode(model_id=self.model_id),
+            inputs=texts,
+            truncate=self.truncate,
+            compartment_id=self.compartment_id
+        )
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                response = self.client.embed_text(details)
+                self._count(calls=1)
+                return response.data.embeddings
+            except oci.exceptions.ServiceError as e:
+                self._count(calls=1)
+                if e.status not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    raise
+            except (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout):
+                self._count(calls=1)
+                if attempt >= self.max_retries:
+                    raise
+            attempt += 1
+            self._count(retries=1)
+            time.sleep(min(60.0, 2 ** attempt) * (0.5 + random.random() / 2))
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        started = time.perf_counter()
+        batches = [texts[i:i + self.max_inputs] for i in range(0, len(texts), self.max_inputs)]
+        vectors = []
+        # map conserva el orden de los lotes
+        for embeddings in self.executor.map(self._embed_batch, batches):
+            vectors.extend(embeddings)
+        self._count(texts=len(texts), vectors=len(vectors), seconds=time.perf_counter() - started)
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        seconds = metrics["seconds"]
+        metrics["texts_per_second"] = metrics["texts"] / seconds if seconds else 0.0
+        metrics["vectors_per_second"] = metrics["vectors"] / seconds if seconds else 0.0
+        return metrics
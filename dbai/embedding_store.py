@@ -0,0 +1,194 @@
+# ==== Almacén de embeddings de chunks direccionado por contenido ====
+#
+# Guarda cada vector calculado bajo la clave (modelo, SHA-256 del texto del
+# chunk). Si un PDF cambia sólo en parte, o se reingesta con el mismo
+# chunking, los chunks que no cambiaron no vuelven a pasar por el servicio
+# de embeddings.
+#
+# Formato en disco, un directorio por modelo en EMBED_STORE_DIR:
+#   meta.json     {"model_id", "dim"}
+#   keys.bin      digests de 32 bytes, uno por vector, en orden de escritura
+#   vectors.f32   float32 * dim por vector, mismo orden (se lee con mmap)
+#   store.lock    flock: abrir y escribir se serializan entre procesos
+# Sólo se añade al final: un corte a mitad de escritura deja un vector
+# huérfano al final de vectors.f32 que se descarta al abrir. Los vectores
+# recién escritos también se leen del mmap (se rehace tras cada escritura),
+# así que la memoria no crece con el corpus. Para vaciar el almacén basta
+# con borrar el directorio.
+#
+# Configurable en .env_<COSTUMER>:
+#   EMBED_STORE=1                 0 para desactivarlo
+#   EMBED_STORE_DIR=<dbai>/embed_store
+import array
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embed_store")
+DIGEST_SIZE = 32
+
+
+def text_digest(model_id, text):
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    def __init__(self, directory, model_id):
+        self.model_id = model_id
+        self.directory = os.path.join(directory, model_id.replace("/", "_"))
+        self.keys_path = os.path.join(self.directory, "keys.bin")
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.lock_path = os.path.join(self.directory, "store.lock")
+        self.lock = threading.Lock()
+        self.dim = None
+        self.slots = {}
+        self.count = 0  # vectores en disco ya indexados en slots
+        self.map = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def from_env(cls, env_vars, model_id):
+        if env_vars.get("EMBED_STORE", "1") == "0":
+            return None
+        return cls(env_vars.get("EMBED_STORE_DIR", DEFAULT_DIR), model_id)
+
+    @contextmanager
+    def _file_lock(self):
+        # El almacén se comparte entre runs (y clientes): claves y vectores
+        # se escriben en dos ficheros, sólo un proceso a la vez
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return False
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        if meta["model_id"] != self.model_id:
+            raise ValueError(f"Embedding store {self.directory} belongs to {meta['model_id']}")
+        self.dim = int(meta["dim"])
+        return True
+
+    def _load(self):
+        with self.lock, self._file_lock():
+            if not self._read_meta():
+                return
+            self._drop_torn_tail()
+            self._sync()
+
+    def _drop_torn_tail(self):
+        # Con el flock tomado nadie está escribiendo: lo que sobre al final es
+        # una escritura incompleta (de un run anterior o de otro proceso que
+        # murió después de abrir éste) y se descarta, para que lo siguiente
+        # que se añada vuelva a quedar en la misma posición en los dos ficheros
+        count = min(self._size(self.keys_path) // DIGEST_SIZE, self._size(self.vectors_path) // (self.dim * 4))
+        for path, size in ((self.keys_path, count * DIGEST_SIZE), (self.vectors_path, count * self.dim * 4)):
+            if self._size(path) > size:
+                os.truncate(path, size)
+
+    @staticmethod
+    def _size(path):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _sync(self):
+        """Indexa los vectores que hay en disco desde la última vez (propios o de otro proceso)."""
+        record = self.dim * 4
+        count = min(self._size(self.keys_path) // DIGEST_SIZE, self._size(self.vectors_path) // record)
+        if count <= self.count:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self.count * DIGEST_SIZE)
+            keys = f.read((count - self.count) * DIGEST_SIZE)
+        with open(self.vectors_path, "rb") as f:
+            # Se publica el mmap nuevo antes que los slots que apuntan a él
+            self.map = mmap.mmap(f.fileno(), count * record, access=mmap.ACCESS_READ)
+        for i in range(count - self.count):
+            self.slots[keys[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]] = self.count + i
+        self.count = count
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, digest):
+        slot = self.slots.get(digest)
+        if slot is None:
+            return None
+        record = self.dim * 4
+        return array.array("f", self.map[slot * record:(slot + 1) * record]).tolist()
+
+    def put_many(self, items):
+        if not items:
+            return
+        with self.lock, self._file_lock():
+            if self.dim is None and not self._read_meta():
+                self.dim = len(items[0][1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+            for _, vector in items:
+                if len(vector) != self.dim:
+                    raise ValueError(f"Expected {self.dim}-dimensional vector, got {len(vector)}")
+            self._drop_torn_tail()
+            self._sync()
+            items = [(digest, vector) for digest, vector in dict(items).items() if digest not in self.slots]
+            if not items:
+                return
+            # Vectores primero, claves después: una clave nunca apunta a un vector a medias
+            with open(self.vectors_path, "ab") as f:
+                for _, vector in items:
+                    f.write(array.array("f", vector).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(digest for digest, _ in items))
+            self._sync()
+
+
+class StoredEmbeddings(Embeddings):
+    """Consulta el almacén antes de llamar al servicio de embeddings (sólo embed_documents)."""
+
+    def __init__(self, embeddings, store):
+        self.embeddings = embeddings
+        self.store = store
+        self._lock = threading.Lock()
+        self.counts = {"reused": 0, "computed": 0}
+
+    def embed_documents(self, texts):
+        digests = [text_digest(self.store.model_id, text) for text in texts]
+        vectors = [self.store.get(digest) for digest in digests]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            # Chunks repetidos dentro del mismo lote se piden una sola vez
+            unique = list({digests[i]: i for i in reversed(missing)}.values())
+            computed = dict(zip(
+                (digests[i] for i in unique),
+                self.embeddings.embed_documents([texts[i] for i in unique]),
+            ))
+            for i in missing:
+                vectors[i] = computed[digests[i]]
+            self.store.put_many(list(computed.items()))
+            missing = unique
+
+        with self._lock:
+            self.counts["reused"] += len(texts) - len(missing)
+            self.counts["computed"] += len(missing)
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def metrics(self):
+        metrics = self.embeddings.metrics()
+        with self._lock:
+            metrics.update(self.counts)
+        return metrics
@@ -0,0 +1,138 @@
+# ==== Extracción paralela de texto de PDFs ====
+#
+# Reparte la extracción en un pool de procesos por rangos de páginas, de
+# modo que un manual de cientos de páginas usa todos los cores. El orden
+# de las páginas se mantiene y cada página tiene un timeout propio: si
+# extract_text() se cuelga en una página patológica, esa página queda
+# vacía y el resto del fichero sigue.
+#
+# Configurable en .env_<COSTUMER>:
+#   EXTRACT_WORKERS=<cores>     procesos de extracción
+#   EXTRACT_PAGES_PER_TASK=25   páginas por tarea
+#   EXTRACT_PAGE_TIMEOUT=30     segundos máximos por página
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise PageTimeout()
+
+
+def _extract_range(path, start, end, page_timeout):
+    started = time.perf_counter()
+    reader = PdfReader(path)
+    texts = []
+    timeouts = 0
+    errors = 0
+    signal.signal(signal.SIGALRM, _on_alarm)
+    for index in range(start, end):
+        signal.setitimer(signal.ITIMER_REAL, page_timeout)
+        try:
+            texts.append(reader.pages[index].extract_text() or "")
+        except PageTimeout:
+            texts.append("")
+            timeouts += 1
+        except Exception:
+            texts.append("")
+            errors += 1
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return texts, timeouts, errors, time.perf_counter() - started
+
+
+def extraction_settings(env_vars):
+    return {
+        "workers": int(env_vars.get("EXTRACT_WORKERS", os.cpu_count() or 1)),
+        "pages_per_task": int(env_vars.get("EXTRACT_PAGES_PER_TASK", 25)),
+        "page_timeout": float(env_vars.get("EXTRACT_PAGE_TIMEOUT", 30)),
+    }
+
+
+def _ready():
+    return os.getpid()
+
+
+def extraction_pool(workers=None):
+    """Pool de extracción con todos sus procesos ya creados.
+
+    fork explícito: embed.py es un script y no debe re-ejecutarse en los
+    hijos. Con fork el pool crea todos sus procesos en el primer submit, así
+    que se hace aquí, antes de que quien lo usa arranque otros hilos (ingest.py):
+    un fork con hilos en marcha puede heredar locks tomados y colgar al hijo.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    executor.submit(_ready).result()
+    return executor
+
+
+def iter_extracted(folder, filenames, workers=None, pages_per_task=25, page_timeout=30.0, executor=None):
+    """Genera (filename, páginas, stats) en el mismo orden que filenames.
+
+    Sólo se adelantan `workers` ficheros a la vez, así la memoria no crece
+    con el tamaño del corpus. Con executor (extraction_pool) usa ese pool;
+    si no, crea uno propio y lo cierra al terminar.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    if executor is None:
+        with extraction_pool(workers) as executor:
+            yield from _iter_extracted(executor, folder, filenames, workers, pages_per_task, page_timeout)
+    else:
+        yield from _iter_extracted(executor, folder, filenames, workers, pages_per_task, page_timeout)
+
+
+def _iter_extracted(executor, folder, filenames, workers, pages_per_task, page_timeout):
+    inflight = deque()
+    pending_files = iter(filenames)
+
+    def submit_next():
+        for filename in pending_files:
+            path = os.path.join(folder, filename)
+            try:
+                page_count = len(PdfReader(path).pages)
+            except Exception as e:
+                print(f"⚠️ Cannot open {filename}: {e}")
+                page_count = 0
+            futures = [
+                executor.submit(_extract_range, path, start, min(start + pages_per_task, page_count), page_timeout)
+                for start in range(0, page_count, pages_per_task)
+            ]
+            inflight.append((filename, page_count, time.perf_counter(), futures))
+            return
+
+    for _ in range(workers):
+        submit_next()
+
+    while inflight:
+        filename, page_count, submitted_at, futures = inflight.popleft()
+        pages = []
+        timeouts = errors = 0
+        cpu_seconds = 0.0
+        for future in futures:
+            texts, range_timeouts, range_errors, seconds = future.result()
+            pages.extend(texts)
+            timeouts += range_timeouts
+            errors += range_errors
+            cpu_seconds += seconds
+        submit_next()
+
+        wall_seconds = time.perf_counter() - submitted_at
+        yield filename, pages, {
+            "pages": page_count,
+            "chars": sum(len(text) for text in pages),
+            "timeouts": timeouts,
+            "errors": errors,
+            "wall_seconds": wall_seconds,
+            "pages_per_second": page_count / wall_seconds if wall_seconds > 0 else 0.0,
+            "worker_seconds": cpu_seconds,
+        }
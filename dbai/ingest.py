@@ -0,0 +1,168 @@
+# ==== Pipeline de ingesta en streaming ====
+#
+#   extract (procesos) -> chunk -> [cola] -> embed por lotes -> [cola] -> insert por lotes
+#
+# Las colas están acotadas, así que la memoria máxima no depende del
+# tamaño del corpus: si Oracle va lento el embedding espera, y si el
+# embedding va lento la extracción espera. La inserción la hace
+# BulkLoader (commit por lote), y el manifest de un PDF se actualiza en
+# la misma transacción que su último chunk: si la ingesta falla a mitad,
+# lo ya insertado queda y el siguiente run continúa desde ahí.
+#
+# Configurable en .env_<COSTUMER>:
+#   EMBED_BATCH_SIZE=384     chunks por lote de embedding (se reparte en llamadas
+#                            de EMBED_MAX_INPUTS en paralelo)
+#   CHUNK_QUEUE_SIZE=8       ficheros troceados esperando embedding
+#   INSERT_QUEUE_SIZE=4      lotes embebidos esperando insert
+import queue
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from bulk_loader import BulkLoader
+from extract import extraction_pool, iter_extracted
+from manifest import record_file
+
+_DONE = object()
+
+
+def pipeline_settings(env_vars):
+    return {
+        "batch_size": int(env_vars.get("EMBED_BATCH_SIZE", 384)),
+        "chunk_queue_size": int(env_vars.get("CHUNK_QUEUE_SIZE", 8)),
+        "insert_queue_size": int(env_vars.get("INSERT_QUEUE_SIZE", 4)),
+    }
+
+
+class _Stage(threading.Thread):
+    def __init__(self, name, target, errors):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self._errors = errors
+
+    def run(self):
+        try:
+            self._target_fn()
+        except BaseException as e:
+            self._errors.append(e)
+
+
+def _put(q, item, errors):
+    # put/get con espera acotada para no quedarse bloqueado si otra etapa murió
+    while True:
+        if errors:
+            raise RuntimeError("Another stage failed")
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q, errors):
+    while True:
+        if errors:
+            raise RuntimeError("Another stage failed")
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+
+
+def run_ingestion(conn, embed_model, vector_table, folder, files, hashes, current_params_hash,
+                  splitter, extract_config, loader_config=None, batch_size=384,
+                  chunk_queue_size=8, insert_queue_size=4):
+    chunk_queue = queue.Queue(maxsize=chunk_queue_size)
+    insert_queue = queue.Queue(maxsize=insert_queue_size)
+    errors = []
+    chunk_counts = {}
+    stats = {"files": 0, "chunks": 0, "rows": 0, "embed_seconds": 0.0, "insert_seconds": 0.0}
+    started = time.perf_counter()
+
+    # ---- Etapa embed: agrupa chunks de uno o varios ficheros en lotes ----
+    def embed_stage():
+        buffer = []
+        files_in_buffer = []  # (filename, posición final de sus chunks en buffer)
+
+        def flush(size):
+            docs = buffer[:size]
+            completed = [name for name, end in files_in_buffer if end <= size]
+            del buffer[:size]
+            files_in_buffer[:] = [(name, end - size) for name, end in files_in_buffer if end > size]
+            vectors = []
+            if docs:
+                t0 = time.perf_counter()
+                vectors = embed_model.embed_documents([doc.page_content for doc in docs])
+                stats["embed_seconds"] += time.perf_counter() - t0
+            _put(insert_queue, (docs, vectors, completed), errors)
+
+        while True:
+            item = _get(chunk_queue, errors)
+            if item is _DONE:
+                break
+            filename, docs = item
+            buffer.extend(docs)
+            files_in_buffer.append((filename, len(buffer)))
+            while len(buffer) >= batch_size:
+                flush(batch_size)
+        if buffer or files_in_buffer:
+            flush(len(buffer))
+        _put(insert_queue, _DONE, errors)
+
+    # ---- Etapa insert: BulkLoader + manifest de ficheros completos ----
+    def record_completed(files):
+        for filename in files:
+            record_file(conn, vector_table, filename, hashes[filename], current_params_hash, chunk_counts[filename])
+        stats["files"] += len(files)
+
+    def insert_stage():
+        with BulkLoader(conn, vector_table, on_commit=record_completed, **(loader_config or {})) as loader:
+            while True:
+                item = _get(insert_queue, errors)
+                if item is _DONE:
+                    break
+                docs, vectors, completed = item
+                loader.add(docs, vectors, completed)
+                elapsed = time.perf_counter() - started
+                print(f"💾 Inserted {loader.stats['rows']} rows ({loader.stats['rows'] / elapsed:.1f} rows/s), {stats['files']} files complete")
+            stats["loader"] = loader.finish()
+        stats["rows"] = stats["loader"]["rows"]
+        stats["insert_seconds"] = stats["loader"]["seconds"]
+
+    # Los procesos de extracción (fork) se crean antes de arrancar los hilos
+    executor = extraction_pool(extract_config.get("workers"))
+    stages = [_Stage("embed", embed_stage, errors), _Stage("insert", insert_stage, errors)]
+    for stage in stages:
+        stage.start()
+
+    # ---- Etapa extract + chunk (hilo principal) ----
+    try:
+        for filename, pages, extract_stats in iter_extracted(folder, files, executor=executor, **extract_config):
+            print(
+                f"📄 Processed file: {filename} — {extract_stats['pages']} pages in {extract_stats['wall_seconds']:.1f}s "
+                f"({extract_stats['pages_per_second']:.1f} pages/s, {extract_stats['timeouts']} timeouts, "
+                f"{extract_stats['errors']} errors)"
+            )
+            text = "".join(page + "\n" for page in pages if page)
+            chunks = splitter.split_text(text)
+            chunk_counts[filename] = len(chunks)
+            stats["chunks"] += len(chunks)
+            docs = [
+                Document(page_content=chunk, metadata={"source": filename, "chunk_id": f"{filename}_chunk_{i}"})
+                for i, chunk in enumerate(chunks)
+            ]
+            _put(chunk_queue, (filename, docs), errors)
+        _put(chunk_queue, _DONE, errors)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        executor.shutdown()
+
+    for stage in stages:
+        stage.join()
+    if errors:
+        raise errors[0]
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
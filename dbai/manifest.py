@@ -0,0 +1,222 @@
+# ==== Manifest de ingesta incremental ====
+#
+# Una fila por PDF ingerido en <VECTOR_TABLE>_MANIFEST, junto a la tabla
+# de vectores: hash SHA-256 del contenido + hash de los parámetros de
+# chunking/embedding. Con eso embed.py sólo procesa PDFs nuevos o
+# modificados y borra de la tabla de vectores los que ya no existen.
+#
+# <VECTOR_TABLE>_CORPUS guarda además la versión del corpus: un id nuevo
+# cada vez que una ingesta cambia la tabla de vectores. La retrieval la
+# usa para invalidar su cache de respuestas.
+#
+# <VECTOR_TABLE>_INDEX_DDL guarda el DDL de los índices que el BulkLoader
+# quita para una carga direct-path mientras no se hayan recreado: si el
+# run muere a mitad, el siguiente los recrea (bulk_loader.restore_indexes).
+import hashlib
+import json
+import os
+import uuid
+
+import oracledb
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def manifest_table(vector_table):
+    return f"{vector_table}_MANIFEST"
+
+
+def corpus_table(vector_table):
+    return f"{vector_table}_CORPUS"
+
+
+def index_ddl_table(vector_table):
+    return f"{vector_table}_INDEX_DDL"
+
+
+def _table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) FROM user_tables WHERE table_name = :name",
+        name=table.upper(),
+    )
+    return bool(cursor.fetchone()[0])
+
+
+def table_exists(conn, table):
+    with conn.cursor() as cursor:
+        return _table_exists(cursor, table)
+
+
+def ensure_manifest_table(conn, vector_table):
+    with conn.cursor() as cursor:
+        if not _table_exists(cursor, manifest_table(vector_table)):
+            cursor.execute(f"""
+                CREATE TABLE {manifest_table(vector_table)} (
+                    source       VARCHAR2(1024) PRIMARY KEY,
+                    content_hash VARCHAR2(64) NOT NULL,
+                    params_hash  VARCHAR2(64) NOT NULL,
+                    chunk_count  NUMBER NOT NULL,
+                    ingested_at  TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+                )""")
+        if not _table_exists(cursor, corpus_table(vector_table)):
+            cursor.execute(f"""
+                CREATE TABLE {corpus_table(vector_table)} (
+                    version    VARCHAR2(64) NOT NULL,
+                    updated_at TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+                )""")
+        if not _table_exists(cursor, index_ddl_table(vector_table)):
+            cursor.execute(f"""
+                CREATE TABLE {index_ddl_table(vector_table)} (
+                    index_name VARCHAR2(128) PRIMARY KEY,
+                    ddl        CLOB NOT NULL,
+                    dropped_at TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+                )""")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def params_hash(**params):
+    payload = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(conn, vector_table):
+    with conn.cursor() as cursor:
+        # Sin tabla todavía (primer run o --dry-run, que no crea nada): manifest vacío
+        if not _table_exists(cursor, manifest_table(vector_table)):
+            return {}
+        cursor.execute(
+            f"SELECT source, content_hash, params_hash, chunk_count FROM {manifest_table(vector_table)}"
+        )
+        return {
+            source: {"content_hash": content, "params_hash": params, "chunk_count": count}
+            for source, content, params, count in cursor
+        }
+
+
+def plan_ingestion(conn, vector_table, folder, pdf_files, current_params_hash):
+    manifest = load_manifest(conn, vector_table)
+    plan = {"new": [], "changed": [], "unchanged": [], "deleted": [], "hashes": {}}
+
+    for filename in pdf_files:
+        content_hash = file_sha256(os.path.join(folder, filename))
+        plan["hashes"][filename] = content_hash
+        entry = manifest.get(filename)
+        if entry is None:
+            plan["new"].append(filename)
+        elif entry["content_hash"] != content_hash or entry["params_hash"] != current_params_hash:
+            plan["changed"].append(filename)
+        else:
+            plan["unchanged"].append(filename)
+
+    present = set(pdf_files)
+    plan["deleted"] = sorted(source for source in manifest if source not in present)
+    plan["stale_chunks"] = sum(
+        manifest[source]["chunk_count"] for source in plan["changed"] + plan["deleted"]
+    )
+    return plan
+
+
+def print_plan(plan, dry_run=False):
+    header = "🧪 Dry run — nothing will be written" if dry_run else "🗂️ Ingestion plan"
+    print(header)
+    for label, key in (("➕ New", "new"), ("♻️ Changed", "changed"), ("🗑️ Deleted", "deleted"), ("✔️ Unchanged", "unchanged")):
+        files = plan[key]
+        print(f"  {label}: {len(files)}")
+        if key != "unchanged":
+            for filename in files:
+                print(f"     - {filename}")
+    print(f"  Rows to remove from vector table: {plan['stale_chunks']}")
+
+
+def delete_source_rows(conn, vector_table, source):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {vector_table} WHERE JSON_VALUE(metadata, '$.source') = :source",
+            source=source,
+        )
+        return cursor.rowcount
+
+
+def record_file(conn, vector_table, source, content_hash, current_params_hash, chunk_count):
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            MERGE INTO {manifest_table(vector_table)} m
+            USING (SELECT :source AS source FROM dual) s
+            ON (m.source = s.source)
+            WHEN MATCHED THEN UPDATE SET
+                content_hash = :content_hash, params_hash = :params_hash,
+                chunk_count = :chunk_count, ingested_at = SYSTIMESTAMP
+            WHEN NOT MATCHED THEN INSERT (source, content_hash, params_hash, chunk_count)
+                VALUES (:source, :content_hash, :params_hash, :chunk_count)""",
+            source=source, content_hash=content_hash,
+            params_hash=current_params_hash, chunk_count=chunk_count,
+        )
+
+
+def forget_file(conn, vector_table, source):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {manifest_table(vector_table)} WHERE source = :source",
+            source=source,
+        )
+
+
+def save_index_ddl(conn, vector_table, index_name, ddl):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {index_ddl_table(vector_table)} (index_name, ddl) VALUES (:name, :ddl)",
+            name=index_name, ddl=ddl,
+        )
+    conn.commit()
+
+
+def forget_index_ddl(conn, vector_table, index_name):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {index_ddl_table(vector_table)} WHERE index_name = :name",
+            name=index_name,
+        )
+    conn.commit()
+
+
+def pending_index_ddl(conn, vector_table):
+    """[(index_name, ddl)] de índices quitados por una carga direct-path que no terminó."""
+    with conn.cursor() as cursor:
+        if not _table_exists(cursor, index_ddl_table(vector_table)):
+            return []
+        cursor.execute(f"SELECT index_name, ddl FROM {index_ddl_table(vector_table)} ORDER BY dropped_at")
+        return [(name, ddl.read() if hasattr(ddl, "read") else ddl) for name, ddl in cursor.fetchall()]
+
+
+def bump_corpus_version(conn, vector_table):
+    version = uuid.uuid4().hex
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {corpus_table(vector_table)} SET version = :version, updated_at = SYSTIMESTAMP",
+            version=version,
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                f"INSERT INTO {corpus_table(vector_table)} (version) VALUES (:version)",
+                version=version,
+            )
+    conn.commit()
+    return version
+
+
+def corpus_version(conn, vector_table):
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT version FROM {corpus_table(vector_table)}")
+            row = cursor.fetchone()
+    except oracledb.DatabaseError:
+        # Todavía no hubo ninguna ingesta con manifest
+        return "none"
+    return row[0] if row else "none"
@@ -0,0 +1,124 @@
+import pytest
+
+import bulk_loader
+from bulk_loader import BulkLoader, restore_indexes
+
+
+class FakeLob:
+    def __init__(self, text):
+        self.text = text
+
+    def read(self):
+        return self.text
+
+
+class FakeDb:
+    """Índices y tabla de DDL pendiente en memoria; sólo lo que usan BulkLoader y manifest."""
+
+    def __init__(self, indexes):
+        self.indexes = dict(indexes)  # name -> ddl
+        self.saved = {}
+        self.created = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def setinputsizes(self, *args):
+        pass
+
+    def executemany(self, sql, rows):
+        self.rowcount = len(rows)
+
+    def execute(self, sql, **binds):
+        db = self.db
+        if "uniqueness = 'NONUNIQUE'" in sql:
+            self.result = [(name,) for name in db.indexes]
+        elif "DBMS_METADATA" in sql:
+            self.result = [(FakeLob(db.indexes[binds["name"]]),)]
+        elif sql.startswith("DROP INDEX"):
+            del db.indexes[sql.split()[-1]]
+        elif sql.startswith("CREATE INDEX"):
+            name = sql.split()[2]
+            db.indexes[name] = sql
+            db.created.append(name)
+        elif "FROM user_indexes WHERE index_name" in sql:
+            self.result = [(int(binds["name"] in db.indexes),)]
+        elif "FROM user_tables" in sql:
+            self.result = [(1,)]
+        elif sql.startswith("INSERT INTO MY_DEMO_INDEX_DDL"):
+            db.saved[binds["name"]] = binds["ddl"]
+        elif sql.startswith("DELETE FROM MY_DEMO_INDEX_DDL"):
+            db.saved.pop(binds["name"], None)
+        elif "FROM MY_DEMO_INDEX_DDL" in sql:
+            self.result = list(db.saved.items())
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+INDEXES = {"MY_DEMO_VEC_IDX": "CREATE INDEX MY_DEMO_VEC_IDX ON MY_DEMO (embedding)"}
+
+
+def test_direct_path_recreates_indexes_on_finish():
+    db = FakeDb(INDEXES)
+    with BulkLoader(db, "MY_DEMO", direct_path=True) as loader:
+        assert db.indexes == {}
+        assert db.saved == INDEXES
+        loader.finish()
+    assert db.indexes == INDEXES
+    assert db.saved == {}
+
+
+def test_direct_path_recreates_indexes_when_load_fails():
+    db = FakeDb(INDEXES)
+    with pytest.raises(RuntimeError):
+        with BulkLoader(db, "MY_DEMO", direct_path=True):
+            raise RuntimeError("embed stage failed")
+    assert db.indexes == INDEXES
+    assert db.saved == {}
+
+
+def test_killed_load_is_repaired_by_restore_indexes():
+    db = FakeDb(INDEXES)
+    BulkLoader(db, "MY_DEMO", direct_path=True)  # el proceso "muere" sin cerrar el loader
+    assert db.indexes == {}
+
+    assert restore_indexes(db, "MY_DEMO") == 1
+    assert db.indexes == INDEXES
+    assert db.saved == {}
+    assert restore_indexes(db, "MY_DEMO") == 0
+
+
+def test_restore_skips_indexes_that_already_exist():
+    db = FakeDb(INDEXES)
+    db.saved = dict(INDEXES)  # murió después de recrear y antes de borrar el DDL
+    restore_indexes(db, "MY_DEMO")
+    assert db.created == []
+    assert db.saved == {}
+
+
+def test_row_id_is_deterministic():
+    assert bulk_loader.row_id("a.pdf_chunk_0") == bulk_loader.row_id("a.pdf_chunk_0")
+    assert len(bulk_loader.row_id("a.pdf_chunk_0")) == 16
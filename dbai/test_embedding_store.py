@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+
+import pytest
+
+from embedding_store import EmbeddingStore, text_digest
+
+MODEL = "test/model"
+
+
+def item(text):
+    # Vector distinto por texto: un vector desemparejado no pasa por el bueno
+    digest = text_digest(MODEL, text)
+    return digest, [float(b) for b in digest[:3]]
+
+
+def open_store(tmp_path):
+    return EmbeddingStore(str(tmp_path), MODEL)
+
+
+def test_put_and_get_roundtrip(tmp_path):
+    store = open_store(tmp_path)
+    store.put_many([item("alpha"), item("beta")])
+    digest, vector = item("alpha")
+    assert store.get(digest) == vector
+    assert store.get(text_digest(MODEL, "missing")) is None
+
+    reopened = open_store(tmp_path)
+    assert len(reopened) == 2
+    assert reopened.get(digest) == vector
+
+
+def test_other_model_is_rejected(tmp_path):
+    store = open_store(tmp_path)
+    store.put_many([item("alpha")])
+    os.rename(store.directory, os.path.join(str(tmp_path), "other"))
+    with pytest.raises(ValueError, match=MODEL):
+        EmbeddingStore(str(tmp_path), "other")
+
+
+def test_missing_keys_file_is_empty(tmp_path):
+    store = open_store(tmp_path)
+    store.put_many([item("alpha")])
+    os.remove(store.keys_path)
+    reopened = open_store(tmp_path)
+    assert len(reopened) == 0
+    reopened.put_many([item("beta")])
+    digest, vector = item("beta")
+    assert open_store(tmp_path).get(digest) == vector
+
+
+def test_torn_write_at_open_is_dropped(tmp_path):
+    store = open_store(tmp_path)
+    store.put_many([item("alpha")])
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\0" * 7)
+    reopened = open_store(tmp_path)
+    assert len(reopened) == 1
+    assert os.path.getsize(reopened.vectors_path) == 3 * 4
+
+
+def test_torn_write_from_second_writer(tmp_path):
+    # Otro proceso escribe vectores y muere antes de escribir sus claves,
+    # después de que este proceso abriera el almacén
+    store = open_store(tmp_path)
+    store.put_many([item("alpha")])
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\x01" * (2 * 3 * 4 + 5))
+
+    store.put_many([item("beta"), item("gamma")])
+    for text in ("alpha", "beta", "gamma"):
+        digest, vector = item(text)
+        assert store.get(digest) == vector
+
+    reopened = open_store(tmp_path)
+    assert len(reopened) == 3
+    for text in ("alpha", "beta", "gamma"):
+        digest, vector = item(text)
+        assert reopened.get(digest) == vector
+
+
+def _writer(directory, worker):
+    store = EmbeddingStore(directory, MODEL)
+    for batch in range(10):
+        store.put_many([item(f"{worker}-{batch}-{i}") for i in range(5)])
+
+
+def test_concurrent_writers_keep_keys_and_vectors_paired(tmp_path):
+    workers = [multiprocessing.Process(target=_writer, args=(str(tmp_path), n)) for n in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    store = open_store(tmp_path)
+    assert len(store) == 3 * 10 * 5
+    for worker in range(3):
+        for batch in range(10):
+            for i in range(5):
+                digest, vector = item(f"{worker}-{batch}-{i}")
+                assert store.get(digest) == vector
@@ -0,0 +1,42 @@
+import os
+
+from bench_ingest import make_pdf
+from extract import extraction_pool, iter_extracted
+
+
+def write_corpus(folder, pages_per_file):
+    names = []
+    for i, pages in enumerate(pages_per_file):
+        name = f"doc_{i}.pdf"
+        make_pdf(os.path.join(folder, name), [f"file {i} page {p} text" for p in range(pages)])
+        names.append(name)
+    return names
+
+
+def test_pages_come_back_in_order(tmp_path):
+    names = write_corpus(str(tmp_path), [3, 7, 1])
+    results = list(iter_extracted(str(tmp_path), names, workers=2, pages_per_task=2))
+
+    assert [name for name, _, _ in results] == names
+    for i, (_, pages, stats) in enumerate(results):
+        assert stats["pages"] == len(pages)
+        for p, text in enumerate(pages):
+            assert f"file {i} page {p} text" in text
+
+
+def test_unreadable_file_yields_no_pages(tmp_path):
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+    [(name, pages, stats)] = list(iter_extracted(str(tmp_path), ["broken.pdf"], workers=1))
+    assert name == "broken.pdf"
+    assert pages == []
+    assert stats["pages"] == 0
+
+
+def test_extraction_pool_forks_every_worker_up_front(tmp_path):
+    # ingest.py arranca sus hilos después: no puede quedar ningún fork pendiente
+    with extraction_pool(3) as executor:
+        assert len(executor._processes) == 3
+        names = write_corpus(str(tmp_path), [2, 2])
+        results = list(iter_extracted(str(tmp_path), names, workers=3, executor=executor))
+        assert [name for name, _, _ in results] == names
+        assert len(executor._processes) == 3
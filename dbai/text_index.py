@@ -0,0 +1,160 @@
+# ==== Índice de texto (Oracle Text) de MY_DEMO ====
+#
+# Índice léxico sobre la columna text para la búsqueda híbrida de la
+# retrieval (RETRIEVAL_HYBRID=1 en front/api/vector_search.py): códigos
+# de error, nombres de objetos Siebel o términos RODOD/DBE que la búsqueda
+# por producto escalar no siempre encuentra.
+#
+# Es un índice CONTEXT con SYNC (ON COMMIT): cada commit de la ingesta
+# (inserts del BulkLoader, borrados de PDFs modificados) lo mantiene al
+# día, sin reconstrucciones. embed.py lo crea si falta y lo optimiza al
+# terminar una ingesta con cambios (los sync por commit lo fragmentan).
+#
+# Configurable en .env_<COSTUMER>:
+#   TEXT_INDEX=1                     0 para no crearlo
+#   TEXT_INDEX_PRINTJOINS=_-         caracteres que no parten tokens (S_CONTACT, ORA-01418)
+#   TEXT_INDEX_OPTIMIZE=1            OPTIMIZE_INDEX FAST tras cada ingesta con cambios
+#
+# En direct-path el BulkLoader lo elimina y lo recrea con su DDL como al
+# resto de índices secundarios.
+#
+# Uso manual: python3 text_index.py <COSTUMER> create|rebuild|drop|optimize|status
+import sys
+import time
+
+import oracledb
+
+
+def text_index_settings(env_vars):
+    return {
+        "enabled": env_vars.get("TEXT_INDEX", "1") == "1",
+        "printjoins": env_vars.get("TEXT_INDEX_PRINTJOINS", "_-"),
+        "optimize": env_vars.get("TEXT_INDEX_OPTIMIZE", "1") == "1",
+    }
+
+
+def text_index_name(vector_table):
+    return f"{vector_table}_TXT_IDX"
+
+
+def lexer_name(vector_table):
+    return f"{vector_table}_TXT_LEXER"
+
+
+def text_index_ddl(vector_table):
+    return (
+        f"CREATE INDEX {text_index_name(vector_table)} ON {vector_table} (text) "
+        f"INDEXTYPE IS CTXSYS.CONTEXT "
+        f"PARAMETERS ('LEXER {lexer_name(vector_table)} SYNC (ON COMMIT)')"
+    )
+
+
+def text_index_status(conn, vector_table):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT index_name, status, domidx_opstatus FROM user_indexes "
+            "WHERE table_name = :name AND ityp_name = 'CONTEXT'",
+            name=vector_table.upper(),
+        )
+        return [
+            {"name": name, "status": status, "opstatus": opstatus}
+            for name, status, opstatus in cursor
+        ]
+
+
+def create_lexer(conn, vector_table, settings):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            BEGIN
+                BEGIN
+                    CTX_DDL.DROP_PREFERENCE(:name);
+                EXCEPTION WHEN OTHERS THEN NULL;
+                END;
+                CTX_DDL.CREATE_PREFERENCE(:name, 'BASIC_LEXER');
+                IF :printjoins IS NOT NULL THEN
+                    CTX_DDL.SET_ATTRIBUTE(:name, 'PRINTJOINS', :printjoins);
+                END IF;
+            END;""",
+            name=lexer_name(vector_table),
+            printjoins=settings["printjoins"] or None,
+        )
+
+
+def create_text_index(conn, vector_table, settings):
+    t0 = time.perf_counter()
+    create_lexer(conn, vector_table, settings)
+    with conn.cursor() as cursor:
+        cursor.execute(text_index_ddl(vector_table))
+    print(f"🔤 Created text index {text_index_name(vector_table)} in {time.perf_counter() - t0:.1f}s")
+
+
+def drop_text_index(conn, vector_table):
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(f"DROP INDEX {text_index_name(vector_table)}")
+            print(f"🗑️ Dropped text index {text_index_name(vector_table)}")
+        except oracledb.DatabaseError as e:
+            # ORA-01418: el índice no existe
+            if e.args[0].code != 1418:
+                raise
+
+
+def optimize_text_index(conn, vector_table):
+    t0 = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.callproc("CTX_DDL.OPTIMIZE_INDEX", [text_index_name(vector_table), "FAST"])
+    print(f"🔤 Optimized text index {text_index_name(vector_table)} in {time.perf_counter() - t0:.1f}s")
+
+
+def refresh_text_index(conn, vector_table, settings, changed):
+    if not settings["enabled"]:
+        return
+    try:
+        if not text_index_status(conn, vector_table):
+            create_text_index(conn, vector_table, settings)
+        elif changed and settings["optimize"]:
+            optimize_text_index(conn, vector_table)
+    except oracledb.DatabaseError as e:
+        # La ingesta ya está confirmada: sin índice la retrieval se queda en sólo vectorial
+        print(f"⚠️ Text index not refreshed: {e}")
+
+
+# ==== CLI ====
+def load_env_vars(env_file=".env"):
+    env_vars = {}
+    try:
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    env_vars[key] = value
+    except FileNotFoundError:
+        print(f"⚠️ File {env_file} not found")
+    return env_vars
+
+
+if __name__ == "__main__":
+    from dbpool import create_pool_from_env, connection
+
+    actions = ("create", "rebuild", "drop", "optimize", "status")
+    if len(sys.argv) < 3 or sys.argv[2] not in actions:
+        print(f"❌ Usage: python3 text_index.py <COSTUMER> {'|'.join(actions)}")
+        sys.exit(1)
+
+    env_vars = load_env_vars(f".env_{sys.argv[1]}")
+    action = sys.argv[2]
+    table = "MY_DEMO"
+    settings = text_index_settings(env_vars)
+
+    pool = create_pool_from_env(env_vars)
+    with connection(pool) as conn:
+        if action in ("drop", "rebuild"):
+            drop_text_index(conn, table)
+        if action in ("create", "rebuild"):
+            create_text_index(conn, table, settings)
+        elif action == "optimize":
+            optimize_text_index(conn, table)
+        for index in text_index_status(conn, table):
+            print(f"🔤 {index['name']}: {index['status']} ({index['opstatus']})")
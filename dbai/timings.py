@@ -0,0 +1,108 @@
+# ==== Tiempos por etapa, histogramas Prometheus y trace log ====
+#
+# Opt-in con STAGE_TIMINGS=1 (.env_<COSTUMER> o entorno). Lo usan
+# front/api/retrivalai.py y front/api/chat_service.py (dbai/ se monta en
+# /app/backend):
+#   - StageTimer acumula segundos por etapa de una petición; la salida
+#     JSON los lleva en ms bajo la clave `timings`
+#   - StageHistograms los agrega para /metrics (formato de texto Prometheus)
+#   - write_trace añade una línea JSON por petición a TRACE_LOG_PATH,
+#     con el request id que llega del controlador de Node
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DEFAULT_TRACE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trace.jsonl")
+
+_trace_lock = threading.Lock()
+
+
+def timings_enabled(env_vars=None):
+    return (env_vars if env_vars is not None else os.environ).get("STAGE_TIMINGS", "0") == "1"
+
+
+class StageTimer:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.seconds = {}
+        self.lock = threading.Lock()
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        # Tiempo desde el último lap (o desde que se creó el timer)
+        now = time.perf_counter()
+        self.add(name, now - self.last)
+        self.last = now
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def as_ms(self):
+        with self.lock:
+            return {name: round(seconds * 1000, 1) for name, seconds in self.seconds.items()}
+
+
+class StageHistograms:
+    def __init__(self, name, help_text, buckets=BUCKETS, label="stage"):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self.series = {}  # stage -> [cuentas por bucket..., suma, total]
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            series = self.series.setdefault(stage, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def observe_timer(self, timer):
+        for stage, seconds in timer.seconds.items():
+            self.observe(stage, seconds)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for stage, series in sorted(self.series.items()):
+                labels = f'{self.label}="{stage}"'
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return "\n".join(lines) + "\n"
+
+
+def write_trace(service, request_id, timings_ms, **fields):
+    record = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()) + "Z",
+        "service": service,
+        "request_id": request_id,
+        "pid": os.getpid(),
+        "timings": timings_ms,
+        **fields,
+    }
+    path = os.getenv("TRACE_LOG_PATH", DEFAULT_TRACE_PATH)
+    try:
+        with _trace_lock, open(path, "a") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ Cannot write trace log {path}: {e}")
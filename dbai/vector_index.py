@@ -0,0 +1,146 @@
+# ==== Gestión del índice vectorial de MY_DEMO ====
+#
+# Sin índice cada pregunta hace un full scan de la tabla. Este módulo
+# crea, reconstruye y elimina un índice HNSW o IVF sobre la columna
+# embedding; embed.py lo refresca al terminar cada ingesta.
+#
+# Configurable en .env_<COSTUMER>:
+#   VECTOR_INDEX_TYPE=IVF            IVF | HNSW | NONE
+#   VECTOR_INDEX_ACCURACY=95         target accuracy por defecto del índice
+#   VECTOR_INDEX_NEIGHBORS=32        HNSW: vecinos por nodo (M)
+#   VECTOR_INDEX_EFCONSTRUCTION=200  HNSW: candidatos durante la construcción
+#   VECTOR_INDEX_PARTITIONS=         IVF: particiones (vacío = automático)
+#   VECTOR_INDEX_REBUILD=1           reconstruir tras cada ingesta con cambios
+#
+# HNSW vive en el vector pool: requiere VECTOR_MEMORY_SIZE > 0 en la base.
+#
+# Uso manual: python3 vector_index.py <COSTUMER> create|rebuild|drop|status
+import sys
+import time
+
+import oracledb
+
+
+def index_settings(env_vars):
+    return {
+        "type": env_vars.get("VECTOR_INDEX_TYPE", "IVF").upper(),
+        "accuracy": int(env_vars.get("VECTOR_INDEX_ACCURACY", 95)),
+        "neighbors": int(env_vars.get("VECTOR_INDEX_NEIGHBORS", 32)),
+        "efconstruction": int(env_vars.get("VECTOR_INDEX_EFCONSTRUCTION", 200)),
+        "partitions": int(env_vars["VECTOR_INDEX_PARTITIONS"]) if env_vars.get("VECTOR_INDEX_PARTITIONS") else None,
+        "rebuild": env_vars.get("VECTOR_INDEX_REBUILD", "1") == "1",
+    }
+
+
+def index_name(vector_table):
+    return f"{vector_table}_VEC_IDX"
+
+
+def index_ddl(vector_table, settings):
+    name = index_name(vector_table)
+    accuracy = f"WITH TARGET ACCURACY {settings['accuracy']}"
+    if settings["type"] == "HNSW":
+        return (
+            f"CREATE VECTOR INDEX {name} ON {vector_table} (embedding) "
+            f"ORGANIZATION INMEMORY NEIGHBOR GRAPH DISTANCE DOT {accuracy} "
+            f"PARAMETERS (TYPE HNSW, NEIGHBORS {settings['neighbors']}, "
+            f"EFCONSTRUCTION {settings['efconstruction']})"
+        )
+    if settings["type"] == "IVF":
+        parameters = ""
+        if settings["partitions"]:
+            parameters = f" PARAMETERS (TYPE IVF, NEIGHBOR PARTITIONS {settings['partitions']})"
+        return (
+            f"CREATE VECTOR INDEX {name} ON {vector_table} (embedding) "
+            f"ORGANIZATION NEIGHBOR PARTITIONS DISTANCE DOT {accuracy}{parameters}"
+        )
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE: {settings['type']}")
+
+
+def index_status(conn, vector_table):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT index_name, index_subtype, status FROM user_indexes "
+            "WHERE table_name = :name AND index_type = 'VECTOR'",
+            name=vector_table.upper(),
+        )
+        return [
+            {"name": name, "subtype": subtype, "status": status}
+            for name, subtype, status in cursor
+        ]
+
+
+def create_index(conn, vector_table, settings):
+    ddl = index_ddl(vector_table, settings)
+    t0 = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute(ddl)
+    print(f"🧭 Created {settings['type']} vector index {index_name(vector_table)} in {time.perf_counter() - t0:.1f}s")
+
+
+def drop_index(conn, vector_table):
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(f"DROP INDEX {index_name(vector_table)}")
+            print(f"🗑️ Dropped vector index {index_name(vector_table)}")
+        except oracledb.DatabaseError as e:
+            # ORA-01418: el índice no existe
+            if e.args[0].code != 1418:
+                raise
+
+
+def rebuild_index(conn, vector_table, settings):
+    drop_index(conn, vector_table)
+    create_index(conn, vector_table, settings)
+
+
+def refresh_after_ingestion(conn, vector_table, settings, changed):
+    if settings["type"] == "NONE":
+        return
+    try:
+        if not index_status(conn, vector_table):
+            create_index(conn, vector_table, settings)
+        elif changed and settings["rebuild"]:
+            rebuild_index(conn, vector_table, settings)
+    except oracledb.DatabaseError as e:
+        # La ingesta ya está confirmada: sin índice la búsqueda sigue funcionando (full scan)
+        print(f"⚠️ Vector index not refreshed: {e}")
+
+
+# ==== CLI ====
+def load_env_vars(env_file=".env"):
+    env_vars = {}
+    try:
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    env_vars[key] = value
+    except FileNotFoundError:
+        print(f"⚠️ File {env_file} not found")
+    return env_vars
+
+
+if __name__ == "__main__":
+    from dbpool import create_pool_from_env, connection
+
+    if len(sys.argv) < 3 or sys.argv[2] not in ("create", "rebuild", "drop", "status"):
+        print("❌ Usage: python3 vector_index.py <COSTUMER> create|rebuild|drop|status")
+        sys.exit(1)
+
+    env_vars = load_env_vars(f".env_{sys.argv[1]}")
+    action = sys.argv[2]
+    table = "MY_DEMO"
+    settings = index_settings(env_vars)
+
+    pool = create_pool_from_env(env_vars)
+    with connection(pool) as conn:
+        if action == "create":
+            create_index(conn, table, settings)
+        elif action == "rebuild":
+            rebuild_index(conn, table, settings)
+        elif action == "drop":
+            drop_index(conn, table)
+        for index in index_status(conn, table):
+            print(f"🧭 {index['name']}: {index['subtype']} ({index['status']})")
@@ -0,0 +1,170 @@
+# ----------------------------------------
+# Control de admisión del chat: preguntas en curso acotadas y cola limitada
+#
+# Sin límite una ráfaga de 50 preguntas son 50 pipelines a la vez (cada uno
+# con su sesión de Oracle y dos llamadas al LLM) y la máquina se hunde.
+# Antes de lanzar el pipeline cada pregunta pide un hueco:
+#
+#   1) Entra directamente si hay hueco global (CHAT_MAX_CONCURRENCY) y de
+#      su cliente (CHAT_TENANT_MAX_CONCURRENCY)
+#   2) Si no, espera en una cola FIFO acotada; al liberarse un hueco entra
+#      la primera cuyo cliente esté por debajo de su límite (un cliente
+#      saturado no bloquea a los de detrás)
+#   3) Se rechaza enseguida, con Retry-After, si la cola está llena, si la
+#      espera estimada ya supera CHAT_QUEUE_TIMEOUT_S o si se agota
+#      esperando: 429 cuando es el cliente el que se pasa de su parte de
+#      la cola, 503 cuando es el servicio el que no da más
+#
+# La espera estimada usa la media móvil de lo que tarda una pregunta.
+#
+#   CHAT_MAX_QUEUE=32                preguntas esperando como mucho
+#   CHAT_QUEUE_TIMEOUT_S=15          espera máxima en la cola
+#   CHAT_TENANT_MAX_CONCURRENCY=0    en curso por cliente (0 = sin límite propio)
+#   CHAT_TENANT_MAX_QUEUE=0          en cola por cliente (0 = sin límite propio)
+# ----------------------------------------
+import asyncio
+import collections
+import math
+import os
+import time
+
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Rejected(Exception):
+    def __init__(self, status, reason, message, retry_after, waited=0.0):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+        self.waited = waited
+
+
+def admission_settings(max_in_flight):
+    return {
+        "max_in_flight": max_in_flight,
+        "max_queue": int(os.getenv("CHAT_MAX_QUEUE", "32")),
+        "queue_timeout": float(os.getenv("CHAT_QUEUE_TIMEOUT_S", "15")),
+        "tenant_max_in_flight": int(os.getenv("CHAT_TENANT_MAX_CONCURRENCY", "0")) or max_in_flight,
+        "tenant_max_queue": int(os.getenv("CHAT_TENANT_MAX_QUEUE", "0")),
+    }
+
+
+class Admission:
+    """Huecos para el pipeline. Todo se usa desde el hilo del event loop."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.in_flight = 0
+        self.tenants = collections.Counter()
+        self.queued = collections.Counter()
+        self.queue = collections.deque()
+        self.admitted = 0
+        self.rejected = collections.Counter()
+        self.service_time = None
+
+    def _has_room(self, tenant):
+        return (
+            self.in_flight < self.settings["max_in_flight"]
+            and self.tenants[tenant] < self.settings["tenant_max_in_flight"]
+        )
+
+    def _admit(self, tenant):
+        self.in_flight += 1
+        self.tenants[tenant] += 1
+        self.admitted += 1
+
+    def estimated_wait(self):
+        if self.service_time is None:
+            return None
+        return self.service_time * (len(self.queue) + 1) / self.settings["max_in_flight"]
+
+    def retry_after(self):
+        return max(1, math.ceil(self.estimated_wait() or self.settings["queue_timeout"]))
+
+    def _reject(self, status, reason, message, waited=0.0):
+        self.rejected[reason] += 1
+        return Rejected(status, reason, message, self.retry_after(), waited)
+
+    def check(self, tenant):
+        """Lanza Rejected si la pregunta no va a poder entrar; no reserva nada."""
+        if self.queued[tenant] == 0 and self._has_room(tenant):
+            return
+        tenant_max_queue = self.settings["tenant_max_queue"]
+        if tenant_max_queue and self.queued[tenant] >= tenant_max_queue:
+            raise self._reject(429, "tenant_queue_full", "Demasiadas preguntas en cola para este cliente.")
+        if len(self.queue) >= self.settings["max_queue"]:
+            raise self._reject(503, "queue_full", "El servicio está saturado, inténtalo más tarde.")
+        estimated = self.estimated_wait()
+        if estimated is not None and estimated > self.settings["queue_timeout"]:
+            raise self._reject(503, "overloaded", "El servicio está saturado, inténtalo más tarde.")
+
+    async def acquire(self, tenant):
+        """Espera un hueco para tenant. Devuelve los segundos en cola o lanza Rejected."""
+        self.check(tenant)
+        if self.queued[tenant] == 0 and self._has_room(tenant):
+            self._admit(tenant)
+            return 0.0
+
+        entry = (tenant, asyncio.get_running_loop().create_future())
+        self.queue.append(entry)
+        self.queued[tenant] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(entry[1], self.settings["queue_timeout"])
+        except asyncio.TimeoutError:
+            self._leave(entry)
+            raise self._reject(
+                503, "queue_timeout", "Tiempo de espera en cola agotado, inténtalo más tarde.",
+                time.monotonic() - started,
+            ) from None
+        except asyncio.CancelledError:
+            # El hueco pudo concederse justo antes de la cancelación
+            if entry[1].done() and not entry[1].cancelled():
+                self.release(tenant)
+            else:
+                self._leave(entry)
+            raise
+        return time.monotonic() - started
+
+    def _leave(self, entry):
+        try:
+            self.queue.remove(entry)
+        except ValueError:
+            return
+        self.queued[entry[0]] -= 1
+
+    def release(self, tenant, seconds=None):
+        self.in_flight -= 1
+        self.tenants[tenant] -= 1
+        if self.tenants[tenant] <= 0:
+            del self.tenants[tenant]
+        if seconds is not None:
+            self.service_time = seconds if self.service_time is None else (
+                SERVICE_TIME_ALPHA * seconds + (1 - SERVICE_TIME_ALPHA) * self.service_time
+            )
+        self._dispatch()
+
+    def _dispatch(self):
+        for entry in list(self.queue):
+            if self.in_flight >= self.settings["max_in_flight"]:
+                return
+            tenant, waiter = entry
+            if waiter.done() or not self._has_room(tenant):
+                continue
+            self._leave(entry)
+            self._admit(tenant)
+            waiter.set_result(None)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self.queue),
+            "max_in_flight": self.settings["max_in_flight"],
+            "max_queue": self.settings["max_queue"],
+            "queue_timeout_s": self.settings["queue_timeout"],
+            "tenants": dict(self.tenants),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "service_time_s": round(self.service_time, 3) if self.service_time is not None else None,
+        }
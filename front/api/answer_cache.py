@@ -0,0 +1,169 @@
+# ----------------------------------------
+# Cache semántica de respuestas
+#
+# Si una pregunta nueva queda a menos de ANSWER_CACHE_THRESHOLD (similitud
+# coseno entre embeddings) de otra ya respondida, para el mismo cliente y
+# la misma versión del corpus, se devuelve la respuesta guardada sin
+# buscar en MY_DEMO ni llamar al LLM.
+#
+#   - Las entradas caducan a los ANSWER_CACHE_TTL_S segundos
+#   - La versión del corpus (MY_DEMO_CORPUS, la cambia embed.py en cada
+#     ingesta con cambios) forma parte de la clave: tras una ingesta las
+#     entradas viejas dejan de coincidir y se purgan
+#   - SQLite en disco, compartido entre workers; cada worker mantiene en
+#     memoria la matriz de embeddings y lee sólo las filas nuevas
+#
+# Configurable en .env_<COSTUMER>:
+#   ANSWER_CACHE=1                     0 para desactivarla
+#   ANSWER_CACHE_THRESHOLD=0.95        similitud coseno mínima
+#   ANSWER_CACHE_TTL_S=86400
+#   ANSWER_CACHE_MAX_ENTRIES=2000      por cliente y versión del corpus
+#   ANSWER_CACHE_PATH=<api>/cache/answers.sqlite
+# ----------------------------------------
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "answers.sqlite")
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    def __init__(self, path=DEFAULT_PATH, threshold=0.95, ttl=86400, max_entries=2000):
+        self.threshold = float(threshold)
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+        # Matriz en memoria de la clave activa (costumer, corpus_version)
+        self.scope = None
+        self.rowids = []
+        self.created = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.last_rowid = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                costumer       TEXT NOT NULL,
+                corpus_version TEXT NOT NULL,
+                question       TEXT NOT NULL,
+                vector         BLOB NOT NULL,
+                response       TEXT NOT NULL,
+                created_at     REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (costumer, corpus_version)")
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("ANSWER_CACHE", "1") == "0":
+            return None
+        return cls(
+            path=os.getenv("ANSWER_CACHE_PATH", DEFAULT_PATH),
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL_S", "86400")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+        )
+
+    def lookup(self, costumer, corpus_version, vector):
+        query = _unit(vector)
+        with self.lock:
+            self._sync(costumer, corpus_version)
+            best = row = None
+            if self.rowids:
+                scores = self.matrix @ query
+                expired = np.asarray(self.created) < time.time() - self.ttl
+                scores[expired] = -1.0
+                # De mayor a menor similitud: la mejor puede estar ya podada
+                # (por este worker o por otro) y la siguiente seguir valiendo
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for i in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                    row = self.db.execute(
+                        "SELECT question, response FROM answers WHERE rowid = ?", (self.rowids[i],)
+                    ).fetchone()
+                    if row is not None:
+                        best = float(scores[i])
+                        break
+
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+
+        response = json.loads(row[1])
+        response["cache"] = {"hit": True, "similarity": round(best, 4), "cached_question": row[0]}
+        return response
+
+    def store(self, costumer, corpus_version, question, vector, response):
+        blob = _unit(vector).tobytes()
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO answers (costumer, corpus_version, question, vector, response, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (costumer, corpus_version, question, blob, json.dumps(response, ensure_ascii=False), time.time()),
+            )
+            self._prune(costumer, corpus_version)
+            self.db.commit()
+            self.counters["stores"] += 1
+
+    def _sync(self, costumer, corpus_version):
+        scope = (costumer, corpus_version)
+        if scope != self.scope:
+            # Otra versión del corpus: lo guardado para versiones anteriores ya no vale
+            deleted = self.db.execute(
+                "DELETE FROM answers WHERE costumer = ? AND corpus_version != ?", scope
+            ).rowcount
+            self.db.commit()
+            if deleted:
+                self.counters["invalidations"] += deleted
+            self.scope = scope
+            self.rowids, self.created, self.last_rowid = [], [], 0
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+        rows = self.db.execute(
+            "SELECT rowid, vector, created_at FROM answers "
+            "WHERE costumer = ? AND corpus_version = ? AND rowid > ? ORDER BY rowid",
+            (costumer, corpus_version, self.last_rowid),
+        ).fetchall()
+        if not rows:
+            return
+        vectors = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob, _ in rows])
+        self.matrix = vectors if not self.rowids else np.vstack([self.matrix, vectors])
+        self.rowids.extend(rowid for rowid, _, _ in rows)
+        self.created.extend(created for _, _, created in rows)
+        self.last_rowid = rows[-1][0]
+
+    def _prune(self, costumer, corpus_version):
+        self.db.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl,))
+        self.db.execute(
+            "DELETE FROM answers WHERE costumer = ? AND corpus_version = ? AND rowid NOT IN ("
+            " SELECT rowid FROM answers WHERE costumer = ? AND corpus_version = ?"
+            " ORDER BY rowid DESC LIMIT ?)",
+            (costumer, corpus_version, costumer, corpus_version, self.max_entries),
+        )
+        # Las filas borradas siguen en la matriz hasta el próximo cambio de
+        # versión; lookup las salta al no encontrarlas en SQLite
+        if len(self.rowids) > 2 * self.max_entries:
+            self.scope = None
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["entries"] = self.db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            counters["corpus_version"] = self.scope[1] if self.scope else None
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        return counters
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# ----------------------------------------
+# Servicio de chat asyncio: /api/v1/chatbot en un solo proceso
+#
+# Sustituye al puente de Node (index.js, que lanza Python por pregunta o
+# mantiene un pool de procesos) y a la app Flask que había en embed.py.
+# Mismo contrato HTTP que el controlador de Node:
+#
+#   POST /api/v1/chatbot                 {question} -> {success, question, response}
+#                                        (response = JSON de retrivalai como texto; con
+#                                        Accept: application/msgpack, el map tal cual)
+#   POST /api/v1/chatbot/stream          SSE: event token / done / error
+#   GET  /api/v1/chatbot/answer2/<id>    answer2 tardía (ANSWER2_MODE=partial)
+#   GET  /api/v1/chatbot/health
+#   GET  /metrics                        formato de texto Prometheus
+#
+# El motor de retrivalai (pool de Oracle, embeddings, cliente LLM y
+# caches) se inicializa una vez al arrancar y lo comparten todas las
+# preguntas. El HTTP es asyncio (aiohttp); el pipeline, que usa clientes
+# síncronos (oracledb, SDK de OCI), corre en un pool de hilos acotado por
+# CHAT_MAX_CONCURRENCY, así que un proceso atiende muchas conversaciones.
+#
+# Control de admisión (admission.py): límite global y por cliente
+# (cabecera X-Costumer, por defecto COSTUMER) de preguntas en curso, cola
+# acotada y rechazo rápido con 429/503 y Retry-After.
+#
+# SIGTERM/SIGINT: deja de aceptar preguntas (503), espera hasta
+# CHAT_SHUTDOWN_GRACE_S a las que están en curso y cierra el pool de Oracle.
+#
+# Configurable (entorno o .env_<COSTUMER>):
+#   API_HOST=0.0.0.0
+#   API_PORT=5000
+#   CHAT_MAX_CONCURRENCY=16        preguntas procesándose a la vez (el resto espera en cola)
+#   CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT_S, CHAT_TENANT_MAX_*   ver admission.py
+#   CHAT_SHUTDOWN_GRACE_S=30
+#   CHAT_LATE_RESULT_TTL_S=600     cuánto se guardan las answer2 tardías
+#   CHAT_COALESCE=1                preguntas iguales en curso comparten ejecución (single_flight.py)
+#
+# Uso: python3 chat_service.py   (pm2 start chat_service.py --interpreter python3)
+# ----------------------------------------
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+sys.path.append(os.getenv("BACKEND_DIR", "/app/backend"))
+from dbpool import pool_stats
+from timings import StageHistograms
+from single_flight import SingleFlight, flight_key
+from admission import Admission, Rejected, admission_settings
+from ipc_framing import MSGPACK_TYPE, pack, pack_envelope
+
+NO_QUESTION = "No se envió ninguna pregunta."
+
+
+def service_settings():
+    return {
+        "host": os.getenv("API_HOST", "0.0.0.0"),
+        "port": int(os.getenv("API_PORT", "5000")),
+        "max_concurrency": int(os.getenv("CHAT_MAX_CONCURRENCY", "16")),
+        "shutdown_grace": float(os.getenv("CHAT_SHUTDOWN_GRACE_S", "30")),
+        "late_ttl": float(os.getenv("CHAT_LATE_RESULT_TTL_S", "600")),
+        "coalesce": os.getenv("CHAT_COALESCE", "1") == "1",
+    }
+
+
+def load_engine_env():
+    # .env_<COSTUMER> al entorno antes de leer la configuración: API_PORT,
+    # CHAT_* y LLM_CONCURRENCY pueden venir de ahí (init_engine lo recarga)
+    import retrivalai
+
+    retrivalai.prepare_engine()
+
+
+def counter(name, help_text, values, label):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines += [f'{name}{{{label}="{key}"}} {value}' for key, value in sorted(values.items())]
+    return "\n".join(lines) + "\n"
+
+
+def gauge(name, help_text, value):
+    return f"# HELP {name} {help_text}\n# TYPE {name} gauge\n{name} {value}\n"
+
+
+class ChatService:
+    def __init__(self, engine, settings):
+        self.engine = engine
+        self.settings = settings
+        self.executor = ThreadPoolExecutor(max_workers=settings["max_concurrency"], thread_name_prefix="chat")
+        # Se crean en start(), ya dentro del event loop del servidor
+        self.loop = self.idle = None
+        self.admission = Admission(admission_settings(settings["max_concurrency"]))
+        self.served = 0
+        self.failed = 0
+        self.draining = False
+        self.late_results = {}
+        self.background = set()
+        self.flights = SingleFlight()
+        self.request_seconds = StageHistograms(
+            "chatbot_request_seconds", "End-to-end chatbot request latency", label="route"
+        )
+        self.stage_seconds = StageHistograms(
+            "retrieval_stage_seconds", "Retrieval pipeline stage latency (STAGE_TIMINGS=1)"
+        )
+        self.queue_seconds = StageHistograms(
+            "chat_queue_wait_seconds", "Time spent waiting for admission", label="outcome"
+        )
+
+    # ---- Ciclo de vida ----
+    async def start(self, app):
+        self.loop = asyncio.get_running_loop()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        started = time.perf_counter()
+        await self.loop.run_in_executor(self.executor, self.engine.init_engine)
+        print(f"✅ Chat service ready in {time.perf_counter() - started:.1f}s "
+              f"(max {self.settings['max_concurrency']} concurrent questions)")
+
+    async def drain(self, app):
+        self.draining = True
+        print(f"🛑 Draining {self.pending()} questions in flight...")
+        try:
+            await asyncio.wait_for(self.idle.wait(), self.settings["shutdown_grace"])
+        except asyncio.TimeoutError:
+            print(f"⚠️ {self.pending()} questions still running after "
+                  f"{self.settings['shutdown_grace']:.0f}s, shutting down anyway")
+
+    async def close(self, app):
+        self.executor.shutdown(wait=False)
+        close = getattr(self.engine.db_pool, "close", None)
+        if close is not None:
+            await self.loop.run_in_executor(None, lambda: close(force=True))
+        print("👋 Chat service stopped")
+
+    # ---- Preguntas ----
+    async def ask(self, question, request_id, on_token=None, tenant=""):
+        """answer() con single-flight. on_token se llama en el hilo del event loop.
+
+        Devuelve (salida, coalesced). Sólo la pregunta que lanza la ejecución
+        pasa por la admisión; las que se unen a ella no ocupan hueco."""
+        def start(flight):
+            emit = None
+            if on_token is not None:
+                emit = lambda field, text: self.loop.call_soon_threadsafe(flight.emit, field, text)
+            return self.answer(question, request_id, emit, tenant)
+
+        if not self.settings["coalesce"]:
+            # Un SingleFlight propio: misma mecánica de tokens, sin compartir con nadie
+            return await SingleFlight().run(None, start, on_token)
+
+        mode = ("stream" if on_token is not None else "ask", os.getenv("ANSWER2_MODE", "wait"))
+        return await self.flights.run(flight_key(tenant, question, mode), start, on_token)
+
+    async def answer(self, question, request_id, on_token=None, tenant=""):
+        self.idle.clear()
+        try:
+            waited = await self.admission.acquire(tenant)
+        except Rejected as e:
+            if e.reason == "queue_timeout":
+                self.queue_seconds.observe("timeout", e.waited)
+            self.check_idle()
+            raise
+        except asyncio.CancelledError:
+            self.check_idle()
+            raise
+        self.queue_seconds.observe("admitted", waited)
+        started = time.perf_counter()
+
+        future = self.loop.run_in_executor(
+            self.executor, self.engine.timed_answer,
+            question, request_id, self.on_late_answer2(request_id), on_token,
+        )
+        try:
+            # shield: si se cancela la petición el hilo sigue y el hueco no se libera hasta que acabe
+            output = await asyncio.shield(future)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            if future.done():
+                self.release(tenant, started)
+            else:
+                future.add_done_callback(lambda _: self.release(tenant, started))
+
+        self.served += 1
+        output["request_id"] = request_id
+        for stage, ms in (output.get("timings") or {}).items():
+            self.stage_seconds.observe(stage, ms / 1000)
+        return output
+
+    def release(self, tenant, started):
+        self.admission.release(tenant, time.perf_counter() - started)
+        self.check_idle()
+
+    def pending(self):
+        return self.admission.in_flight + len(self.admission.queue)
+
+    def check_idle(self):
+        if self.pending() == 0:
+            self.idle.set()
+
+    def on_late_answer2(self, request_id):
+        # Llega desde el hilo del LLM: se guarda en el hilo del event loop
+        def store(update):
+            self.loop.call_soon_threadsafe(self.store_late_result, request_id, update)
+        return store
+
+    def store_late_result(self, request_id, update):
+        now = time.monotonic()
+        for key in [key for key, (_, at) in self.late_results.items() if now - at > self.settings["late_ttl"]]:
+            del self.late_results[key]
+        self.late_results[request_id] = (update, now)
+
+    def stats(self):
+        engine = self.engine
+        return {
+            "mode": "asyncio",
+            "pid": os.getpid(),
+            "max_concurrency": self.settings["max_concurrency"],
+            "in_flight": self.admission.in_flight,
+            "waiting": len(self.admission.queue),
+            "admission": self.admission.stats(),
+            "served": self.served,
+            "failed": self.failed,
+            "draining": self.draining,
+            "lateResults": len(self.late_results),
+            "singleFlight": self.flights.stats(),
+            "dbPool": pool_stats(engine.db_pool) if engine.db_pool is not None else None,
+            "queryCache": engine.query_cache.stats() if engine.query_cache is not None else None,
+            "answerCache": engine.answer_cache.stats() if engine.answer_cache is not None else None,
+        }
+
+
+# ---- HTTP ----
+@web.middleware
+async def track_request(request, handler):
+    # X-Request-Id (o uno nuevo) hasta el trace log, y latencia para /metrics
+    request["request_id"] = request.headers.get("X-Request-Id") or str(uuid.uuid4())
+    started = time.perf_counter()
+    response = await handler(request)
+    response.headers["X-Request-Id"] = request["request_id"]
+    route = request.match_info.route.name
+    if route:
+        request.app["service"].request_seconds.observe(route, time.perf_counter() - started)
+    return response
+
+
+def error(status, message):
+    return web.json_response({"error": True, "message": message}, status=status)
+
+
+def rejected(e):
+    return web.json_response(
+        {"error": True, "message": str(e), "reason": e.reason},
+        status=e.status, headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def request_tenant(request):
+    return request.headers.get("X-Costumer") or request.app["service"].engine.costumer or ""
+
+
+async def read_question(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body.get("question") if isinstance(body, dict) else None
+
+
+async def ask_chatbot(request):
+    service = request.app["service"]
+    question = await read_question(request)
+    if not question:
+        return error(400, NO_QUESTION)
+    if service.draining:
+        return error(503, "El servicio se está cerrando.")
+
+    try:
+        output, coalesced = await service.ask(question, request["request_id"], tenant=request_tenant(request))
+    except Rejected as e:
+        return rejected(e)
+    except Exception as e:
+        print(f"❌ Error procesando pregunta {request['request_id']}: {e}")
+        return error(500, str(e))
+    headers = {"X-Coalesced": "1"} if coalesced else None
+    if MSGPACK_TYPE in request.headers.get("Accept", ""):
+        # Una sola codificación y sin JSON dentro de JSON para el cliente
+        body = pack_envelope({"success": True, "question": question}, "response", pack(output))
+        return web.Response(body=body, content_type=MSGPACK_TYPE, headers=headers)
+    # Se mantiene el contrato del controlador de Node: `response` es el JSON como texto
+    response = json.dumps(output, indent=2, ensure_ascii=False)
+    return web.json_response(
+        {"success": True, "question": question, "response": response}, headers=headers,
+    )
+
+
+async def stream_chatbot(request):
+    service = request.app["service"]
+    question = await read_question(request)
+    if not question:
+        return error(400, NO_QUESTION)
+    if service.draining:
+        return error(503, "El servicio se está cerrando.")
+
+    events = asyncio.Queue()
+    tenant = request_tenant(request)
+
+    def on_token(field, text):
+        events.put_nowait(("token", {"field": field, "text": text}))
+
+    async def produce():
+        try:
+            output, _ = await service.ask(question, request["request_id"], on_token, tenant)
+            events.put_nowait(("done", output))
+        except Rejected as e:
+            events.put_nowait(("rejected", e))
+        except Exception as e:
+            print(f"❌ Error procesando pregunta {request['request_id']} (stream): {e}")
+            events.put_nowait(("error", {"message": str(e)}))
+
+    # Si el cliente se va, la pregunta termina igualmente (el hilo no se puede cancelar)
+    task = asyncio.ensure_future(produce())
+    service.background.add(task)
+    task.add_done_callback(service.background.discard)
+
+    # Las cabeceras SSE salen con el primer evento: un rechazo de la admisión
+    # todavía puede responder 429/503 con Retry-After
+    event, data = await events.get()
+    if event == "rejected":
+        return rejected(data)
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "X-Request-Id": request["request_id"],
+    })
+    await response.prepare(request)
+    try:
+        while True:
+            await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+            if event != "token":
+                break
+            event, data = await events.get()
+    except ConnectionResetError:
+        return response
+    await response.write_eof()
+    return response
+
+
+async def late_answer(request):
+    entry = request.app["service"].late_results.get(request.match_info["request_id"])
+    if entry is None:
+        return web.json_response({"success": True, "answer2_status": "pending"})
+    return web.json_response({"success": True, **entry[0]})
+
+
+async def health(request):
+    return web.json_response({"success": True, "pool": None, "service": request.app["service"].stats()})
+
+
+async def metrics(request):
+    service = request.app["service"]
+    body = "".join([
+        service.request_seconds.render(),
+        service.stage_seconds.render(),
+        service.queue_seconds.render(),
+        gauge("chat_in_flight", "Questions being answered", service.admission.in_flight),
+        gauge("chat_waiting", "Questions waiting in the admission queue", len(service.admission.queue)),
+        gauge("chat_max_concurrency", "Configured CHAT_MAX_CONCURRENCY", service.settings["max_concurrency"]),
+        gauge("chat_max_queue", "Configured CHAT_MAX_QUEUE", service.admission.settings["max_queue"]),
+        counter("chat_rejected_total", "Requests rejected by admission control", service.admission.rejected, "reason"),
+        gauge("chat_single_flight_in_flight", "Distinct questions being answered", len(service.flights.flights)),
+        "# HELP chat_coalesced_total Requests that joined an identical question already in flight\n"
+        "# TYPE chat_coalesced_total counter\n"
+        f"chat_coalesced_total {service.flights.coalesced}\n",
+    ])
+    return web.Response(text=body, content_type="text/plain", headers={"X-Request-Id": request["request_id"]})
+
+
+def create_app(settings=None):
+    if settings is None:
+        load_engine_env()
+        settings = service_settings()
+    # answer y answer2 van en paralelo: dos llamadas al LLM por pregunta en curso
+    os.environ.setdefault("LLM_CONCURRENCY", str(2 * settings["max_concurrency"]))
+    import retrivalai
+
+    service = ChatService(retrivalai, settings)
+    app = web.Application(middlewares=[track_request])
+    app["service"] = service
+    app.router.add_post("/api/v1/chatbot", ask_chatbot, name="chatbot")
+    app.router.add_post("/api/v1/chatbot/stream", stream_chatbot, name="chatbot_stream")
+    app.router.add_get("/api/v1/chatbot/answer2/{request_id}", late_answer, name="answer2")
+    app.router.add_get("/api/v1/chatbot/health", health, name="health")
+    app.router.add_get("/metrics", metrics, name="metrics")
+    app.on_startup.append(service.start)
+    app.on_shutdown.append(service.drain)
+    app.on_cleanup.append(service.close)
+    return app
+
+
+def main():
+    load_engine_env()
+    settings = service_settings()
+    web.run_app(
+        create_app(settings), host=settings["host"], port=settings["port"],
+        shutdown_timeout=settings["shutdown_grace"], access_log=None,
+        print=lambda _: print(f"✅ Servidor escuchando en http://localhost:{settings['port']}"),
+    )
+
+
+if __name__ == "__main__":
+    main()
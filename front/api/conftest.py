@@ -0,0 +1,9 @@
+import os
+import sys
+
+# dbai/ se monta en /app/backend en el contenedor; en el repo está junto a front/
+os.environ.setdefault(
+    "BACKEND_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "dbai")
+)
+# Como retrivalai y chat_service: los módulos que importan de dbai/ (vector_search) lo necesitan en el path
+sys.path.append(os.environ["BACKEND_DIR"])
@@ -0,0 +1,159 @@
+# ----------------------------------------
+# Empaquetado del contexto del prompt por presupuesto de tokens
+#
+# En vez de concatenar los k chunks tal cual y pedir siempre
+# max_tokens=16000, el prompt se arma contra un presupuesto por llamada:
+#
+#   1) Se estima el tamaño de la plantilla (pregunta incluida) con un
+#      contador local (sin llamar a la API ni cargar un tokenizer)
+#   2) Los chunks entran en orden de relevancia mientras quepan en
+#      LLM_CONTEXT_TOKENS; el que no cabe entero se recorta por frases y
+#      se sigue probando con los siguientes (empaquetado voraz)
+#   3) max_tokens = lo que queda del presupuesto, entre
+#      LLM_MIN_ANSWER_TOKENS y LLM_MAX_ANSWER_TOKENS
+#
+# Con los valores por defecto la respuesta conserva los 16000 tokens de
+# antes: LLM_TOKEN_BUDGET deja 8000 para el prompt (que con
+# LLM_CONTEXT_TOKENS=3000 no se acerca) además de LLM_MAX_ANSWER_TOKENS.
+# Bajando LLM_TOKEN_BUDGET se recorta la respuesta a lo que quede.
+#
+# LLM_MODEL es el modelo al que llama retrivalai.py (chat_with_oci) y de
+# él sale la ventana por defecto; con un OCID que no está en
+# MODEL_CONTEXT_WINDOWS se usa DEFAULT_CONTEXT_WINDOW o LLM_CONTEXT_WINDOW.
+#
+# El coste estimado usa LLM_PRICE_INPUT_PER_1K / LLM_PRICE_OUTPUT_PER_1K
+# (USD por 1000 tokens; 0 = sin coste conocido).
+#
+# Configurable en .env_<COSTUMER>:
+#   LLM_MODEL=<OCID del despliegue>  nombre u OCID del modelo de chat
+#   LLM_CONTEXT_WINDOW=              tokens de la ventana (vacío = la del modelo)
+#   LLM_TOKEN_BUDGET=24000           prompt + respuesta por llamada
+#   LLM_CONTEXT_TOKENS=3000          máximo para los chunks recuperados
+#   LLM_MIN_ANSWER_TOKENS=1024
+#   LLM_MAX_ANSWER_TOKENS=16000
+#   LLM_TOKEN_ESTIMATE_FACTOR=1.1    margen sobre la estimación local
+# ----------------------------------------
+import math
+import os
+import re
+
+# Ventana de contexto por modelo de OCI Generative AI
+MODEL_CONTEXT_WINDOWS = {
+    "cohere.command-r-plus": 128000,
+    "cohere.command-r-16k": 16000,
+    "cohere.command-r-08-2024": 128000,
+    "cohere.command-r-plus-08-2024": 128000,
+    "meta.llama-3-70b-instruct": 8192,
+    "meta.llama-3.1-70b-instruct": 128000,
+    "meta.llama-3.1-405b-instruct": 128000,
+    "meta.llama-3.3-70b-instruct": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 128000
+DEFAULT_LLM_MODEL = "ocid1.generativeaimodel.oc1.us-chicago-1.amaaaaaask7dceya663hlflxfx6kiwn7qjlnpye6n7caii5lnvcpjlwr2s2q"
+MIN_TRIMMED_TOKENS = 64
+
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def llm_model():
+    return os.getenv("LLM_MODEL") or DEFAULT_LLM_MODEL
+
+
+def budget_settings():
+    model = llm_model()
+    return {
+        "model": model,
+        "window": _env_int("LLM_CONTEXT_WINDOW", MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)),
+        "budget": _env_int("LLM_TOKEN_BUDGET", 24000),
+        "context_tokens": _env_int("LLM_CONTEXT_TOKENS", 3000),
+        "min_answer": _env_int("LLM_MIN_ANSWER_TOKENS", 1024),
+        "max_answer": _env_int("LLM_MAX_ANSWER_TOKENS", 16000),
+        "factor": float(os.getenv("LLM_TOKEN_ESTIMATE_FACTOR", "1.1")),
+        "price_input": float(os.getenv("LLM_PRICE_INPUT_PER_1K", "0")),
+        "price_output": float(os.getenv("LLM_PRICE_OUTPUT_PER_1K", "0")),
+    }
+
+
+def estimate_tokens(text, factor=1.1):
+    """Estimación local tipo BPE: palabras cortas = 1 token, largas y números se parten."""
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif piece[0].isalpha():
+            tokens += 1 + len(piece) // 8
+        else:
+            tokens += 1
+    return math.ceil(tokens * factor)
+
+
+def _trim_to_sentences(text, max_tokens, factor):
+    kept, used = [], 0
+    for sentence in _SENTENCE_END.split(text):
+        tokens = estimate_tokens(sentence, factor)
+        if used + tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += tokens
+    return " ".join(kept), used
+
+
+def pack_context(docs, template_tokens, settings):
+    """Chunks que entran en el presupuesto (recortados si hace falta) y resumen del empaquetado."""
+    limit = min(settings["budget"], settings["window"])
+    available = min(settings["context_tokens"], limit - template_tokens - settings["min_answer"])
+
+    packed, used, trimmed = [], 0, 0
+    for doc in docs:
+        remaining = available - used
+        tokens = estimate_tokens(doc.page_content, settings["factor"])
+        if tokens > remaining:
+            if remaining < MIN_TRIMMED_TOKENS:
+                continue
+            text, tokens = _trim_to_sentences(doc.page_content, remaining, settings["factor"])
+            if not text:
+                continue
+            doc.page_content = text
+            doc.metadata["context_trimmed"] = True
+            trimmed += 1
+        doc.metadata["context_tokens"] = tokens
+        packed.append(doc)
+        used += tokens
+
+    return packed, {
+        "chunks": len(packed),
+        "dropped": len(docs) - len(packed),
+        "trimmed": trimmed,
+        "tokens": used,
+        "budget": max(0, available),
+    }
+
+
+def max_answer_tokens(prompt_tokens, settings):
+    limit = min(settings["budget"], settings["window"])
+    return max(settings["min_answer"], min(settings["max_answer"], limit - prompt_tokens))
+
+
+def usage_report(prompt_tokens, answers, max_tokens, settings):
+    """Tokens por llamada (prompt estimado, respuesta estimada) y coste en USD."""
+    completion = {
+        field: estimate_tokens(answers[field], settings["factor"])
+        for field in prompt_tokens if answers.get(field)
+    }
+    cost = (
+        sum(prompt_tokens.values()) * settings["price_input"]
+        + sum(completion.values()) * settings["price_output"]
+    ) / 1000
+    return {
+        "model": settings["model"],
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion,
+        "max_tokens": max_tokens,
+        "cost_usd": round(cost, 6),
+    }
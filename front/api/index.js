@@ -1,15 +1,35 @@
+// Puente Node -> Python (exec, pool de workers o zygote). El despliegue usa
+// chat_service.py (servicio asyncio, mismo contrato HTTP); éste queda como
+// alternativa y como servidor de referencia en loadtest.py.
 const express = require('express');
 const routes = require('./src/routes/chatbotRoutes'); // ✅ nombre correcto
+const { getPool, closePool } = require('./src/services/retrievalPool');
+const { getZygote, closeZygote } = require('./src/services/zygote');
+const { metrics } = require('./src/controllers/chatbotController');
 
 const app = express();
-const port = 5000;
+const port = Number(process.env.API_PORT) || 5000;
 
 app.use(express.json());
 app.use('/api/v1', routes);
+app.get('/metrics', metrics);
 
-app.listen(port, () => {
+const server = app.listen(port, () => {
   console.log(`✅ Servidor escuchando en http://localhost:${port}`);
+  // Arrancar los workers de retrieval en caliente antes de la primera pregunta
+  if (process.env.RETRIEVAL_POOL_SIZE !== '0') {
+    getPool();
+  } else if (process.env.RETRIEVAL_ZYGOTE === '1') {
+    getZygote();
+  }
 });
 
+const shutdown = () => {
+  console.log("🛑 Cerrando servidor y workers de retrieval...");
+  closePool();
+  closeZygote();
+  server.close(() => process.exit(0));
+};
 
-
+process.on('SIGTERM', shutdown);
+process.on('SIGINT', shutdown);
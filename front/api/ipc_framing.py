@@ -0,0 +1,90 @@
+# ----------------------------------------
+# Framing para el canal IPC Node <-> worker de retrieval
+#
+# Cada frame es: 4 bytes big-endian con la longitud + payload msgpack.
+# El mismo formato lo implementa src/services/ipcFraming.js.
+#
+# En los frames de resultado la salida del pipeline va ya codificada
+# (campo bin "output") junto con sus "timings": el API no necesita
+# decodificarla para contestar a un cliente msgpack, la inserta tal cual
+# en la respuesta (pack_envelope). Sólo los clientes JSON pagan la
+# conversión.
+#
+# IPC_FORMAT=json (lo pone Node cuando no tiene @msgpack/msgpack): los
+# frames se escriben en JSON y "output" es el JSON del script en texto.
+# Al leer, cada frame se decodifica según su primer byte ('{' = JSON).
+# ----------------------------------------
+import json
+import os
+import struct
+
+import msgpack
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+MSGPACK_TYPE = "application/msgpack"
+JSON_START = ord("{")  # un map msgpack nunca empieza así
+
+
+def json_frames():
+    return os.getenv("IPC_FORMAT", "msgpack") == "json"
+
+
+def pack(message):
+    return msgpack.packb(message, use_bin_type=True)
+
+
+def unpack(payload):
+    return msgpack.unpackb(payload, raw=False)
+
+
+def pack_envelope(fields, key, packed):
+    """Map msgpack con fields y key -> packed (ya codificado), sin volver a serializarlo."""
+    packer = msgpack.Packer(use_bin_type=True)
+    parts = [packer.pack_map_header(len(fields) + 1)]
+    for name, value in fields.items():
+        parts.append(packer.pack(name))
+        parts.append(packer.pack(value))
+    parts.append(packer.pack(key))
+    parts.append(packed)
+    return b"".join(parts)
+
+
+def result_frame(request_id, output):
+    if json_frames():
+        packed = json.dumps(output, ensure_ascii=False, indent=2)
+    else:
+        packed = pack(output)
+    return {"id": request_id, "type": "result", "timings": output.get("timings"), "output": packed}
+
+
+def _read_exact(stream, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def read_frame(stream):
+    """Lee un frame del stream; devuelve None si el otro extremo cerró."""
+    header = _read_exact(stream, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame demasiado grande: {length} bytes")
+    payload = _read_exact(stream, length)
+    if payload is None:
+        return None
+    if payload[:1] == bytes([JSON_START]):
+        return json.loads(payload)
+    return unpack(payload)
+
+
+def write_frame(stream, message):
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8") if json_frames() else pack(message)
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# ----------------------------------------
+# Prueba de carga de POST /api/v1/chatbot
+#
+# Arranca la API de Node (index.js) con RETRIEVAL_FAKE_BACKENDS=1: el
+# camino Node -> Python es el real (pool de workers, exec por pregunta
+# con --pool-size 0 o fork desde el zygote con --pool-size 0 --zygote)
+# y sólo OCI y Oracle se sustituyen por los stand-ins de loadtest_fakes.py.
+# Con --server python arranca en su lugar el servicio asyncio
+# (chat_service.py). Con --url se ataca un servidor ya arrancado.
+#
+# Modos de carga:
+#   --concurrency N             N usuarios en bucle cerrado (pregunta, respuesta, otra)
+#   --rate R [--concurrency N]  llegadas Poisson a R peticiones/s, hasta N en vuelo;
+#                               la latencia cuenta desde la llegada programada, así
+#                               que la cola del cliente también se mide
+#
+# Informe: p50/p95/p99, throughput, tasa de error, procesos bajo Node
+# (total y Python) y, si la salida trae `timings`, su desglose por etapa.
+#   --output base.json            guarda el resultado
+#   --baseline base.json          lo compara; código 1 si empeora más de --tolerance
+#
+# Ejemplo:
+#   python3 loadtest.py --concurrency 8 --duration 60 --output v1.json
+#   python3 loadtest.py --pool-size 0 --concurrency 8 --duration 60 --baseline v1.json
+#   python3 loadtest.py --pool-size 0 --zygote --concurrency 8 --duration 60 --baseline v1.json
+#   python3 loadtest.py --server python --concurrency 8 --duration 60 --baseline v1.json
+# ----------------------------------------
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "max": round(max(values), 1),
+        "mean": round(sum(values) / len(values), 1),
+    }
+
+
+# ---- Servidor bajo prueba ----
+def start_server(args, workdir):
+    env = dict(os.environ)
+    env.update({
+        "API_PORT": str(args.port),
+        "RETRIEVAL_FAKE_BACKENDS": "1",
+        "RETRIEVAL_POOL_SIZE": str(args.pool_size),
+        "RETRIEVAL_ZYGOTE": "1" if args.zygote else "0",
+        "CHAT_MAX_CONCURRENCY": str(args.service_concurrency),
+        "PYTHON_BIN": sys.executable,
+        "QUERY_CACHE_PATH": os.path.join(workdir, "query_embeddings.sqlite"),
+        "ANSWER_CACHE": "1" if args.answer_cache else "0",
+        "ANSWER_CACHE_PATH": os.path.join(workdir, "answers.sqlite"),
+        "FAKE_EMBED_LATENCY_MS": str(args.embed_ms),
+        "FAKE_SEARCH_LATENCY_MS": str(args.search_ms),
+        "FAKE_CHAT_LATENCY_MS": str(args.chat_ms),
+        "FAKE_JITTER": str(args.jitter),
+        "FAKE_ERROR_RATE": str(args.error_rate),
+        "FAKE_DB_CONNECTIONS": str(args.db_connections),
+    })
+    log = open(os.path.join(workdir, "server.log"), "w")
+    command = [sys.executable, "chat_service.py"] if args.server == "python" else ["node", "index.js"]
+    proc = subprocess.Popen(command, cwd=API_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return proc, log
+
+
+def wait_ready(base, pool_size, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, body = request(base, "GET", "/api/v1/chatbot/health", None, 5)
+            if status == 200:
+                pool = json.loads(body).get("pool")
+                if pool is None or pool_size == 0:
+                    return
+                workers = [w for w in pool["workers"] if w]
+                if len(workers) == pool["size"] and all(w["state"] == "idle" for w in workers):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready")
+
+
+def request(base, method, path, payload, timeout, conn=None):
+    url = urlparse(base)
+    own = conn is None
+    if own:
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    try:
+        body = json.dumps(payload) if payload is not None else None
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        if own:
+            conn.close()
+
+
+# ---- Procesos bajo el servidor ----
+def descendants(root_pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/comm") as f:
+                comm = f.read().strip()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append((int(entry), comm))
+
+    found, stack = [], [root_pid]
+    while stack:
+        for pid, comm in children.get(stack.pop(), []):
+            found.append(comm)
+            stack.append(pid)
+    return found
+
+
+class ProcessSampler(threading.Thread):
+    def __init__(self, root_pid, interval=0.5, include_root=False):
+        super().__init__(daemon=True)
+        self.root_pid = root_pid
+        self.include_root = include_root
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            procs = descendants(self.root_pid)
+            if self.include_root:
+                # El servicio asyncio es él mismo el proceso Python
+                procs.append("python")
+            self.samples.append((len(procs), sum(1 for comm in procs if comm.startswith("python"))))
+
+    def report(self):
+        if not self.samples:
+            return None
+        total = [s[0] for s in self.samples]
+        python = [s[1] for s in self.samples]
+        return {
+            "max_processes": max(total),
+            "mean_processes": round(sum(total) / len(total), 1),
+            "max_python": max(python),
+            "mean_python": round(sum(python) / len(python), 1),
+        }
+
+
+# ---- Generador de carga ----
+class LoadRun:
+    def __init__(self, base, questions, timeout):
+        self.base = base
+        self.questions = questions
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.timings = {}
+        self.sent = 0
+
+    def next_question(self):
+        with self.lock:
+            self.sent += 1
+            n = self.sent
+        return self.questions[n % len(self.questions)] if self.questions else f"Load test question #{n}: how do I configure a Siebel workflow?"
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            url = urlparse(self.base)
+            conn = self.local.conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+        return conn
+
+    def one(self, scheduled=None):
+        start = scheduled if scheduled is not None else time.monotonic()
+        try:
+            status, body = request(self.base, "POST", "/api/v1/chatbot", {"question": self.next_question()},
+                                   self.timeout, self.connection())
+        except (OSError, http.client.HTTPException) as e:
+            self.local.conn = None
+            status, body = type(e).__name__, b""
+        latency_ms = (time.monotonic() - start) * 1000
+
+        timings = None
+        if status == 200:
+            try:
+                output = json.loads(json.loads(body)["response"])
+                timings = output.get("timings")
+            except (ValueError, KeyError, TypeError):
+                pass
+        with self.lock:
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            if status == 200:
+                self.latencies.append(latency_ms)
+            else:
+                self.errors += 1
+            for stage, value in (timings or {}).items():
+                if isinstance(value, (int, float)):
+                    self.timings.setdefault(stage, []).append(value)
+
+    def closed_loop(self, concurrency, duration):
+        deadline = time.monotonic() + duration
+
+        def user():
+            while time.monotonic() < deadline:
+                self.one()
+
+        threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def open_loop(self, rate, concurrency, duration):
+        deadline = time.monotonic() + duration
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            arrival = time.monotonic()
+            while arrival < deadline:
+                delay = arrival - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.one, arrival)
+                arrival += random.expovariate(rate)
+
+
+# ---- Informe ----
+def build_report(args, run, wall, processes, pool):
+    total = len(run.latencies) + run.errors
+    return {
+        "config": {
+            "mode": "open" if args.rate else "closed",
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "duration": args.duration,
+            "pool_size": args.pool_size if not args.url else None,
+            "zygote": args.zygote,
+            "server": None if args.url else args.server,
+            "service_concurrency": args.service_concurrency if args.server == "python" else None,
+            "fakes": None if args.url else {
+                "embed_ms": args.embed_ms, "search_ms": args.search_ms, "chat_ms": args.chat_ms,
+                "jitter": args.jitter, "error_rate": args.error_rate, "db_connections": args.db_connections,
+            },
+        },
+        "requests": total,
+        "ok": len(run.latencies),
+        "errors": run.errors,
+        "error_rate": round(run.errors / total, 4) if total else 0.0,
+        "statuses": run.statuses,
+        "throughput_rps": round(len(run.latencies) / wall, 3) if wall else 0.0,
+        "latency_ms": summarize(run.latencies),
+        "timings_ms": {stage: summarize(values) for stage, values in sorted(run.timings.items())},
+        "processes": processes,
+        "pool": pool,
+    }
+
+
+def print_report(report, baseline=None, tolerance=0.2):
+    config = report["config"]
+    load = f"{config['rate']} req/s (max {config['concurrency']} in flight)" if config["mode"] == "open" else f"{config['concurrency']} users"
+    if config.get("server") == "python":
+        mode = f"asyncio service (max {config['service_concurrency']} concurrent)"
+    elif config.get("zygote"):
+        mode = "zygote"
+    else:
+        mode = f"pool size {config['pool_size']}"
+    print(f"\n📊 POST /api/v1/chatbot — {load}, {config['duration']}s, {mode}")
+    print(f"  requests {report['requests']}, ok {report['ok']}, errors {report['errors']} "
+          f"({report['error_rate']:.1%}) {report['statuses']}")
+
+    regressions = []
+
+    def compare(label, value, old, higher_is_better, unit):
+        line = f"  {label:<16} {value:>10.1f} {unit}"
+        if old is not None:
+            change = value / old - 1 if old else 0.0
+            line += f"   {change:+.1%} vs baseline"
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                line += " ⚠️"
+                regressions.append(label)
+        print(line)
+
+    old = baseline or {}
+    compare("throughput", report["throughput_rps"], old.get("throughput_rps"), True, "req/s")
+    latency, old_latency = report["latency_ms"] or {}, old.get("latency_ms") or {}
+    for key in ("p50", "p95", "p99", "max"):
+        if key in latency:
+            compare(f"latency {key}", latency[key], old_latency.get(key), False, "ms")
+    if baseline is not None and report["error_rate"] > baseline.get("error_rate", 0) + 0.01:
+        print(f"  error rate {report['error_rate']:.1%} vs {baseline.get('error_rate', 0):.1%} ⚠️")
+        regressions.append("error rate")
+
+    if report["processes"]:
+        p = report["processes"]
+        print(f"  processes        max {p['max_processes']} (python {p['max_python']}), "
+              f"mean {p['mean_processes']} (python {p['mean_python']})")
+    for stage, summary in report["timings_ms"].items():
+        print(f"  {stage:<16} p50 {summary['p50']:.1f} ms  p95 {summary['p95']:.1f} ms  p99 {summary['p99']:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for POST /api/v1/chatbot")
+    parser.add_argument("--url", help="target an already running API instead of starting one with fakes")
+    parser.add_argument("--server-pid", type=int, help="with --url: pid whose child processes are counted")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--pool-size", type=int, default=2, help="RETRIEVAL_POOL_SIZE (0 = exec per request)")
+    parser.add_argument("--zygote", action="store_true", help="with --pool-size 0: fork from a preloaded zygote instead of exec")
+    parser.add_argument("--server", choices=("node", "python"), default="node",
+                        help="node = index.js, python = asyncio chat_service.py")
+    parser.add_argument("--service-concurrency", type=int, default=16, help="CHAT_MAX_CONCURRENCY for --server python")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, help="open-loop arrivals per second")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=int, default=2, help="requests sent before measuring")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--embed-ms", type=float, default=150)
+    parser.add_argument("--search-ms", type=float, default=40)
+    parser.add_argument("--chat-ms", type=float, default=3000)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--db-connections", type=int, default=4)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="previous --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    questions = None
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    proc = log = None
+    workdir = tempfile.mkdtemp(prefix="chatbot-loadtest-")
+    if args.url:
+        base, root_pid = args.url.rstrip("/"), args.server_pid
+    else:
+        base = f"http://127.0.0.1:{args.port}"
+        proc, log = start_server(args, workdir)
+        root_pid = proc.pid
+        name = "Python chat service" if args.server == "python" else "Node API"
+        print(f"🚀 {name} on {base} (pid {proc.pid}, log {workdir}/server.log)")
+
+    try:
+        wait_ready(base, 0 if args.url else args.pool_size)
+        run = LoadRun(base, questions, args.timeout)
+        for _ in range(args.warmup):
+            run.one()
+        run = LoadRun(base, questions, args.timeout)
+
+        sampler = ProcessSampler(root_pid, include_root=args.server == "python" and not args.url) if root_pid else None
+        if sampler:
+            sampler.start()
+        print(f"⏱️ Running for {args.duration:.0f}s...")
+        started = time.monotonic()
+        if args.rate:
+            run.open_loop(args.rate, args.concurrency, args.duration)
+        else:
+            run.closed_loop(args.concurrency, args.duration)
+        wall = time.monotonic() - started
+        if sampler:
+            sampler.stopped.set()
+
+        pool = None
+        try:
+            status, body = request(base, "GET", "/api/v1/chatbot/health", None, 5)
+            pool = json.loads(body).get("pool") if status == 200 else None
+        except OSError:
+            pass
+        report = build_report(args, run, wall, sampler.report() if sampler else None, pool)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            log.close()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = print_report(report, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+    if regressions:
+        print(f"❌ Regression in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# ----------------------------------------
+# Stand-ins locales para las pruebas de carga (loadtest.py)
+#
+# Con RETRIEVAL_FAKE_BACKENDS=1 retrivalai.init_engine usa estos objetos en
+# lugar de OCI y Oracle. Sustituyen sólo el borde de red: el embedding de
+# la pregunta, el cliente de chat y el pool de Oracle. search_chunks,
+# dbpool.connection, las caches y la generación de ambas respuestas son
+# el código real.
+#
+# Perfil de latencia (ms, variables de entorno):
+#   FAKE_EMBED_LATENCY_MS=150     embed_query
+#   FAKE_SEARCH_LATENCY_MS=40     consulta vectorial en MY_DEMO (la léxica, la mitad)
+#   FAKE_CHAT_LATENCY_MS=3000     respuesta completa del LLM
+#   FAKE_JITTER=0.3               sigma del jitter lognormal
+#   FAKE_ERROR_RATE=0             fracción de llamadas al LLM que fallan
+#   FAKE_DB_CONNECTIONS=4         conexiones del pool falso (se esperan si no hay)
+# ----------------------------------------
+import array
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+WORDS = (
+    "siebel application session server workflow configuration repository object "
+    "business component view screen integration deployment release user role"
+).split()
+
+
+def _ms(name, default):
+    return float(os.getenv(name, default))
+
+
+def _sleep(ms):
+    jitter = float(os.getenv("FAKE_JITTER", "0.3"))
+    time.sleep(ms / 1000.0 * random.lognormvariate(0.0, jitter))
+
+
+def _sentence(words=20):
+    return " ".join(random.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _chunk_row(i, score, sql):
+    row = (
+        " ".join(_sentence() for _ in range(10)),
+        json.dumps({"source": f"loadtest_{i}.pdf", "chunk_id": f"loadtest_{i}.pdf_chunk_{i}"}),
+        score,
+    )
+    if ", embedding" not in sql:
+        return row
+    # Los chunks van por parejas casi idénticas, para que el re-ranking tenga duplicados que quitar
+    base, noise = random.Random(i // 2), random.Random(i)
+    return row + (array.array("f", [base.uniform(-0.05, 0.05) + noise.uniform(-0.002, 0.002) for _ in range(1024)]),)
+
+
+class FakeEmbeddings:
+    def __init__(self, dim=1024):
+        self.dim = dim
+
+    def embed_query(self, text):
+        _sleep(_ms("FAKE_EMBED_LATENCY_MS", 150))
+        rng = random.Random(text)
+        return [rng.uniform(-0.05, 0.05) for _ in range(self.dim)]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeChatClient:
+    """Responde a chat() como GenerativeAiInferenceClient, con o sin streaming."""
+
+    def chat(self, chat_detail):
+        if random.random() < float(os.getenv("FAKE_ERROR_RATE", "0")):
+            _sleep(_ms("FAKE_CHAT_LATENCY_MS", 3000) / 10)
+            raise RuntimeError("Fake LLM failure")
+        text = " ".join(_sentence() for _ in range(6))
+        latency = _ms("FAKE_CHAT_LATENCY_MS", 3000)
+
+        if not chat_detail.chat_request.is_stream:
+            _sleep(latency)
+            content = SimpleNamespace(text=text)
+            choice = SimpleNamespace(message=SimpleNamespace(content=[content]))
+            return SimpleNamespace(data=SimpleNamespace(chat_response=SimpleNamespace(choices=[choice])))
+
+        pieces = text.split(" ")
+
+        def events():
+            for i, piece in enumerate(pieces):
+                _sleep(latency / len(pieces))
+                chunk = piece if i == 0 else " " + piece
+                yield SimpleNamespace(data=json.dumps({"message": {"content": [{"type": "TEXT", "text": chunk}]}}))
+
+        return SimpleNamespace(data=SimpleNamespace(events=events))
+
+
+class _FakeCursor:
+    def __init__(self):
+        self.rows = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def execute(self, sql, **binds):
+        if "VECTOR_DISTANCE" in sql:
+            _sleep(_ms("FAKE_SEARCH_LATENCY_MS", 40))
+            self.rows = [_chunk_row(i, 0.1 * (i + 1), sql) for i in range(int(binds.get("k", 5)))]
+        elif "CONTAINS(" in sql:
+            _sleep(_ms("FAKE_SEARCH_LATENCY_MS", 40) / 2)
+            self.rows = [_chunk_row(i, 100 - 5 * i, sql) for i in range(0, 2 * int(binds.get("k", 5)), 2)]
+        elif "_CORPUS" in sql:
+            self.rows = [("loadtest",)]
+        else:
+            self.rows = []
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class _FakeConnection:
+    def cursor(self):
+        return _FakeCursor()
+
+    def commit(self):
+        pass
+
+
+class FakePool:
+    """Mismos atributos que oracledb.ConnectionPool que lee dbpool.pool_stats."""
+
+    def __init__(self, size=None):
+        self.max = int(size or os.getenv("FAKE_DB_CONNECTIONS", "4"))
+        self.min = 1
+        self.increment = 1
+        self.stmtcachesize = 0
+        self.ping_interval = 0
+        self.busy = 0
+        self.opened = self.max
+        self._slots = threading.BoundedSemaphore(self.max)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            self.busy += 1
+        return _FakeConnection()
+
+    def release(self, conn):
+        with self._lock:
+            self.busy -= 1
+        self._slots.release()
@@ -0,0 +1,147 @@
+# ----------------------------------------
+# Cache de embeddings de preguntas (dos niveles)
+#
+#   1) LRU en memoria del worker
+#   2) SQLite en disco, compartido entre workers y reinicios, con
+#      desalojo por tamaño (las entradas menos usadas salen primero)
+#
+# La clave es el id del modelo + la pregunta normalizada (minúsculas,
+# espacios colapsados, sin signos al principio/final), así que preguntas
+# repetidas o casi idénticas no vuelven a llamar a embed_query.
+#
+# Configurable en .env_<COSTUMER>:
+#   QUERY_CACHE_SIZE=1024              entradas en memoria
+#   QUERY_CACHE_PATH=<api>/cache/query_embeddings.sqlite
+#   QUERY_CACHE_MAX_BYTES=67108864     tamaño máximo de los vectores en disco
+# ----------------------------------------
+import array
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "query_embeddings.sqlite")
+
+
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ?¿!¡.,;:\"'")
+
+
+def cache_key(model_id, text):
+    return hashlib.sha256(f"{model_id}\0{normalize_question(text)}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    def __init__(self, path=DEFAULT_PATH, memory_size=1024, max_bytes=64 * 1024 * 1024):
+        self.memory_size = max(0, int(memory_size))
+        self.max_bytes = int(max_bytes)
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                key       TEXT PRIMARY KEY,
+                vector    BLOB NOT NULL,
+                bytes     INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv("QUERY_CACHE_PATH", DEFAULT_PATH),
+            memory_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            max_bytes=int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        )
+
+    def get(self, key):
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return vector
+
+            row = self.db.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self.db.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            vector = array.array("f", row[0]).tolist()
+            self._remember(key, vector)
+            self.counters["disk_hits"] += 1
+            return vector
+
+    def put(self, key, vector):
+        blob = array.array("f", vector).tobytes()
+        with self.lock:
+            self._remember(key, list(vector))
+            self.db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, bytes, last_used) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self._evict()
+            self.db.commit()
+
+    def _remember(self, key, vector):
+        if self.memory_size == 0:
+            return
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM query_embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute("SELECT key, bytes FROM query_embeddings ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM query_embeddings WHERE key = ?", (key,))
+            total -= size
+            self.counters["evictions"] += 1
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["memory_entries"] = len(self.memory)
+            counters["disk_entries"], counters["disk_bytes"] = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM query_embeddings"
+            ).fetchone()
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = round((lookups - counters["misses"]) / lookups, 4) if lookups else 0.0
+        return counters
+
+
+class CachedQueryEmbeddings:
+    """Envuelve un modelo de embeddings y cachea sólo embed_query."""
+
+    def __init__(self, embeddings, model_id, cache):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.cache = cache
+
+    def embed_query(self, text):
+        key = cache_key(self.model_id, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
@@ -0,0 +1,111 @@
+# ----------------------------------------
+# Re-ranking por diversidad (MMR) y deduplicación de chunks
+#
+# Con chunk_overlap=100 y texto repetido entre PDFs (portadas, avisos
+# legales), varios de los k chunks de la búsqueda suelen decir lo mismo.
+# Con RETRIEVAL_MMR=1 la retrieval pide RETRIEVAL_MMR_CANDIDATES chunks
+# con sus embeddings y aquí se eligen los k finales:
+#
+#   1) Maximal Marginal Relevance: en cada paso se toma el candidato con
+#      mayor lambda * relevancia - (1 - lambda) * similitud máxima con los
+#      ya elegidos (todo con matrices NumPy sobre los candidatos)
+#   2) Los candidatos con similitud coseno >= RETRIEVAL_DEDUP_THRESHOLD
+#      con alguno ya elegido se descartan como duplicados
+#   3) Entre los elegidos, el solape literal entre el final de un chunk y
+#      el principio de otro (chunk_overlap) se recorta del segundo
+#
+# Configurable en .env_<COSTUMER>:
+#   RETRIEVAL_MMR=0                  1 para activarlo (lo lee vector_search.search_settings)
+#   RETRIEVAL_MMR_CANDIDATES=20
+#   RETRIEVAL_MMR_LAMBDA=0.7         1 = sólo relevancia, 0 = sólo diversidad
+#   RETRIEVAL_DEDUP_THRESHOLD=0.95
+#   RETRIEVAL_OVERLAP_CHARS=300      solape máximo que se busca (0 = no recortar)
+# ----------------------------------------
+import os
+
+import numpy as np
+
+VECTOR_KEY = "_embedding"
+MIN_OVERLAP_CHARS = 40
+
+
+def rerank_settings():
+    return {
+        "candidates": int(os.getenv("RETRIEVAL_MMR_CANDIDATES", "20")),
+        "lambda": float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7")),
+        "dedup_threshold": float(os.getenv("RETRIEVAL_DEDUP_THRESHOLD", "0.95")),
+        "overlap_chars": int(os.getenv("RETRIEVAL_OVERLAP_CHARS", "300")),
+    }
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mmr_select(query_vector, vectors, k, lambda_mult=0.7, dedup_threshold=0.95, relevance=None):
+    """Índices elegidos (en orden) y número de candidatos descartados por duplicados."""
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+    if relevance is None:
+        relevance = matrix @ _normalize(np.asarray(query_vector, dtype=np.float32))
+    else:
+        # Scores de otra escala (RRF): se llevan a [0, 1] para compararlos con la similitud
+        relevance = np.asarray(relevance, dtype=np.float32)
+        relevance = relevance / (relevance.max() or 1.0)
+    similarity = matrix @ matrix.T
+
+    n = len(matrix)
+    available = np.ones(n, dtype=bool)
+    max_sim = np.zeros(n, dtype=np.float32)
+    selected, duplicates = [], 0
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_sim
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+
+        duplicate = available & (similarity[best] >= dedup_threshold)
+        duplicates += int(duplicate.sum())
+        available &= ~duplicate
+    return selected, duplicates
+
+
+def _overlap(first, second, max_chars):
+    for size in range(min(max_chars, len(first), len(second)), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def trim_overlaps(docs, max_chars=300):
+    """Quita de cada chunk el principio que ya está al final de otro elegido."""
+    if max_chars <= 0:
+        return 0
+    trimmed = 0
+    for i, doc in enumerate(docs):
+        for j, other in enumerate(docs):
+            if i == j or doc.metadata.get("source") != other.metadata.get("source"):
+                continue
+            size = _overlap(other.page_content, doc.page_content, max_chars)
+            if size:
+                doc.page_content = doc.page_content[size:].lstrip(" .\n")
+                doc.metadata["overlap_trimmed"] = size
+                trimmed += 1
+                break
+    return trimmed
+
+
+def rerank(query_vector, docs, k, settings, relevance=None):
+    """MMR + deduplicación + recorte de solapes sobre candidatos traídos con vectores."""
+    vectors = [doc.metadata.pop(VECTOR_KEY, None) for doc in docs]
+    if not docs or any(vector is None for vector in vectors):
+        return docs[:k], {"candidates": len(docs), "duplicates": 0, "trimmed": 0}
+
+    selected, duplicates = mmr_select(
+        query_vector, vectors, k, settings["lambda"], settings["dedup_threshold"], relevance
+    )
+    chosen = [docs[i] for i in selected]
+    trimmed = trim_overlaps(chosen, settings["overlap_chars"])
+    return chosen, {"candidates": len(docs), "duplicates": duplicates, "trimmed": trimmed}
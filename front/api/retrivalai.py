@@ -3,13 +3,26 @@ import sys
 import json
 import os
 import glob
-import oracledb
-import oci
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+_IMPORTS_STARTED = time.perf_counter()
 
-from langchain_community.embeddings import OCIGenAIEmbeddings
-from langchain_community.vectorstores.oraclevs import OracleVS
-from langchain_community.vectorstores.utils import DistanceStrategy
-from langchain.schema import Document
+from ipc_framing import read_frame, result_frame, write_frame
+from query_cache import CachedQueryEmbeddings, QueryEmbeddingCache
+
+# dbai/ se monta en /app/backend: de ahí viene el pool de conexiones compartido.
+# dbpool, manifest y vector_search (oracledb, langchain_core) se importan
+# donde se usan: ver startup_report.py.
+sys.path.append(os.getenv("BACKEND_DIR", "/app/backend"))
+from context_packer import budget_settings, estimate_tokens, llm_model, max_answer_tokens, pack_context, usage_report
+from timings import StageTimer, timings_enabled, write_trace
+
+# Arranque del proceso por etapas (se reporta con STAGE_TIMINGS=1)
+startup = StageTimer()
+startup.add("imports", time.perf_counter() - _IMPORTS_STARTED)
+
+DEFAULT_QUESTION = "What do I need to know before using the Siebel application for the first time?"
 
 # ----------------------------------------
 # 0. Buscar archivo con COSTUMER en marketplace
@@ -26,13 +39,6 @@ def detect_costumer_env():
         print(f"⚠️ Error buscando COSTUMER: {e}")
     return None
 
-costumer = detect_costumer_env()
-if not costumer:
-    print("❌ No se detectó ningún cliente válido en /app/marketplace/")
-    exit(1)
-
-env_file = f"/app/backend/.env_{costumer}"
-
 # ----------------------------------------
 # 1. Cargar variables del archivo dinámico
 # ----------------------------------------
@@ -53,81 +59,158 @@ def load_env_vars(env_file):
         exit(1)
     return env_vars
 
-env_vars = load_env_vars(env_file)
-
 # ----------------------------------------
-# 2. Validación básica de variables
+# 2. Inicialización del motor (una vez por proceso)
+#
+# En modo CLI se ejecuta en cada pregunta; en modo --worker se ejecuta
+# una sola vez y el proceso queda caliente atendiendo preguntas. Está
+# partida en dos fases para el modo --zygote: prepare_engine sólo lee
+# ficheros locales y puede hacerse antes del fork; connect_engine abre
+# sockets (Oracle, OCI) y tiene que hacerse en el hijo.
+#
+# Los módulos pesados (oci, embed_client, numpy vía answer_cache) se
+# importan aquí y no al cargar el script: ver startup_report.py.
 # ----------------------------------------
-required_vars = ["IP", "PORT", "ORACLE_PWD"]
-missing = [var for var in required_vars if not os.getenv(var)]
+db_pool = None
+llm_client = None
+llm_compartment_id = None
+embed_model = None
+query_cache = None
+answer_cache = None
+costumer = None
+engine_env = None
+llm_executor = None
+
+
+def fake_backends():
+    return os.getenv("RETRIEVAL_FAKE_BACKENDS") == "1"
+
+
+def preload_modules():
+    # Zygote: importar en el padre todo lo que el hijo va a necesitar
+    if fake_backends():
+        import loadtest_fakes  # noqa: F401
+    else:
+        import oci  # noqa: F401
+        import oci.generative_ai_inference  # noqa: F401
+        from oci.generative_ai_inference.models import ChatDetails  # noqa: F401
+        import embed_client  # noqa: F401
+    import answer_cache  # noqa: F401
+    import dbpool  # noqa: F401
+    import manifest  # noqa: F401
+    import rerank  # noqa: F401
+    import vector_search  # noqa: F401
+
+
+def prepare_engine():
+    global costumer, engine_env
+
+    # Pruebas de carga: OCI y Oracle sustituidos por stand-ins locales (loadtest.py)
+    if fake_backends():
+        costumer = "loadtest"
+        engine_env = {}
+        startup.lap("env")
+        return
+
+    costumer = detect_costumer_env()
+    if not costumer:
+        print("❌ No se detectó ningún cliente válido en /app/marketplace/")
+        exit(1)
 
-if missing:
-    print(f"❌ Missing required environment variables: {', '.join(missing)}")
-    exit(1)
+    env_file = f"/app/backend/.env_{costumer}"
+    engine_env = load_env_vars(env_file)
 
-# ----------------------------------
-# 3. Captura la pregunta
-# ----------------------------------
-if len(sys.argv) > 1:
-    user_question = sys.argv[1]
-else:
-    user_question = "What do I need to know before using the Siebel application for the first time?"
+    # Validación básica de variables
+    required_vars = ["IP", "PORT", "ORACLE_PWD"]
+    missing = [var for var in required_vars if not os.getenv(var)]
 
-# ----------------------------------
-# 4. Conexión a Oracle DB
-# ----------------------------------
-dsn = f"{os.getenv('IP')}:{os.getenv('PORT')}/freepdb1".upper()
-conn23c = oracledb.connect(
-    user="sys",
-    password=os.getenv("ORACLE_PWD"),
-    dsn=dsn,
-    mode=oracledb.AUTH_MODE_SYSDBA
-)
+    if missing:
+        print(f"❌ Missing required environment variables: {', '.join(missing)}")
+        exit(1)
+    startup.lap("env")
+
+
+def connect_engine():
+    global db_pool, llm_client, llm_compartment_id, embed_model, query_cache, answer_cache, llm_executor
+
+    from answer_cache import AnswerCache
+
+    # Con .env_<COSTUMER> ya cargado: LLM_CONCURRENCY puede venir de ahí
+    llm_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_CONCURRENCY", "4")), thread_name_prefix="llm")
+
+    if fake_backends():
+        import loadtest_fakes
+        db_pool = loadtest_fakes.FakePool()
+        llm_client = loadtest_fakes.FakeChatClient()
+        query_cache = QueryEmbeddingCache.from_env()
+        embed_model = CachedQueryEmbeddings(loadtest_fakes.FakeEmbeddings(), "loadtest", query_cache)
+        answer_cache = AnswerCache.from_env()
+        startup.lap("fake_backends")
+        return
+
+    import oci
+    from dbpool import create_pool_from_env
+    from embed_client import OCIBatchEmbeddings
+
+    # ----------------------------------
+    # 4. Pool de conexiones a Oracle DB (POOL_* en .env_<COSTUMER>)
+    # ----------------------------------
+    db_pool = create_pool_from_env(engine_env)
+    startup.lap("oracle_pool")
+
+    # ----------------------------------
+    # 5. Parámetros de OCI para Embeddings
+    # ----------------------------------
+    embed_compartment_id = "ocid1.compartment.oc1..aaaaaaaanb4wwcxt27nwxmwad6ddxckr6f6h7biazhouccnfjfq5acvbjd6q"
+    embed_config = oci.config.from_file('~/.oci/config', "DEFAULT")
+    embed_endpoint = "https://inference.generativeai.us-chicago-1.oci.oraclecloud.com"
+
+    # ----------------------------------
+    # 6. Inicializa embeddings de OCI
+    #
+    # Mismo cliente que la ingesta (embed_client), sin cargar langchain_community
+    # ----------------------------------
+    embed_model_id = "cohere.embed-english-v3.0"
+    query_cache = QueryEmbeddingCache.from_env()
+    embed_model = CachedQueryEmbeddings(
+        OCIBatchEmbeddings.from_env(engine_env, embed_config, embed_endpoint, embed_model_id, embed_compartment_id),
+        embed_model_id,
+        query_cache,
+    )
+    answer_cache = AnswerCache.from_env()
+    startup.lap("embed_client")
+
+    # 7. La búsqueda sobre MY_DEMO la hace vector_search.search_chunks
+    #    (approx con el índice vectorial o exact, RETRIEVAL_SEARCH_MODE)
+
+    # ----------------------------------
+    # 8. Configuración Independiente para LLM
+    # ----------------------------------
+    llm_compartment_id = "ocid1.compartment.oc1..aaaaaaaaxibr4amfvjf353m3nwpga7gvcrgpmkou2manorv2htmvjazrbcxa"
+    llm_config = oci.config.from_file('~/.oci/config2', "DEFAULT")
+    llm_endpoint = "https://inference.generativeai.us-chicago-1.oci.oraclecloud.com"
+
+    # Cliente de inferencia LLM independiente
+    llm_client = oci.generative_ai_inference.GenerativeAiInferenceClient(
+        config=llm_config,
+        service_endpoint=llm_endpoint,
+        retry_strategy=oci.retry.NoneRetryStrategy(),
+        timeout=(10, 240)
+    )
+    startup.lap("llm_client")
 
-# ----------------------------------
-# 5. Parámetros de OCI para Embeddings
-# ----------------------------------
-embed_compartment_id = "ocid1.compartment.oc1..aaaaaaaanb4wwcxt27nwxmwad6ddxckr6f6h7biazhouccnfjfq5acvbjd6q"
-embed_config = oci.config.from_file('~/.oci/config', "DEFAULT")
-embed_endpoint = "https://inference.generativeai.us-chicago-1.oci.oraclecloud.com"
 
-# ----------------------------------
-# 6. Inicializa embeddings de OCI
-# ----------------------------------
-embed_model = OCIGenAIEmbeddings(
-    model_id="cohere.embed-english-v3.0",
-    service_endpoint=embed_endpoint,
-    compartment_id=embed_compartment_id
-)
+def init_engine():
+    prepare_engine()
+    connect_engine()
 
-# ----------------------------------
-# 7. Vector store y retriever
-# ----------------------------------
-vs = OracleVS(
-    embedding_function=embed_model,
-    client=conn23c,
-    table_name="MY_DEMO",
-    distance_strategy=DistanceStrategy.DOT_PRODUCT
-)
-retriever = vs.as_retriever(search_type="similarity", search_kwargs={'k': 5})
+def chat_with_oci(prompt_text: str, on_token=None, max_tokens=16000) -> str:
+    """Función independiente para interactuar con el LLM.
 
-# ----------------------------------
-# 8. Configuración Independiente para LLM
-# ----------------------------------
-llm_compartment_id = "ocid1.compartment.oc1..aaaaaaaaxibr4amfvjf353m3nwpga7gvcrgpmkou2manorv2htmvjazrbcxa"
-llm_config = oci.config.from_file('~/.oci/config2', "DEFAULT")
-llm_endpoint = "https://inference.generativeai.us-chicago-1.oci.oraclecloud.com"
-
-# Cliente de inferencia LLM independiente
-llm_client = oci.generative_ai_inference.GenerativeAiInferenceClient(
-    config=llm_config,
-    service_endpoint=llm_endpoint,
-    retry_strategy=oci.retry.NoneRetryStrategy(),
-    timeout=(10, 240)
-)
-
-def chat_with_oci(prompt_text: str) -> str:
-    """Función independiente para interactuar con el LLM"""
+    Si se pasa on_token la respuesta se pide en streaming y cada fragmento
+    de texto se entrega a on_token a medida que llega. max_tokens lo fija
+    el presupuesto de context_packer.
+    """
     from oci.generative_ai_inference.models import (
         ChatDetails, TextContent, Message,
         GenericChatRequest, OnDemandServingMode, BaseChatRequest
@@ -145,18 +228,18 @@ def chat_with_oci(prompt_text: str) -> str:
     chat_request = GenericChatRequest()
     chat_request.api_format = BaseChatRequest.API_FORMAT_GENERIC
     chat_request.messages = [message]
-    chat_request.max_tokens = 16000
+    chat_request.max_tokens = max_tokens
     chat_request.temperature = 1
     chat_request.frequency_penalty = 0
     chat_request.presence_penalty = 0
     chat_request.top_p = 1
     chat_request.top_k = 0
+    chat_request.is_stream = on_token is not None
 
     # Configuración de los detalles del chat
     chat_detail = ChatDetails()
-    chat_detail.serving_mode = OnDemandServingMode(
-        model_id="ocid1.generativeaimodel.oc1.us-chicago-1.amaaaaaask7dceya663hlflxfx6kiwn7qjlnpye6n7caii5lnvcpjlwr2s2q"
-    )
+    # Mismo modelo con el que context_packer calcula el presupuesto (LLM_MODEL)
+    chat_detail.serving_mode = OnDemandServingMode(model_id=llm_model())
     chat_detail.chat_request = chat_request
     chat_detail.compartment_id = llm_compartment_id
 
@@ -164,28 +247,211 @@ def chat_with_oci(prompt_text: str) -> str:
     chat_response = llm_client.chat(chat_detail)
 
     # Procesamiento de la respuesta
-    return chat_response.data.chat_response.choices[0].message.content[0].text
+    if on_token is None:
+        return chat_response.data.chat_response.choices[0].message.content[0].text
+
+    # Streaming: eventos SSE con fragmentos de message.content[].text
+    pieces = []
+    for event in chat_response.data.events():
+        data = json.loads(event.data)
+        for part in (data.get("message") or {}).get("content") or []:
+            text = part.get("text")
+            if text:
+                pieces.append(text)
+                on_token(text)
+    return "".join(pieces)
 
 # ----------------------------------
-# 9. Recuperación de chunks + metadata + texto
+# 8b. Generación concurrente de ambas respuestas
+#
+# Las dos llamadas al LLM van en paralelo, cada una con su timeout
+# (LLM_TIMEOUT_ANSWER / LLM_TIMEOUT_ANSWER2, en segundos). Con
+# ANSWER2_MODE=partial no se bloquea esperando answer2: se devuelve
+# answer en cuanto está lista (más ANSWER2_GRACE_S de margen) y answer2
+# queda como "pending"; si llega más tarde se entrega por
+# on_late_answer2(update, respuestas ya devueltas).
+# Los modos de un proceso por pregunta (CLI, --frame, zygote) esperan
+# siempre: el proceso termina al responder y answer2 se perdería.
+# Con on_token(field, text) ambas respuestas se generan en streaming.
 # ----------------------------------
-docs: list[Document] = retriever.get_relevant_documents(user_question)
+# Dos llamadas por pregunta en llm_executor (se crea en connect_engine):
+# chat_service.py sube LLM_CONCURRENCY a 2 x CHAT_MAX_CONCURRENCY
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+def _late_result(future):
+    try:
+        return {"answer2": future.result().strip(), "answer2_status": "ok"}
+    except Exception as e:
+        return {"answer2": "", "answer2_status": "failed", "answer2_error": str(e)}
+
+
+def _timed(timer, stage, fn, *args):
+    with timer.stage(stage):
+        return fn(*args)
 
-# Añadir texto directamente al metadata
-for doc in docs:
-    doc.metadata["text"] = doc.page_content
 
-# Construir contexto para el modelo
-context_text = "\n\n".join(doc.page_content for doc in docs)
+def generate_answers(full_prompt, engineer_prompt, on_late_answer2=None, on_token=None, timer=None, max_tokens=None):
+    timer = timer or StageTimer(enabled=False)
+    max_tokens = max_tokens or {"answer": 16000, "answer2": 16000}
+    timeout_answer = _env_float("LLM_TIMEOUT_ANSWER", 240)
+    timeout_answer2 = _env_float("LLM_TIMEOUT_ANSWER2", 240)
+    # En streaming answer2 ya llega incrementalmente: no hace falta el modo partial
+    partial = os.getenv("ANSWER2_MODE", "wait") == "partial" and on_token is None
+
+    token_cb = token2_cb = None
+    if on_token is not None:
+        token_cb = lambda text: on_token("answer", text)
+        token2_cb = lambda text: on_token("answer2", text)
+
+    started = time.monotonic()
+    answer_future = llm_executor.submit(
+        _timed, timer, "chat_answer", chat_with_oci, full_prompt, token_cb, max_tokens["answer"]
+    )
+    answer2_future = llm_executor.submit(
+        _timed, timer, "chat_answer2", chat_with_oci, engineer_prompt, token2_cb, max_tokens["answer2"]
+    )
 
-# Crear ambos prompts
-full_prompt = f"""Answer the question based only on the following context:
+    try:
+        answer = answer_future.result(timeout=timeout_answer).strip()
+    except FutureTimeout:
+        raise TimeoutError(f"LLM answer timed out after {timeout_answer:.0f}s")
+
+    result = {"answer": answer}
+    try:
+        if partial:
+            wait_s = _env_float("ANSWER2_GRACE_S", 0)
+        else:
+            wait_s = max(0.0, timeout_answer2 - (time.monotonic() - started))
+        result["answer2"] = answer2_future.result(timeout=wait_s).strip()
+        result["answer2_status"] = "ok"
+    except FutureTimeout:
+        result["answer2"] = ""
+        if partial:
+            result["answer2_status"] = "pending"
+            if on_late_answer2 is not None:
+                # Se pasa result: si answer2 ya terminó el callback corre aquí mismo,
+                # antes de que el llamador tenga el valor de retorno
+                answer2_future.add_done_callback(lambda f: on_late_answer2(_late_result(f), result))
+        else:
+            result["answer2_status"] = "failed"
+            result["answer2_error"] = f"timed out after {timeout_answer2:.0f}s"
+    except Exception as e:
+        result["answer2"] = ""
+        result["answer2_status"] = "failed"
+        result["answer2_error"] = str(e)
+    return result
+
+# ----------------------------------
+# 9. Versión del corpus (para la cache de respuestas)
+#
+# Se consulta como mucho cada ANSWER_CACHE_VERSION_CHECK_S segundos.
+# ----------------------------------
+_corpus = {"version": None, "checked": 0.0}
+
+
+def current_corpus_version():
+    if time.monotonic() - _corpus["checked"] >= _env_float("ANSWER_CACHE_VERSION_CHECK_S", 10):
+        from dbpool import connection
+        from manifest import corpus_version
+
+        with connection(db_pool) as conn:
+            _corpus["version"] = corpus_version(conn, "MY_DEMO")
+        _corpus["checked"] = time.monotonic()
+    return _corpus["version"]
+
+# ----------------------------------
+# 10. Recuperación de chunks + metadata + texto
+#
+# Con RETRIEVAL_HYBRID=1 se piden RETRIEVAL_HYBRID_CANDIDATES chunks a la
+# búsqueda vectorial y a la léxica y se fusionan (RRF). Con RETRIEVAL_MMR=1
+# se traen RETRIEVAL_MMR_CANDIDATES con sus embeddings y rerank.py elige
+# los k finales sin duplicados (ver rerank.py).
+# ----------------------------------
+def retrieve(user_question, query_vector, search, timer):
+    from vector_search import rrf_fuse, search_chunks, search_text
+
+    k = search["k"]
+    if search["mmr"]:
+        from rerank import rerank, rerank_settings
+        rerank_config = rerank_settings()
+        k = max(rerank_config["candidates"], k)
+
+    relevance = None
+    if not search["hybrid"]:
+        with timer.stage("vector_search"):
+            docs = search_chunks(
+                db_pool, "MY_DEMO", query_vector, k, search["mode"], search["accuracy"], search["mmr"]
+            )
+    else:
+        candidates = max(search["candidates"], k)
+        with timer.stage("vector_search"):
+            vector_docs = search_chunks(
+                db_pool, "MY_DEMO", query_vector, candidates, search["mode"], search["accuracy"], search["mmr"]
+            )
+        with timer.stage("text_search"):
+            text_docs = search_text(db_pool, "MY_DEMO", user_question, candidates, search["mmr"])
+        with timer.stage("fusion"):
+            docs = rrf_fuse(
+                [vector_docs, text_docs], [search["vector_weight"], search["text_weight"]],
+                k, search["rrf_k"],
+            )
+        # En híbrida la relevancia para MMR es la de la fusión, no sólo la vectorial
+        relevance = [doc.metadata["rrf_score"] for doc in docs]
+
+    if not search["mmr"]:
+        return docs, None
+    with timer.stage("rerank"):
+        return rerank(query_vector, docs, search["k"], rerank_config, relevance)
+
+
+def answer_question(user_question: str, on_late_answer2=None, on_token=None, timer=None) -> dict:
+    from vector_search import search_settings
+
+    timer = timer or StageTimer(enabled=False)
+    search = search_settings()
+    with timer.stage("embed_query"):
+        query_vector = embed_model.embed_query(user_question)
+
+    version = None
+    if answer_cache is not None:
+        with timer.stage("answer_cache"):
+            version = current_corpus_version()
+            cached = answer_cache.lookup(costumer, version, query_vector)
+        if cached is not None:
+            return {"question": user_question, **cached}
+
+    docs, rerank_stats = retrieve(user_question, query_vector, search, timer)
+
+    def context_prompt(context_text):
+        return f"""Answer the question based only on the following context:
 {context_text}
 
 Question: {user_question}
 """
 
-engineer_prompt = f"""Act as a professional engineer with formal technical knowledge. 
+    # Sólo entran los chunks que caben en el presupuesto de tokens (context_packer.py)
+    budget = budget_settings()
+    with timer.stage("context_pack"):
+        docs, context_stats = pack_context(docs, estimate_tokens(context_prompt(""), budget["factor"]), budget)
+
+    # Añadir texto directamente al metadata
+    for doc in docs:
+        doc.metadata["text"] = doc.page_content
+
+    # Construir contexto para el modelo
+    context_text = "\n\n".join(doc.page_content for doc in docs)
+
+    # Crear ambos prompts
+    full_prompt = context_prompt(context_text)
+
+    engineer_prompt = f"""Act as a professional engineer with formal technical knowledge. 
 Answer the following question precisely and technically, based only on your trained knowledge:
 
 Question: {user_question}
@@ -199,18 +465,301 @@ Provide:
 Answer in Spanish unless the question is in English.
 """
 
-# Obtener ambas respuestas
-answer = chat_with_oci(full_prompt).strip()
-answer2 = chat_with_oci(engineer_prompt).strip()
+    chunks_metadata = [doc.metadata for doc in docs]
+
+    prompt_tokens = {
+        "answer": estimate_tokens(full_prompt, budget["factor"]),
+        "answer2": estimate_tokens(engineer_prompt, budget["factor"]),
+    }
+    max_tokens = {field: max_answer_tokens(tokens, budget) for field, tokens in prompt_tokens.items()}
+
+    # Sólo se cachean respuestas completas; una answer2 tardía se guarda al llegar
+    def remember(answers):
+        if answer_cache is not None and answers.get("answer2_status") == "ok":
+            answer_cache.store(costumer, version, user_question, query_vector, {
+                "answer": answers["answer"],
+                "answer2": answers["answer2"],
+                "answer2_status": "ok",
+                "retrieved_chunks_metadata": chunks_metadata,
+            })
+
+    def on_late(update, base):
+        if update.get("answer2_status") == "ok":
+            remember({**base, **update})
+        if on_late_answer2 is not None:
+            on_late_answer2(update)
+
+    # Obtener ambas respuestas en paralelo
+    answers = generate_answers(full_prompt, engineer_prompt, on_late, on_token, timer, max_tokens)
+    remember(answers)
+
+    # ----------------------------------
+    # 11. Salida en formato JSON
+    # ----------------------------------
+    output = {
+        "question": user_question,
+        **answers,
+        "retrieved_chunks_metadata": chunks_metadata,
+        "context": context_stats,
+        "usage": usage_report(prompt_tokens, answers, max_tokens, budget),
+    }
+    if rerank_stats is not None:
+        output["rerank"] = rerank_stats
+    return output
+
+def timed_answer(user_question, trace_id=None, on_late_answer2=None, on_token=None, with_startup=False):
+    """answer_question + `timings` en la salida y una línea en el trace log (STAGE_TIMINGS=1)."""
+    timer = StageTimer(enabled=timings_enabled())
+    try:
+        with timer.stage("total"):
+            output = answer_question(user_question, on_late_answer2, on_token, timer)
+    except Exception as e:
+        if timer.enabled:
+            write_trace("retrieval", trace_id, timer.as_ms(), status="error", error=str(e))
+        raise
+
+    if timer.enabled:
+        timings = timer.as_ms()
+        if with_startup:
+            timings.update({f"startup_{stage}": ms for stage, ms in startup.as_ms().items()})
+        output["timings"] = timings
+        write_trace(
+            "retrieval", trace_id, timings, status="ok",
+            cache_hit=bool(output.get("cache")), answer2_status=output.get("answer2_status"),
+        )
+    return output
+
+# ----------------------------------
+# 12. Modo worker: proceso caliente detrás del pool de Node
+#
+# stdout queda reservado para los frames; cualquier print del pipeline
+# se redirige a stderr para no corromper el canal.
+#
+# Es el modo (junto con chat_service.py) en el que ANSWER2_MODE=partial
+# tiene efecto: la answer2 tardía sale como frame "update" después del
+# frame "result" de su pregunta, nunca antes (LateUpdateGate).
+# ----------------------------------
+class LateUpdateGate:
+    """Retiene la answer2 tardía hasta que se ha enviado el resultado.
+
+    generate_answers puede llamar a on_late_answer2 en su propio hilo si
+    answer2 termina justo al registrar el callback, antes de que el worker
+    haya escrito el frame "result".
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.lock = threading.Lock()
+        self.released = False
+        self.held = None
+
+    def __call__(self, update):
+        with self.lock:
+            if not self.released:
+                self.held = update
+                return
+        self.send(update)
+
+    def release(self):
+        with self.lock:
+            self.released = True
+            update, self.held = self.held, None
+        if update is not None:
+            self.send(update)
+
+
+def run_worker():
+    from dbpool import pool_stats
+
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    channel_in = sys.stdin.buffer
+
+    # answer2 tardías se escriben desde otro hilo: serializar el acceso al canal
+    channel_lock = threading.Lock()
+
+    def send(message):
+        with channel_lock:
+            write_frame(channel_out, message)
+
+    try:
+        init_engine()
+    except BaseException as e:
+        send({"type": "fatal", "message": str(e)})
+        raise
+
+    served = 0
+    send({"type": "ready", "pid": os.getpid(), "startup": startup.as_ms()})
+
+    while True:
+        request = read_frame(channel_in)
+        if request is None:
+            break
+
+        request_id = request.get("id")
+        op = request.get("op")
+
+        if op == "ping":
+            send({
+                "id": request_id, "type": "pong", "served": served,
+                "db_pool": pool_stats(db_pool), "query_cache": query_cache.stats(),
+                "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+            })
+        elif op in ("ask", "stream"):
+            late_update = LateUpdateGate(
+                lambda update, request_id=request_id: send({"id": request_id, "type": "update", "output": update})
+            )
+
+            def on_token(field, text, request_id=request_id):
+                send({"id": request_id, "type": "token", "field": field, "text": text})
+
+            try:
+                output = timed_answer(
+                    request.get("question") or DEFAULT_QUESTION,
+                    request.get("trace_id") or request_id,
+                    late_update,
+                    on_token if op == "stream" else None,
+                )
+                output["request_id"] = request_id
+                send(result_frame(request_id, output))
+            except Exception as e:
+                print(f"❌ Error procesando pregunta {request_id}: {e}")
+                send({"id": request_id, "type": "error", "message": str(e)})
+            finally:
+                late_update.release()
+            served += 1
+        else:
+            send({"id": request_id, "type": "error", "message": f"Operación desconocida: {op}"})
+
+# ----------------------------------
+# 13. Modo zygote (prefork)
+#
+# El padre importa todo y lee la configuración una sola vez; por cada
+# conexión al socket Unix hace fork y el hijo sólo abre sus conexiones
+# (Oracle, OCI), responde una pregunta y termina. Mismo framing que el
+# modo worker: {"op": "ask", "question", "trace_id"} -> result | error.
+# ----------------------------------
+def serve_forked(conn):
+    stream = conn.makefile("rwb")
+    request = read_frame(stream)
+    if request is None:
+        return
+    trace_id = request.get("trace_id")
+    # El hijo no sobrevive a la respuesta: answer2 se espera siempre
+    os.environ["ANSWER2_MODE"] = "wait"
+    # Lo que se reporta como arranque es sólo lo que paga cada petición
+    startup.seconds.clear()
+    startup.last = time.perf_counter()
+    try:
+        connect_engine()
+        output = timed_answer(request.get("question") or DEFAULT_QUESTION, trace_id, with_startup=True)
+        output["request_id"] = trace_id
+        write_frame(stream, result_frame(trace_id, output))
+    except Exception as e:
+        print(f"❌ Error procesando pregunta {trace_id}: {e}")
+        write_frame(stream, {"id": trace_id, "type": "error", "message": str(e)})
+
+
+def run_zygote(socket_path):
+    import signal
+    import socket
+
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    preload_modules()
+    prepare_engine()
+    startup.lap("preload")
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(128)
+
+    def shutdown(signum, frame):
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    # Los hijos se recogen solos
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    write_frame(channel_out, {"type": "ready", "pid": os.getpid(), "startup": startup.as_ms()})
+
+    while True:
+        try:
+            conn, _ = server.accept()
+        except InterruptedError:
+            continue
+        pid = os.fork()
+        if pid == 0:
+            server.close()
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(signum, signal.SIG_DFL)
+            try:
+                serve_forked(conn)
+            finally:
+                sys.stderr.flush()
+                os._exit(0)
+        conn.close()
+
+# ----------------------------------
+# 14. Modo exec con frame: una pregunta, la salida como un frame msgpack
+#
+# Lo usa el controlador de Node sin pool (RETRIEVAL_POOL_SIZE=0): igual que
+# el worker, stdout sólo lleva el frame y los print van a stderr.
+# ----------------------------------
+def run_framed(user_question):
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    trace_id = os.getenv("TRACE_ID")
+    try:
+        init_engine()
+        # El proceso no sobrevive a la respuesta: answer2 se espera siempre
+        os.environ["ANSWER2_MODE"] = "wait"
+        output = timed_answer(user_question, trace_id, with_startup=True)
+        write_frame(channel_out, result_frame(trace_id, output))
+    except Exception as e:
+        print(f"❌ Error procesando pregunta {trace_id}: {e}")
+        write_frame(channel_out, {"id": trace_id, "type": "error", "message": str(e)})
 
 # ----------------------------------
-# 10. Salida en formato JSON
+# 15. Punto de entrada: CLI (una pregunta), --worker, --frame <pregunta>
+#     o --zygote <socket>
 # ----------------------------------
-output = {
-    "question": user_question,
-    "answer": answer,
-    "answer2": answer2,
-    "retrieved_chunks_metadata": [doc.metadata for doc in docs]
-}
-
-print(json.dumps(output, ensure_ascii=False, indent=2))
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        run_worker()
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "--frame":
+        run_framed(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_QUESTION)
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == "--zygote":
+        run_zygote(sys.argv[2])
+        return
+
+    # 3. Captura la pregunta
+    if len(sys.argv) > 1:
+        user_question = sys.argv[1]
+    else:
+        user_question = DEFAULT_QUESTION
+
+    init_engine()
+    # El proceso no sobrevive a la respuesta: answer2 se espera siempre
+    # (después de init_engine, que carga .env_<COSTUMER>)
+    os.environ["ANSWER2_MODE"] = "wait"
+    # En modo exec el controlador de Node pasa su request id por el entorno
+    output = timed_answer(user_question, os.getenv("TRACE_ID"), with_startup=True)
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# ----------------------------------------
+# Single-flight: preguntas iguales en curso comparten una sola ejecución
+#
+# En una formación media sala pregunta lo mismo a la vez; sin esto cada
+# petición hace su embed + búsqueda + dos llamadas al LLM. La clave es
+# (cliente de la petición —cabecera X-Costumer, como en la admisión—,
+# pregunta normalizada como en query_cache, modo de respuesta): la primera
+# petición lanza el pipeline y las que llegan mientras tanto esperan ese
+# mismo resultado (o el mismo error).
+#
+# En streaming los tokens ya emitidos se reenvían al que se une tarde y
+# los siguientes le llegan a todos. La ejecución es una tarea aparte: si
+# el cliente que la lanzó se desconecta, los demás siguen esperándola.
+#
+#   CHAT_COALESCE=1   0 para desactivarlo
+# ----------------------------------------
+import asyncio
+
+from query_cache import normalize_question
+
+
+def flight_key(costumer, question, mode):
+    return costumer, normalize_question(question), mode
+
+
+class Flight:
+    def __init__(self):
+        self.task = None
+        self.tokens = []
+        self.listeners = []
+        self.followers = 0
+
+    def emit(self, field, text):
+        # Siempre en el hilo del event loop
+        self.tokens.append((field, text))
+        for listener in self.listeners:
+            listener(field, text)
+
+
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key, start, on_token=None):
+        """start(flight) -> corrutina; devuelve (resultado, True si se unió a una en curso)."""
+        flight = self.flights.get(key)
+        coalesced = flight is not None
+        if coalesced:
+            flight.followers += 1
+            self.coalesced += 1
+            if on_token is not None:
+                for field, text in flight.tokens:
+                    on_token(field, text)
+        else:
+            flight = self.flights[key] = Flight()
+            self.leaders += 1
+            flight.task = asyncio.ensure_future(start(flight))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight, task))
+
+        if on_token is not None:
+            flight.listeners.append(on_token)
+        try:
+            return await asyncio.shield(flight.task), coalesced
+        finally:
+            if on_token is not None:
+                flight.listeners.remove(on_token)
+
+    def _finish(self, key, flight, task):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        # Marca la excepción como leída aunque todos los que esperaban se hayan ido
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
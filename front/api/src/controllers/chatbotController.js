@@ -1,34 +1,194 @@
-const { exec } = require('child_process');
+const { execFile } = require('child_process');
+const { randomUUID } = require('crypto');
 const path = require('path');
+const { getPool } = require('../services/retrievalPool');
+const { getZygote } = require('../services/zygote');
+const { observeRequest, observeTimings, observeQueueWait, render } = require('../services/metrics');
+const { singleFlight, flightKey } = require('../services/singleFlight');
+const { getAdmission } = require('../services/admission');
+const { MSGPACK_TYPE, IPC_ENV, createFrameReader, PackedOutput, encodeEnvelope } = require('../services/ipcFraming');
+
+// RETRIEVAL_POOL_SIZE=0 vuelve al modo anterior: un proceso Python por pregunta
+const usePool = () => process.env.RETRIEVAL_POOL_SIZE !== '0';
+// Sin pool, RETRIEVAL_ZYGOTE=1 hace fork de un proceso ya importado en lugar de exec
+const useZygote = () => !usePool() && process.env.RETRIEVAL_ZYGOTE === '1';
+
+// Request id (X-Request-Id o uno nuevo) que acompaña a la pregunta hasta el
+// trace log de Python, y latencia de punta a punta para /metrics
+const trackRequest = (req, res, route) => {
+  const requestId = req.get('X-Request-Id') || randomUUID();
+  const startedAt = Date.now();
+  res.set('X-Request-Id', requestId);
+  res.on('finish', () => observeRequest(route, res.statusCode, startedAt));
+  return requestId;
+};
+
+// Cliente para los límites de admisión: cabecera X-Costumer o el del despliegue
+const requestTenant = (req) => req.get('X-Costumer') || process.env.COSTUMER || '';
+
+// Sólo la pregunta que lanza la ejecución ocupa hueco (las que se unen por
+// single-flight no); los rechazos se cuentan en queue_wait_seconds
+const admitted = (tenant, run) => getAdmission()
+  .run(tenant, run, (waitedMs) => observeQueueWait('admitted', waitedMs))
+  .catch((error) => {
+    if (error.reason === 'queue_timeout') observeQueueWait('timeout', error.waitedMs);
+    throw error;
+  });
+
+const sendRejected = (res, error) => {
+  res.set('Retry-After', String(error.retryAfter));
+  res.status(error.status).json({ error: true, message: error.message, reason: error.reason });
+};
+
+// retrivalai.py --frame: stdout trae sólo el frame msgpack con el resultado,
+// así que un print suelto ya no rompe la respuesta
+const askWithExec = (question, requestId) => new Promise((resolve, reject) => {
+  const scriptPath = path.join(__dirname, '..', '..',  'retrivalai.py');
+
+  const python = process.env.PYTHON_BIN || 'python';
+  const options = {
+    env: { ...process.env, ...IPC_ENV, TRACE_ID: requestId },
+    encoding: 'buffer',
+    maxBuffer: 80 * 1024 * 1024,
+  };
+
+  execFile(python, [scriptPath, '--frame', question], options, (error, stdout, stderr) => {
+    if (stderr.length) {
+      console.error("⚠️ stderr de Python:", stderr.toString().trimEnd());
+    }
+
+    let message = null;
+    createFrameReader((frame) => { message = message || frame; }, () => {})(stdout);
+    if (message && message.type === 'result') {
+      return resolve(PackedOutput.fromFrame(message));
+    }
+    const reason = (message && message.message) || (error && error.message) || 'El script no devolvió ningún resultado';
+    console.error("❌ Error ejecutando Python:", reason);
+    reject(new Error(reason));
+  });
+});
+
+// PackedOutput con la salida de retrivalai, igual en los tres modos
+const runQuestion = (question, requestId) => {
+  let output;
+  if (usePool()) output = getPool().ask(question, requestId);
+  else if (useZygote()) output = getZygote().ask(question, requestId);
+  else output = askWithExec(question, requestId);
+  return output.then((packed) => {
+    observeTimings(packed.timings);
+    return packed;
+  });
+};
+
+// Cliente msgpack (Accept: application/msgpack): la salida va tal cual la
+// codificó Python. Cliente JSON: se mantiene el contrato anterior, con
+// `response` como el JSON del script en texto (con el canal en JSON ya
+// viene así). Sin msgpack en el canal todos reciben JSON.
+const sendOutput = (req, res, question, packed) => {
+  if (!packed.isJson && req.accepts(['application/json', MSGPACK_TYPE]) === MSGPACK_TYPE) {
+    return res.type(MSGPACK_TYPE).send(encodeEnvelope({ success: true, question }, 'response', packed.bytes));
+  }
+  const response = packed.isJson ? packed.bytes.toString('utf8') : JSON.stringify(packed.decode(), null, 2);
+  res.json({ success: true, question, response });
+};
 
 exports.askChatbot = (req, res) => {
+  const requestId = trackRequest(req, res, 'chatbot');
   const { question } = req.body;
 
   if (!question) {
     return res.status(400).json({ error: true, message: "No se envió ninguna pregunta." });
   }
 
-  const scriptPath = path.join(__dirname, '..', '..',  'retrivalai.py');
+  // Preguntas iguales en curso comparten ejecución (singleFlight.js)
+  const tenant = requestTenant(req);
+  singleFlight.run(flightKey(tenant, question, 'ask'), () => admitted(tenant, () => runQuestion(question, requestId)))
+    .then(({ value: packed, coalesced }) => {
+      if (coalesced) res.set('X-Coalesced', '1');
+      sendOutput(req, res, question, packed);
+    })
+    .catch((error) => {
+      if (error.retryAfter) return sendRejected(res, error);
+      console.error("❌ Error en el backend de retrieval:", error.message);
+      res.status(500).json({ error: true, message: error.message });
+    });
+};
 
-  const command = `python "${scriptPath}" "${question}"`;
+// Streaming SSE: `event: token` por cada fragmento y `event: done` con la salida completa
+exports.streamChatbot = (req, res) => {
+  const requestId = trackRequest(req, res, 'chatbot_stream');
+  const { question } = req.body;
 
-  exec(command, (error, stdout, stderr) => {
-    if (error) {
-      console.error("❌ Error ejecutando Python:", error.message);
-      return res.status(500).json({ error: true, message: error.message });
-    }
+  if (!question) {
+    return res.status(400).json({ error: true, message: "No se envió ninguna pregunta." });
+  }
 
-    if (stderr) {
-      console.error("⚠️ stderr de Python:", stderr);
-    }
+  if (!usePool()) {
+    return res.status(503).json({ error: true, message: "El streaming requiere el pool de retrieval." });
+  }
 
-    try {
-      const response = stdout.trim();
-      res.json({ success: true, question, response });
-    } catch (e) {
-      console.error("❌ Error procesando salida:", e);
-      res.status(500).json({ error: true, message: "Error procesando la respuesta." });
+  let open = true;
+  // res y no req: en Node >= 16 req emite 'close' en cuanto se ha leído el body
+  res.on('close', () => { open = false; });
+
+  // Las cabeceras SSE salen con el primer evento: un rechazo de la admisión
+  // todavía puede responder 429/503 con Retry-After
+  const sendEvent = (event, data) => {
+    if (!open) return;
+    if (!res.headersSent) {
+      res.set({
+        'Content-Type': 'text/event-stream; charset=utf-8',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no',
+      });
+      res.flushHeaders();
     }
-  });
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+  };
+
+  const tenant = requestTenant(req);
+  const startStream = (emit) => admitted(tenant, () => getPool()
+    .stream(question, (message) => emit({ field: message.field, text: message.text }), requestId))
+    .then((packed) => {
+      observeTimings(packed.timings);
+      return packed;
+    });
+
+  singleFlight.run(flightKey(tenant, question, 'stream'), startStream, (token) => sendEvent('token', token))
+    .then(({ value: packed }) => sendEvent('done', packed.decode()))
+    .catch((error) => {
+      if (error.retryAfter && !res.headersSent) return sendRejected(res, error);
+      console.error("❌ Error en el worker de retrieval (stream):", error.message);
+      sendEvent('error', { message: error.message });
+    })
+    .finally(() => { if (open && !res.writableEnded) res.end(); });
+};
+
+exports.poolHealth = (req, res) => {
+  if (useZygote()) {
+    return res.json({ success: true, pool: null, zygote: getZygote().stats(), admission: getAdmission().stats() });
+  }
+  if (!usePool()) {
+    return res.json({ success: true, pool: null, admission: getAdmission().stats() });
+  }
+  res.json({ success: true, pool: getPool().stats(), admission: getAdmission().stats() });
 };
 
+exports.lateAnswer = (req, res) => {
+  if (!usePool()) {
+    return res.status(404).json({ error: true, message: "Sin pool de retrieval activo." });
+  }
+  const output = getPool().lateResult(req.params.requestId);
+  if (!output) {
+    return res.json({ success: true, answer2_status: "pending" });
+  }
+  res.json({ success: true, ...output });
+};
+
+// Formato de texto Prometheus (GET /metrics)
+exports.metrics = (req, res) => {
+  res.type('text/plain; version=0.0.4').send(render(
+    usePool() ? getPool().stats() : null, singleFlight.stats(), getAdmission().stats(),
+  ));
+};
@@ -1,8 +1,11 @@
 const express = require('express');
 const router = express.Router();
-const { askChatbot } = require('../controllers/chatbotController');
+const { askChatbot, streamChatbot, poolHealth, lateAnswer } = require('../controllers/chatbotController');
 
 router.post('/chatbot', askChatbot);
+router.post('/chatbot/stream', streamChatbot);
+router.get('/chatbot/health', poolHealth);
+router.get('/chatbot/answer2/:requestId', lateAnswer);
 
 module.exports = router;
 
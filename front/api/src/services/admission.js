@@ -0,0 +1,187 @@
+// Control de admisión: preguntas en curso acotadas y cola limitada
+// (mismo comportamiento que admission.py en el servicio asyncio).
+//
+// Sin límite una ráfaga de 50 preguntas son 50 procesos Python (o 50
+// preguntas en la cola del pool), cada una con su sesión de Oracle y dos
+// llamadas al LLM. Cada pregunta pide un hueco antes de lanzarse: entra si
+// hay hueco global y de su cliente (cabecera X-Costumer, por defecto
+// COSTUMER); si no, espera en una cola FIFO acotada. Se rechaza enseguida,
+// con Retry-After, si la cola está llena, si la espera estimada supera el
+// presupuesto o si se agota esperando: 429 cuando el cliente se pasa de su
+// parte de la cola, 503 cuando es el servicio el que no da más.
+//
+//   CHAT_MAX_CONCURRENCY             en curso (por defecto RETRIEVAL_POOL_SIZE, o 4 sin pool)
+//   CHAT_MAX_QUEUE=32
+//   CHAT_QUEUE_TIMEOUT_S=15
+//   CHAT_TENANT_MAX_CONCURRENCY=0    0 = sin límite propio
+//   CHAT_TENANT_MAX_QUEUE=0          0 = sin límite propio
+
+const SERVICE_TIME_ALPHA = 0.2;
+
+const intFromEnv = (name, fallback) => {
+  const value = Number.parseInt(process.env[name] ?? '', 10);
+  return Number.isFinite(value) ? value : fallback;
+};
+
+class Rejected extends Error {
+  constructor(status, reason, message, retryAfter, waitedMs = 0) {
+    super(message);
+    this.status = status;
+    this.reason = reason;
+    this.retryAfter = retryAfter;
+    this.waitedMs = waitedMs;
+  }
+}
+
+class Admission {
+  constructor(options = {}) {
+    const poolSize = process.env.RETRIEVAL_POOL_SIZE === '0' ? 4 : intFromEnv('RETRIEVAL_POOL_SIZE', 2);
+    this.maxInFlight = options.maxInFlight ?? intFromEnv('CHAT_MAX_CONCURRENCY', poolSize);
+    this.maxQueue = options.maxQueue ?? intFromEnv('CHAT_MAX_QUEUE', 32);
+    this.queueTimeoutMs = options.queueTimeoutMs ?? Number(process.env.CHAT_QUEUE_TIMEOUT_S || 15) * 1000;
+    this.tenantMaxInFlight = options.tenantMaxInFlight ?? (intFromEnv('CHAT_TENANT_MAX_CONCURRENCY', 0) || this.maxInFlight);
+    this.tenantMaxQueue = options.tenantMaxQueue ?? intFromEnv('CHAT_TENANT_MAX_QUEUE', 0);
+
+    this.inFlight = 0;
+    this.tenants = new Map();
+    this.queued = new Map();
+    this.queue = [];
+    this.admitted = 0;
+    this.rejected = {};
+    this.serviceMs = null;
+  }
+
+  count(map, tenant) {
+    return map.get(tenant) || 0;
+  }
+
+  bump(map, tenant, delta) {
+    const value = this.count(map, tenant) + delta;
+    if (value > 0) map.set(tenant, value);
+    else map.delete(tenant);
+  }
+
+  hasRoom(tenant) {
+    return this.inFlight < this.maxInFlight && this.count(this.tenants, tenant) < this.tenantMaxInFlight;
+  }
+
+  admit(tenant) {
+    this.inFlight += 1;
+    this.bump(this.tenants, tenant, 1);
+    this.admitted += 1;
+  }
+
+  estimatedWaitMs() {
+    if (this.serviceMs === null) return null;
+    return (this.serviceMs * (this.queue.length + 1)) / this.maxInFlight;
+  }
+
+  retryAfter() {
+    return Math.max(1, Math.ceil((this.estimatedWaitMs() ?? this.queueTimeoutMs) / 1000));
+  }
+
+  reject(status, reason, message, waitedMs = 0) {
+    this.rejected[reason] = (this.rejected[reason] || 0) + 1;
+    return new Rejected(status, reason, message, this.retryAfter(), waitedMs);
+  }
+
+  // Error Rejected si la pregunta no va a poder entrar (no reserva nada)
+  check(tenant) {
+    if (this.count(this.queued, tenant) === 0 && this.hasRoom(tenant)) return null;
+    if (this.tenantMaxQueue && this.count(this.queued, tenant) >= this.tenantMaxQueue) {
+      return this.reject(429, 'tenant_queue_full', 'Demasiadas preguntas en cola para este cliente.');
+    }
+    if (this.queue.length >= this.maxQueue) {
+      return this.reject(503, 'queue_full', 'El servicio está saturado, inténtalo más tarde.');
+    }
+    const estimated = this.estimatedWaitMs();
+    if (estimated !== null && estimated > this.queueTimeoutMs) {
+      return this.reject(503, 'overloaded', 'El servicio está saturado, inténtalo más tarde.');
+    }
+    return null;
+  }
+
+  // Resuelve con los ms en cola o rechaza con Rejected
+  acquire(tenant) {
+    const error = this.check(tenant);
+    if (error) return Promise.reject(error);
+    if (this.count(this.queued, tenant) === 0 && this.hasRoom(tenant)) {
+      this.admit(tenant);
+      return Promise.resolve(0);
+    }
+
+    return new Promise((resolve, reject) => {
+      const entry = { tenant, enqueuedAt: Date.now(), resolve };
+      entry.timer = setTimeout(() => {
+        this.leave(entry);
+        reject(this.reject(503, 'queue_timeout', 'Tiempo de espera en cola agotado, inténtalo más tarde.',
+          Date.now() - entry.enqueuedAt));
+      }, this.queueTimeoutMs);
+      this.queue.push(entry);
+      this.bump(this.queued, tenant, 1);
+    });
+  }
+
+  leave(entry) {
+    const index = this.queue.indexOf(entry);
+    if (index === -1) return;
+    this.queue.splice(index, 1);
+    this.bump(this.queued, entry.tenant, -1);
+    clearTimeout(entry.timer);
+  }
+
+  release(tenant, serviceMs = null) {
+    this.inFlight -= 1;
+    this.bump(this.tenants, tenant, -1);
+    if (serviceMs !== null) {
+      this.serviceMs = this.serviceMs === null
+        ? serviceMs
+        : SERVICE_TIME_ALPHA * serviceMs + (1 - SERVICE_TIME_ALPHA) * this.serviceMs;
+    }
+    this.dispatch();
+  }
+
+  dispatch() {
+    for (const entry of [...this.queue]) {
+      if (this.inFlight >= this.maxInFlight) return;
+      if (!this.hasRoom(entry.tenant)) continue;
+      this.leave(entry);
+      this.admit(entry.tenant);
+      entry.resolve(Date.now() - entry.enqueuedAt);
+    }
+  }
+
+  // Ejecuta run() con un hueco reservado; onWait recibe los ms en cola
+  run(tenant, run, onWait = null) {
+    return this.acquire(tenant).then((waitedMs) => {
+      if (onWait) onWait(waitedMs);
+      const startedAt = Date.now();
+      return Promise.resolve()
+        .then(run)
+        .finally(() => this.release(tenant, Date.now() - startedAt));
+    });
+  }
+
+  stats() {
+    return {
+      inFlight: this.inFlight,
+      queued: this.queue.length,
+      maxInFlight: this.maxInFlight,
+      maxQueue: this.maxQueue,
+      queueTimeoutMs: this.queueTimeoutMs,
+      tenants: Object.fromEntries(this.tenants),
+      admitted: this.admitted,
+      rejected: { ...this.rejected },
+      serviceMs: this.serviceMs === null ? null : Math.round(this.serviceMs),
+    };
+  }
+}
+
+let admission = null;
+
+const getAdmission = () => {
+  if (!admission) admission = new Admission();
+  return admission;
+};
+
+module.exports = { Admission, Rejected, getAdmission };
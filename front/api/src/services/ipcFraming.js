@@ -0,0 +1,111 @@
+// Framing del canal IPC con los procesos de retrieval (ver ipc_framing.py):
+// 4 bytes big-endian con la longitud + payload msgpack.
+//
+// Los frames de resultado traen la salida del pipeline ya codificada (bin
+// "output") y sus "timings" aparte: PackedOutput la guarda sin decodificar
+// y encodeEnvelope la mete tal cual en la respuesta a un cliente msgpack.
+//
+// Sin @msgpack/msgpack instalado el canal usa JSON: los procesos Python se
+// lanzan con IPC_ENV (IPC_FORMAT=json), "output" llega como el JSON del
+// script en texto y los clientes msgpack reciben JSON. Cada frame se lee
+// según su primer byte ('{' = JSON), así que los dos formatos conviven.
+
+let msgpack = null;
+try {
+  msgpack = require('@msgpack/msgpack');
+} catch (e) {
+  console.warn('⚠️ @msgpack/msgpack no está instalado: el canal IPC usa JSON');
+}
+
+const MSGPACK_TYPE = 'application/msgpack';
+const MAX_FRAME_BYTES = 64 * 1024 * 1024;
+const JSON_START = 0x7b; // '{': un map msgpack nunca empieza así
+const IPC_ENV = { IPC_FORMAT: msgpack ? 'msgpack' : 'json' };
+
+const toBuffer = (bytes) => Buffer.from(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+
+const encode = (message) => (msgpack ? toBuffer(msgpack.encode(message)) : Buffer.from(JSON.stringify(message)));
+
+const decode = (payload) => {
+  if (payload[0] === JSON_START) return JSON.parse(payload.toString('utf8'));
+  if (!msgpack) throw new Error('Frame msgpack recibido sin @msgpack/msgpack instalado');
+  return msgpack.decode(payload);
+};
+
+const encodeFrame = (message) => {
+  const payload = encode(message);
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(payload.length, 0);
+  return Buffer.concat([header, payload]);
+};
+
+// Devuelve un handler de 'data' que entrega cada frame completo a onMessage
+const createFrameReader = (onMessage, onInvalid) => {
+  let buffer = Buffer.alloc(0);
+  return (chunk) => {
+    buffer = Buffer.concat([buffer, chunk]);
+    while (buffer.length >= 4) {
+      const length = buffer.readUInt32BE(0);
+      if (length > MAX_FRAME_BYTES) {
+        buffer = Buffer.alloc(0);
+        onInvalid(new Error(`Frame demasiado grande: ${length} bytes`));
+        return;
+      }
+      if (buffer.length < 4 + length) break;
+      const payload = buffer.subarray(4, 4 + length);
+      buffer = buffer.subarray(4 + length);
+      try {
+        onMessage(decode(payload));
+      } catch (e) {
+        onInvalid(e);
+      }
+    }
+  };
+};
+
+// Salida de retrivalai tal como la codificó Python (msgpack, o JSON en texto
+// con IPC_FORMAT=json); se decodifica sólo si hace falta
+class PackedOutput {
+  constructor(bytes, timings) {
+    this.isJson = typeof bytes === 'string';
+    this.bytes = this.isJson ? Buffer.from(bytes) : toBuffer(bytes);
+    this.timings = timings || null;
+    this.decoded = null;
+  }
+
+  static fromFrame(message) {
+    return new PackedOutput(message.output, message.timings);
+  }
+
+  decode() {
+    if (!this.decoded) this.decoded = decode(this.bytes);
+    return this.decoded;
+  }
+}
+
+// Sin msgpack no se puede contestar en msgpack: esos clientes reciben JSON
+const msgpackAvailable = () => msgpack !== null;
+
+// Map msgpack con fields y key -> packed (ya codificado), sin volver a serializarlo
+const encodeEnvelope = (fields, key, packed) => {
+  const entries = Object.entries(fields);
+  const size = entries.length + 1;
+  let header;
+  if (size < 16) {
+    header = Buffer.from([0x80 | size]);
+  } else {
+    header = Buffer.alloc(3);
+    header.writeUInt8(0xde, 0);
+    header.writeUInt16BE(size, 1);
+  }
+  const parts = [header];
+  for (const [name, value] of entries) {
+    parts.push(encode(name), encode(value));
+  }
+  parts.push(encode(key), packed);
+  return Buffer.concat(parts);
+};
+
+module.exports = {
+  MSGPACK_TYPE, IPC_ENV, encodeFrame, createFrameReader, PackedOutput, encodeEnvelope, msgpackAvailable,
+};
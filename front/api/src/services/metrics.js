@@ -0,0 +1,101 @@
+// Métricas en formato de texto Prometheus para GET /metrics
+//
+//   chatbot_request_seconds{route,status}   latencia de punta a punta vista por Node
+//   retrieval_stage_seconds{stage}          `timings` que devuelven los workers (STAGE_TIMINGS=1)
+//   retrieval_worker_startup_seconds{stage} arranque de cada worker
+//   retrieval_pool_*                        estado del pool de workers
+//   chatbot_coalesced_total                 peticiones unidas a una pregunta igual en curso
+//   chatbot_admission_*                     control de admisión (admission.js)
+//   chatbot_queue_wait_seconds{outcome}     espera en la cola de admisión
+
+const BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120];
+
+class Histogram {
+  constructor(name, help, labelNames) {
+    this.name = name;
+    this.help = help;
+    this.labelNames = labelNames;
+    this.series = new Map();
+  }
+
+  observe(labels, seconds) {
+    const key = this.labelNames.map((name) => `${name}="${String(labels[name] ?? '').replace(/["\\\n]/g, '_')}"`).join(',');
+    let series = this.series.get(key);
+    if (!series) {
+      series = { counts: BUCKETS.map(() => 0), sum: 0, count: 0 };
+      this.series.set(key, series);
+    }
+    BUCKETS.forEach((bound, i) => {
+      if (seconds <= bound) series.counts[i] += 1;
+    });
+    series.sum += seconds;
+    series.count += 1;
+  }
+
+  render() {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+    for (const [key, series] of this.series) {
+      BUCKETS.forEach((bound, i) => {
+        lines.push(`${this.name}_bucket{${key},le="${bound}"} ${series.counts[i]}`);
+      });
+      lines.push(`${this.name}_bucket{${key},le="+Inf"} ${series.count}`);
+      lines.push(`${this.name}_sum{${key}} ${series.sum.toFixed(6)}`);
+      lines.push(`${this.name}_count{${key}} ${series.count}`);
+    }
+    return lines.join('\n');
+  }
+}
+
+const requestSeconds = new Histogram('chatbot_request_seconds', 'End-to-end chatbot request latency seen by the Node API', ['route', 'status']);
+const stageSeconds = new Histogram('retrieval_stage_seconds', 'Retrieval pipeline stage latency reported by the Python workers', ['stage']);
+const startupSeconds = new Histogram('retrieval_worker_startup_seconds', 'Retrieval worker startup by stage', ['stage']);
+const queueSeconds = new Histogram('chatbot_queue_wait_seconds', 'Time spent waiting for admission', ['outcome']);
+
+const observeRequest = (route, status, startedAt) => {
+  requestSeconds.observe({ route, status }, (Date.now() - startedAt) / 1000);
+};
+
+// timings llega en ms desde retrivalai.py
+const observeTimings = (timings, histogram = stageSeconds) => {
+  if (!timings) return;
+  for (const [stage, ms] of Object.entries(timings)) {
+    if (typeof ms === 'number') histogram.observe({ stage }, ms / 1000);
+  }
+};
+
+const observeStartup = (timings) => observeTimings(timings, startupSeconds);
+
+const observeQueueWait = (outcome, ms) => queueSeconds.observe({ outcome }, ms / 1000);
+
+const gauge = (name, help, value) => [`# HELP ${name} ${help}`, `# TYPE ${name} gauge`, `${name} ${value}`].join('\n');
+
+const counter = (name, help, value) => [`# HELP ${name} ${help}`, `# TYPE ${name} counter`, `${name} ${value}`].join('\n');
+
+const render = (poolStats, flightStats, admissionStats) => {
+  const parts = [requestSeconds.render(), stageSeconds.render(), startupSeconds.render(), queueSeconds.render()];
+  if (admissionStats) {
+    parts.push(gauge('chatbot_admission_in_flight', 'Questions admitted and running', admissionStats.inFlight));
+    parts.push(gauge('chatbot_admission_queue_depth', 'Questions waiting in the admission queue', admissionStats.queued));
+    parts.push(gauge('chatbot_admission_max_in_flight', 'Configured CHAT_MAX_CONCURRENCY', admissionStats.maxInFlight));
+    parts.push(gauge('chatbot_admission_max_queue', 'Configured CHAT_MAX_QUEUE', admissionStats.maxQueue));
+    parts.push([
+      '# HELP chatbot_admission_rejected_total Requests rejected by admission control',
+      '# TYPE chatbot_admission_rejected_total counter',
+      ...Object.entries(admissionStats.rejected).map(([reason, value]) => `chatbot_admission_rejected_total{reason="${reason}"} ${value}`),
+    ].join('\n'));
+  }
+  if (flightStats) {
+    parts.push(gauge('chatbot_single_flight_in_flight', 'Distinct questions being answered', flightStats.inFlight));
+    parts.push(counter('chatbot_coalesced_total', 'Requests that joined an identical question already in flight', flightStats.coalesced));
+  }
+  if (poolStats) {
+    const workers = poolStats.workers.filter(Boolean);
+    parts.push(gauge('retrieval_pool_size', 'Configured retrieval workers', poolStats.size));
+    parts.push(gauge('retrieval_pool_busy', 'Retrieval workers answering a question', workers.filter((w) => w.state === 'busy').length));
+    parts.push(gauge('retrieval_pool_queued', 'Questions waiting for a free worker', poolStats.queued));
+    parts.push(counter('retrieval_pool_restarts_total', 'Workers restarted after dying', poolStats.restarts));
+  }
+  return parts.join('\n') + '\n';
+};
+
+module.exports = { observeRequest, observeTimings, observeStartup, observeQueueWait, render };
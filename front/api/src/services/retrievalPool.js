@@ -0,0 +1,290 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const { observeStartup } = require('./metrics');
+const { IPC_ENV, encodeFrame, createFrameReader, PackedOutput } = require('./ipcFraming');
+
+// Pool de workers Python calientes (retrivalai.py --worker).
+// Protocolo: frames con 4 bytes big-endian de longitud + msgpack (ver ipcFraming.js).
+// ask/stream resuelven con un PackedOutput (la salida sin decodificar).
+
+const SCRIPT_PATH = path.join(__dirname, '..', '..', 'retrivalai.py');
+
+const intFromEnv = (name, fallback) => {
+  const value = parseInt(process.env[name], 10);
+  return Number.isNaN(value) ? fallback : value;
+};
+
+class RetrievalWorker {
+  constructor(pool, slot) {
+    this.pool = pool;
+    this.slot = slot;
+    this.state = 'starting';
+    this.served = 0;
+    this.pending = new Map();
+    this.lastPong = Date.now();
+    this.dbPool = null;
+    this.queryCache = null;
+    this.answerCache = null;
+
+    this.proc = spawn(pool.python, [pool.script, '--worker'], {
+      cwd: path.dirname(pool.script),
+      env: { ...process.env, ...IPC_ENV },
+      stdio: ['pipe', 'pipe', 'pipe'],
+    });
+    this.pid = this.proc.pid;
+
+    this.proc.stdout.on('data', createFrameReader(
+      (message) => this.onMessage(message),
+      (e) => console.error(`❌ [worker ${this.slot}] Frame inválido:`, e.message),
+    ));
+    this.proc.stderr.on('data', (chunk) => {
+      console.error(`⚠️ [worker ${this.slot}/${this.pid}] ${chunk.toString().trimEnd()}`);
+    });
+    this.proc.on('exit', (code, signal) => this.onExit(code, signal));
+    this.proc.on('error', (err) => {
+      console.error(`❌ [worker ${this.slot}] No se pudo lanzar Python:`, err.message);
+    });
+  }
+
+  onMessage(message) {
+    if (message.type === 'ready') {
+      observeStartup(message.startup);
+      this.state = 'idle';
+      this.lastPong = Date.now();
+      this.pool.onWorkerIdle(this);
+      return;
+    }
+    if (message.type === 'fatal') {
+      console.error(`❌ [worker ${this.slot}] Error de inicialización: ${message.message}`);
+      return;
+    }
+    if (message.type === 'update') {
+      // answer2 que llegó después de responder en modo partial
+      this.pool.storeLateResult(message.id, message.output);
+      return;
+    }
+
+    const entry = this.pending.get(message.id);
+    if (!entry) return;
+    if (message.type === 'token') {
+      // Fragmentos intermedios de una pregunta en streaming
+      if (entry.onEvent) entry.onEvent(message);
+      return;
+    }
+    this.pending.delete(message.id);
+    clearTimeout(entry.timer);
+
+    if (message.type === 'pong') {
+      this.lastPong = Date.now();
+      this.dbPool = message.db_pool || null;
+      this.queryCache = message.query_cache || null;
+      this.answerCache = message.answer_cache || null;
+      entry.resolve(message);
+    } else if (message.type === 'result') {
+      entry.resolve(PackedOutput.fromFrame(message));
+    } else {
+      entry.reject(new Error(message.message || 'Error desconocido en el worker'));
+    }
+  }
+
+  send(op, payload, timeoutMs, onEvent = null) {
+    const id = `${this.pid}-${++this.pool.sequence}`;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Timeout del worker tras ${timeoutMs} ms`));
+        this.kill();
+      }, timeoutMs);
+      this.pending.set(id, { resolve, reject, timer, onEvent });
+      this.proc.stdin.write(encodeFrame({ id, op, ...payload }));
+    });
+  }
+
+  ask(question, onEvent = null, traceId = null) {
+    this.state = 'busy';
+    const op = onEvent ? 'stream' : 'ask';
+    return this.send(op, { question, trace_id: traceId }, this.pool.requestTimeoutMs, onEvent).finally(() => {
+      this.served += 1;
+    });
+  }
+
+  ping() {
+    return this.send('ping', {}, this.pool.healthTimeoutMs);
+  }
+
+  retire() {
+    this.state = 'retiring';
+    this.proc.stdin.end();
+  }
+
+  kill() {
+    if (this.state === 'dead') return;
+    this.state = 'retiring';
+    this.proc.kill('SIGKILL');
+  }
+
+  onExit(code, signal) {
+    const wasStarting = this.state === 'starting';
+    this.state = 'dead';
+    for (const entry of this.pending.values()) {
+      clearTimeout(entry.timer);
+      entry.reject(new Error(`El worker terminó (code=${code}, signal=${signal})`));
+    }
+    this.pending.clear();
+    this.pool.onWorkerExit(this, wasStarting);
+  }
+}
+
+class RetrievalPool {
+  constructor(options = {}) {
+    this.size = options.size ?? intFromEnv('RETRIEVAL_POOL_SIZE', 2);
+    this.maxRequests = options.maxRequests ?? intFromEnv('RETRIEVAL_MAX_REQUESTS', 200);
+    this.requestTimeoutMs = options.requestTimeoutMs ?? intFromEnv('RETRIEVAL_REQUEST_TIMEOUT_MS', 300000);
+    this.healthIntervalMs = options.healthIntervalMs ?? intFromEnv('RETRIEVAL_HEALTH_INTERVAL_MS', 30000);
+    this.healthTimeoutMs = options.healthTimeoutMs ?? intFromEnv('RETRIEVAL_HEALTH_TIMEOUT_MS', 5000);
+    this.python = options.python ?? process.env.PYTHON_BIN ?? 'python';
+    this.script = options.script ?? SCRIPT_PATH;
+
+    this.sequence = 0;
+    this.workers = [];
+    this.queue = [];
+    this.recycled = 0;
+    this.restarts = 0;
+    this.closed = false;
+    this.lateResults = new Map();
+    this.lateResultTtlMs = options.lateResultTtlMs ?? intFromEnv('RETRIEVAL_LATE_RESULT_TTL_MS', 600000);
+  }
+
+  start() {
+    for (let slot = 0; slot < this.size; slot += 1) {
+      this.workers[slot] = new RetrievalWorker(this, slot);
+    }
+    this.healthTimer = setInterval(() => this.healthCheck(), this.healthIntervalMs);
+    this.healthTimer.unref();
+    return this;
+  }
+
+  // traceId: request id del controlador, llega al trace log del worker
+  ask(question, traceId = null) {
+    return this.enqueue(question, null, traceId);
+  }
+
+  // onEvent recibe cada frame {type: 'token', field, text} antes del resultado final
+  stream(question, onEvent, traceId = null) {
+    return this.enqueue(question, onEvent, traceId);
+  }
+
+  enqueue(question, onEvent, traceId = null) {
+    return new Promise((resolve, reject) => {
+      this.queue.push({ question, onEvent, traceId, resolve, reject });
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    while (this.queue.length > 0) {
+      const worker = this.workers.find((w) => w && w.state === 'idle');
+      if (!worker) return;
+      const job = this.queue.shift();
+      worker.ask(job.question, job.onEvent, job.traceId)
+        .then(job.resolve, job.reject)
+        .finally(() => this.onJobDone(worker));
+    }
+  }
+
+  onJobDone(worker) {
+    if (worker.state !== 'busy') return;
+    if (worker.served >= this.maxRequests) {
+      this.recycled += 1;
+      worker.retire();
+      return;
+    }
+    worker.state = 'idle';
+    this.onWorkerIdle(worker);
+  }
+
+  onWorkerIdle() {
+    this.dispatch();
+  }
+
+  onWorkerExit(worker, wasStarting) {
+    if (this.closed || this.workers[worker.slot] !== worker) return;
+    this.restarts += 1;
+    // Si el worker muere durante el arranque esperamos un poco antes de relanzarlo
+    const delay = wasStarting ? 5000 : 0;
+    setTimeout(() => {
+      if (this.closed) return;
+      this.workers[worker.slot] = new RetrievalWorker(this, worker.slot);
+    }, delay);
+  }
+
+  storeLateResult(id, output) {
+    const now = Date.now();
+    for (const [key, entry] of this.lateResults) {
+      if (now - entry.at > this.lateResultTtlMs) this.lateResults.delete(key);
+    }
+    this.lateResults.set(id, { output, at: now });
+  }
+
+  lateResult(id) {
+    const entry = this.lateResults.get(id);
+    return entry ? entry.output : null;
+  }
+
+  healthCheck() {
+    for (const worker of this.workers) {
+      if (!worker || worker.state !== 'idle') continue;
+      worker.ping().catch((err) => {
+        console.error(`⚠️ [worker ${worker.slot}] Health check fallido: ${err.message}`);
+      });
+    }
+  }
+
+  stats() {
+    return {
+      size: this.size,
+      maxRequests: this.maxRequests,
+      queued: this.queue.length,
+      lateResults: this.lateResults.size,
+      recycled: this.recycled,
+      restarts: this.restarts,
+      workers: this.workers.map((w) => w && ({
+        slot: w.slot,
+        pid: w.pid,
+        state: w.state,
+        served: w.served,
+        lastPongMsAgo: Date.now() - w.lastPong,
+        dbPool: w.dbPool,
+        queryCache: w.queryCache,
+        answerCache: w.answerCache,
+      })),
+    };
+  }
+
+  close() {
+    this.closed = true;
+    clearInterval(this.healthTimer);
+    for (const job of this.queue.splice(0)) {
+      job.reject(new Error('El pool de retrieval se está cerrando'));
+    }
+    for (const worker of this.workers) {
+      if (worker) worker.retire();
+    }
+  }
+}
+
+let pool = null;
+
+const getPool = () => {
+  if (!pool) {
+    pool = new RetrievalPool().start();
+  }
+  return pool;
+};
+
+const closePool = () => {
+  if (pool) pool.close();
+  pool = null;
+};
+
+module.exports = { RetrievalPool, getPool, closePool, SCRIPT_PATH };
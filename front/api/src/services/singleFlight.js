@@ -0,0 +1,78 @@
+// Single-flight: preguntas iguales en curso comparten una sola ejecución
+// (mismo comportamiento que single_flight.py en el servicio asyncio).
+//
+// Clave: (cliente de la petición —cabecera X-Costumer, como la admisión—,
+// pregunta normalizada como query_cache.normalize_question,
+// modo de respuesta). La primera petición lanza el pipeline; las que llegan
+// mientras tanto reciben ese mismo resultado o error. En streaming el que se
+// une tarde recibe primero los tokens ya emitidos.
+//
+//   CHAT_COALESCE=1   0 para desactivarlo
+
+const TRIM = ' ?¿!¡.,;:"\'';
+
+const normalizeQuestion = (text) => {
+  const value = String(text).normalize('NFKC').toLowerCase().replace(/\s+/g, ' ');
+  let start = 0;
+  let end = value.length;
+  while (start < end && TRIM.includes(value[start])) start += 1;
+  while (end > start && TRIM.includes(value[end - 1])) end -= 1;
+  return value.slice(start, end);
+};
+
+const flightKey = (tenant, question, mode) => JSON.stringify([
+  tenant || '',
+  normalizeQuestion(question),
+  mode,
+  process.env.ANSWER2_MODE || 'wait',
+]);
+
+class SingleFlight {
+  constructor() {
+    this.flights = new Map();
+    this.leaders = 0;
+    this.coalesced = 0;
+  }
+
+  enabled() {
+    return process.env.CHAT_COALESCE !== '0';
+  }
+
+  // start(emit) -> Promise; onEvent recibe los tokens. Resuelve a { value, coalesced }
+  run(key, start, onEvent = null) {
+    if (!this.enabled()) {
+      return start(onEvent || (() => {})).then((value) => ({ value, coalesced: false }));
+    }
+
+    let flight = this.flights.get(key);
+    const coalesced = Boolean(flight);
+    if (coalesced) {
+      this.coalesced += 1;
+      if (onEvent) flight.events.forEach(onEvent);
+    } else {
+      flight = { events: [], listeners: new Set() };
+      const emit = (event) => {
+        flight.events.push(event);
+        flight.listeners.forEach((listener) => listener(event));
+      };
+      this.flights.set(key, flight);
+      this.leaders += 1;
+      flight.promise = start(emit).finally(() => {
+        if (this.flights.get(key) === flight) this.flights.delete(key);
+      });
+    }
+
+    if (onEvent) flight.listeners.add(onEvent);
+    return flight.promise
+      .then((value) => ({ value, coalesced }))
+      .finally(() => { if (onEvent) flight.listeners.delete(onEvent); });
+  }
+
+  stats() {
+    return { inFlight: this.flights.size, leaders: this.leaders, coalesced: this.coalesced };
+  }
+}
+
+const singleFlight = new SingleFlight();
+
+module.exports = { SingleFlight, singleFlight, flightKey, normalizeQuestion };
@@ -0,0 +1,117 @@
+const { spawn } = require('child_process');
+const net = require('net');
+const os = require('os');
+const path = require('path');
+const { SCRIPT_PATH } = require('./retrievalPool');
+const { IPC_ENV, encodeFrame, createFrameReader, PackedOutput } = require('./ipcFraming');
+const { observeStartup } = require('./metrics');
+
+// Modo prefork (RETRIEVAL_ZYGOTE=1 con RETRIEVAL_POOL_SIZE=0): un proceso
+// Python con todo importado (retrivalai.py --zygote <socket>) hace fork por
+// pregunta. Cada hijo abre sus conexiones, responde y termina, así que se
+// mantiene el aislamiento del modo exec sin pagar imports en cada petición.
+//
+//   RETRIEVAL_ZYGOTE_SOCKET=<tmp>/retrieval-zygote-<pid>.sock
+//   RETRIEVAL_REQUEST_TIMEOUT_MS=300000
+
+const intFromEnv = (name, fallback) => {
+  const value = parseInt(process.env[name], 10);
+  return Number.isNaN(value) ? fallback : value;
+};
+
+class Zygote {
+  constructor(options = {}) {
+    this.socketPath = options.socketPath ?? process.env.RETRIEVAL_ZYGOTE_SOCKET
+      ?? path.join(os.tmpdir(), `retrieval-zygote-${process.pid}.sock`);
+    this.python = options.python ?? process.env.PYTHON_BIN ?? 'python';
+    this.requestTimeoutMs = options.requestTimeoutMs ?? intFromEnv('RETRIEVAL_REQUEST_TIMEOUT_MS', 300000);
+    this.closed = false;
+    this.restarts = 0;
+    this.ready = null;
+    this.spawn();
+  }
+
+  spawn() {
+    this.ready = new Promise((resolve, reject) => {
+      this.proc = spawn(this.python, [SCRIPT_PATH, '--zygote', this.socketPath], {
+        cwd: path.dirname(SCRIPT_PATH),
+        env: { ...process.env, ...IPC_ENV },
+        stdio: ['ignore', 'pipe', 'pipe'],
+      });
+      this.proc.stdout.on('data', createFrameReader(
+        (message) => {
+          if (message.type === 'ready') {
+            observeStartup(message.startup);
+            resolve();
+          }
+        },
+        (e) => console.error('❌ [zygote] Frame inválido:', e.message),
+      ));
+      this.proc.stderr.on('data', (chunk) => {
+        console.error(`⚠️ [zygote ${this.proc.pid}] ${chunk.toString().trimEnd()}`);
+      });
+      this.proc.on('error', reject);
+      this.proc.on('exit', (code, signal) => {
+        reject(new Error(`El zygote terminó (code=${code}, signal=${signal})`));
+        if (this.closed) return;
+        this.restarts += 1;
+        console.error(`⚠️ [zygote] terminó (code=${code}, signal=${signal}), relanzando en 5s`);
+        setTimeout(() => { if (!this.closed) this.spawn(); }, 5000);
+      });
+    });
+    // Evita unhandled rejections si nadie está esperando
+    this.ready.catch(() => {});
+  }
+
+  ask(question, traceId = null) {
+    return this.ready.then(() => new Promise((resolve, reject) => {
+      const socket = net.createConnection(this.socketPath);
+      let settled = false;
+      const finish = (fn, value) => {
+        if (settled) return;
+        settled = true;
+        clearTimeout(timer);
+        socket.destroy();
+        fn(value);
+      };
+      const timer = setTimeout(
+        () => finish(reject, new Error(`Timeout del zygote tras ${this.requestTimeoutMs} ms`)),
+        this.requestTimeoutMs,
+      );
+
+      socket.on('connect', () => socket.write(encodeFrame({ op: 'ask', question, trace_id: traceId })));
+      socket.on('data', createFrameReader(
+        (message) => {
+          if (message.type === 'result') finish(resolve, PackedOutput.fromFrame(message));
+          else if (message.type === 'error') finish(reject, new Error(message.message || 'Error desconocido en el zygote'));
+        },
+        (e) => finish(reject, e),
+      ));
+      socket.on('error', (err) => finish(reject, err));
+      socket.on('close', () => finish(reject, new Error('El proceso hijo cerró la conexión sin responder')));
+    }));
+  }
+
+  stats() {
+    return { mode: 'zygote', pid: this.proc && this.proc.pid, socket: this.socketPath, restarts: this.restarts };
+  }
+
+  close() {
+    this.closed = true;
+    if (this.proc) this.proc.kill('SIGTERM');
+  }
+}
+
+let zygote = null;
+
+const getZygote = () => {
+  if (!zygote) zygote = new Zygote();
+  return zygote;
+};
+
+const closeZygote = () => {
+  if (zygote) zygote.close();
+  zygote = null;
+};
+
+module.exports = { Zygote, getZygote, closeZygote };
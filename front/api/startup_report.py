@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# ----------------------------------------
+# Informe de tiempo de arranque de retrivalai.py
+#
+# Importa el script con `python -X importtime` en un proceso limpio y
+# muestra los módulos que más tardan (tiempo acumulado, incluye sus
+# dependencias). Termina con código 1 si:
+#   - el import total supera --budget-ms
+#   - alguno de los paquetes de --forbid se importa al cargar el script
+#     (oci*, langchain*, numpy, oracledb, pydantic: se cargan en
+#     init_engine/preload_modules o donde se usan, no en el import). Se
+#     compara por prefijo: "langchain" cubre langchain_core y compañía
+#
+# test_startup_report.py hace la misma comprobación dentro de pytest.
+#
+# Con --init mide además el arranque completo con RETRIEVAL_FAKE_BACKENDS=1
+# (los `startup` de STAGE_TIMINGS) sin tocar OCI ni Oracle.
+#
+# Ejemplo:
+#   python3 startup_report.py --budget-ms 400 --init
+# ----------------------------------------
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FORBID = "oci,langchain,numpy,oracledb,pydantic"
+
+
+def eager_imports(module_names, forbid):
+    """Paquetes de primer nivel de module_names que empiezan por alguno de forbid."""
+    top_level = {name.split(".")[0] for name in module_names}
+    return sorted(name for name in top_level if any(name.startswith(prefix) for prefix in forbid))
+
+
+def import_times(python, env):
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", "import retrivalai"],
+        cwd=API_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import retrivalai failed:\n{proc.stderr[-2000:]}")
+
+    # import time: self [us] | cumulative | imported package
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return modules
+
+
+def init_times(python, env):
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(env, RETRIEVAL_FAKE_BACKENDS="1", STAGE_TIMINGS="1", ANSWER_CACHE="0",
+                   FAKE_EMBED_LATENCY_MS="0", FAKE_SEARCH_LATENCY_MS="0", FAKE_CHAT_LATENCY_MS="0",
+                   QUERY_CACHE_PATH=os.path.join(workdir, "query_embeddings.sqlite"),
+                   TRACE_LOG_PATH=os.path.join(workdir, "trace.jsonl"))
+        proc = subprocess.run([python, "retrivalai.py", "startup report"], cwd=API_DIR, env=env,
+                              capture_output=True, text=True)
+    # La salida JSON del CLI es lo último que imprime (indentada)
+    try:
+        output = json.loads(proc.stdout[proc.stdout.rfind("\n{") + 1:])
+        return {stage: ms for stage, ms in output.get("timings", {}).items() if stage.startswith("startup_")}
+    except ValueError:
+        raise RuntimeError(f"retrivalai.py failed:\n{proc.stdout[-1000:]}{proc.stderr[-1000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import/startup time report for retrivalai.py")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if importing retrivalai takes longer")
+    parser.add_argument("--forbid", default=DEFAULT_FORBID,
+                        help="comma separated package prefixes that must not load at import time")
+    parser.add_argument("--init", action="store_true", help="also time init_engine with fake backends")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("BACKEND_DIR", os.path.join(os.path.dirname(os.path.dirname(API_DIR)), "dbai"))
+
+    modules = import_times(args.python, env)
+    total_ms = sum(m["self_ms"] for m in modules)
+    forbid = {name.strip() for name in args.forbid.split(",") if name.strip()}
+    loaded = eager_imports([m["module"] for m in modules], forbid)
+    top = sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)[:args.top]
+    startup = init_times(args.python, env) if args.init else None
+
+    failures = []
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f"import took {total_ms:.1f} ms (budget {args.budget_ms:.1f} ms)")
+    if loaded:
+        failures.append(f"eager imports: {', '.join(loaded)}")
+
+    if args.json:
+        print(json.dumps({"import_ms": round(total_ms, 1), "top": top, "eager": loaded,
+                          "startup": startup, "failures": failures}, indent=2))
+    else:
+        print(f"import retrivalai: {total_ms:.1f} ms, {len(modules)} modules")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for m in top:
+            print(f"{m['cumulative_ms']:>14.1f} {m['self_ms']:>9.1f}  {'  ' * m['depth']}{m['module']}")
+        if startup is not None:
+            print("startup (fake backends, ms): " + ", ".join(f"{k}={v}" for k, v in startup.items()))
+        for failure in failures:
+            print(f"❌ {failure}")
+        if not failures:
+            print("✅ OK")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from admission import Admission, Rejected, admission_settings
+
+
+def make_admission(monkeypatch, max_in_flight=1, **env):
+    for name in ("CHAT_MAX_QUEUE", "CHAT_QUEUE_TIMEOUT_S", "CHAT_TENANT_MAX_CONCURRENCY", "CHAT_TENANT_MAX_QUEUE"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return Admission(admission_settings(max_in_flight))
+
+
+def test_queued_questions_enter_in_fifo_order(monkeypatch):
+    admission = make_admission(monkeypatch)
+
+    async def scenario():
+        order = []
+        assert await admission.acquire("a") == 0.0
+
+        async def ask(name):
+            await admission.acquire("a")
+            order.append(name)
+
+        waiting = [asyncio.ensure_future(ask(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        assert len(admission.queue) == 2
+        admission.release("a", 1.0)
+        await asyncio.sleep(0)
+        admission.release("a", 1.0)
+        await asyncio.gather(*waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "second"]
+    assert admission.in_flight == 1
+    assert admission.stats()["admitted"] == 3
+
+
+def test_saturated_tenant_does_not_block_the_others(monkeypatch):
+    admission = make_admission(monkeypatch, max_in_flight=2, CHAT_TENANT_MAX_CONCURRENCY=1)
+
+    async def scenario():
+        await admission.acquire("busy")
+        blocked = asyncio.ensure_future(admission.acquire("busy"))
+        await asyncio.sleep(0)
+        # El segundo de "busy" espera a su cliente; "other" entra aunque esté detrás
+        await asyncio.wait_for(admission.acquire("other"), 1)
+        assert not blocked.done()
+        admission.release("busy")
+        await asyncio.wait_for(blocked, 1)
+
+    asyncio.run(scenario())
+    assert admission.tenants == {"busy": 1, "other": 1}
+
+
+def test_full_queue_is_rejected_with_retry_after(monkeypatch):
+    admission = make_admission(monkeypatch, CHAT_MAX_QUEUE=1)
+
+    async def scenario():
+        await admission.acquire("a")
+        queued = asyncio.ensure_future(admission.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected) as rejected:
+            await admission.acquire("b")
+        queued.cancel()
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert (error.status, error.reason) == (503, "queue_full")
+    assert error.retry_after >= 1
+    assert len(admission.queue) == 0
+
+
+def test_tenant_queue_limit_is_429(monkeypatch):
+    admission = make_admission(monkeypatch, CHAT_TENANT_MAX_QUEUE=1)
+
+    async def scenario():
+        await admission.acquire("a")
+        queued = asyncio.ensure_future(admission.acquire("a"))
+        await asyncio.sleep(0)
+        try:
+            admission.check("a")
+        finally:
+            queued.cancel()
+
+    with pytest.raises(Rejected) as rejected:
+        asyncio.run(scenario())
+    assert (rejected.value.status, rejected.value.reason) == (429, "tenant_queue_full")
+
+
+def test_queue_timeout_frees_the_place(monkeypatch):
+    admission = make_admission(monkeypatch, CHAT_QUEUE_TIMEOUT_S=0.05)
+
+    async def scenario():
+        await admission.acquire("a")
+        with pytest.raises(Rejected) as rejected:
+            await admission.acquire("a")
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.reason == "queue_timeout"
+    assert error.waited >= 0.05
+    assert len(admission.queue) == 0
+    assert admission.queued["a"] == 0
+
+
+def test_estimated_wait_rejects_before_queueing(monkeypatch):
+    admission = make_admission(monkeypatch, CHAT_QUEUE_TIMEOUT_S=5)
+
+    async def scenario():
+        await admission.acquire("a")
+        admission.release("a", 10.0)  # una pregunta tarda ~10s: no cabe en 5s de cola
+        await admission.acquire("a")
+        with pytest.raises(Rejected) as rejected:
+            await admission.acquire("a")
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.reason == "overloaded"
+    assert error.retry_after == 10
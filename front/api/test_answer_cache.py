@@ -0,0 +1,61 @@
+import numpy as np
+
+import answer_cache
+from answer_cache import AnswerCache
+
+
+def near(cos):
+    # Vector unitario con similitud `cos` respecto a [1, 0]
+    return [cos, float(np.sqrt(1 - cos * cos))]
+
+
+def make_cache(tmp_path, **kwargs):
+    return AnswerCache(path=str(tmp_path / "answers.sqlite"), threshold=0.9, **kwargs)
+
+
+def test_hit_above_threshold_and_miss_below(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("acme", "v1", "what is rag", near(1.0), {"answer": "rag"})
+
+    hit = cache.lookup("acme", "v1", near(0.95))
+    assert hit["answer"] == "rag"
+    assert hit["cache"]["cached_question"] == "what is rag"
+    assert cache.lookup("acme", "v1", near(0.5)) is None
+    assert cache.lookup("other", "v1", near(1.0)) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_new_corpus_version_invalidates(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("acme", "v1", "q", near(1.0), {"answer": "old"})
+    assert cache.lookup("acme", "v2", near(1.0)) is None
+    assert cache.lookup("acme", "v1", near(1.0)) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_pruned_best_match_falls_back_to_next_candidate(tmp_path):
+    cache = make_cache(tmp_path, max_entries=1)
+    cache.store("acme", "v1", "exact", near(1.0), {"answer": "exact"})
+    assert cache.lookup("acme", "v1", near(1.0))["answer"] == "exact"  # queda en la matriz
+
+    # max_entries=1: guardar otra poda "exact" de SQLite, no de la matriz
+    cache.store("acme", "v1", "close", near(0.95), {"answer": "close"})
+
+    hit = cache.lookup("acme", "v1", near(1.0))
+    assert hit is not None
+    assert hit["answer"] == "close"
+    assert hit["cache"]["similarity"] == round(0.95, 4)
+
+
+def test_expired_best_match_falls_back_to_next_candidate(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = make_cache(tmp_path, ttl=60)
+    cache.store("acme", "v1", "old exact", near(1.0), {"answer": "old"})
+    now[0] += 50
+    cache.store("acme", "v1", "newer close", near(0.95), {"answer": "newer"})
+    now[0] += 20  # la primera ya caducó, la segunda no
+
+    assert cache.lookup("acme", "v1", near(1.0))["answer"] == "newer"
+    now[0] += 60
+    assert cache.lookup("acme", "v1", near(1.0)) is None
@@ -0,0 +1,82 @@
+from langchain_core.documents import Document
+
+from context_packer import (
+    DEFAULT_LLM_MODEL, budget_settings, estimate_tokens, max_answer_tokens, pack_context, usage_report,
+)
+
+ENV = (
+    "LLM_MODEL", "LLM_CONTEXT_WINDOW", "LLM_TOKEN_BUDGET", "LLM_CONTEXT_TOKENS",
+    "LLM_MIN_ANSWER_TOKENS", "LLM_MAX_ANSWER_TOKENS", "LLM_PRICE_INPUT_PER_1K", "LLM_PRICE_OUTPUT_PER_1K",
+)
+
+
+def settings(monkeypatch, **env):
+    for name in ENV:
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return budget_settings()
+
+
+def sentences(count, words=12):
+    return " ".join(f"{'word ' * (words - 1)}end." for _ in range(count))
+
+
+def test_estimate_tokens_grows_with_text():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hello world") < estimate_tokens("hello world, how are you today?")
+    assert estimate_tokens("1234567890", factor=1.0) == 4
+
+
+def test_defaults_keep_16000_answer_tokens(monkeypatch):
+    config = settings(monkeypatch)
+    assert config["model"] == DEFAULT_LLM_MODEL
+    # Un prompt con todo el contexto por defecto lleno
+    prompt = config["context_tokens"] + 1000
+    assert max_answer_tokens(prompt, config) == 16000
+
+
+def test_smaller_budget_caps_the_answer(monkeypatch):
+    config = settings(monkeypatch, LLM_TOKEN_BUDGET=6000, LLM_MIN_ANSWER_TOKENS=500)
+    assert max_answer_tokens(2000, config) == 4000
+    assert max_answer_tokens(5800, config) == 500
+
+
+def test_model_window_comes_from_llm_model(monkeypatch):
+    config = settings(monkeypatch, LLM_MODEL="meta.llama-3-70b-instruct")
+    assert config["window"] == 8192
+    assert max_answer_tokens(2000, config) == 8192 - 2000
+
+
+def test_pack_context_keeps_order_and_trims_at_sentences(monkeypatch):
+    text = sentences(20)
+    per_doc = estimate_tokens(text)
+    config = settings(monkeypatch, LLM_CONTEXT_TOKENS=per_doc + per_doc // 2)
+    docs = [Document(page_content=text, metadata={"id": i}) for i in range(3)]
+
+    packed, stats = pack_context(docs, 50, config)
+
+    assert [doc.metadata["id"] for doc in packed] == [0, 1]
+    assert "context_trimmed" not in packed[0].metadata
+    assert packed[1].metadata["context_trimmed"] is True
+    assert packed[1].page_content.endswith("end.")
+    assert len(packed[1].page_content) < len(text)
+    assert stats == {"chunks": 2, "dropped": 1, "trimmed": 1,
+                     "tokens": stats["tokens"], "budget": per_doc + per_doc // 2}
+    assert stats["tokens"] <= per_doc + per_doc // 2
+
+
+def test_pack_context_drops_what_does_not_fit(monkeypatch):
+    config = settings(monkeypatch, LLM_CONTEXT_TOKENS=10)
+    docs = [Document(page_content=sentences(10), metadata={}) for _ in range(2)]
+    packed, stats = pack_context(docs, 0, config)
+    assert packed == []
+    assert stats["dropped"] == 2
+
+
+def test_usage_report_cost(monkeypatch):
+    config = settings(monkeypatch, LLM_PRICE_INPUT_PER_1K=1, LLM_PRICE_OUTPUT_PER_1K=2)
+    report = usage_report({"answer": 1000}, {"answer": "word " * 100}, {"answer": 16000}, config)
+    completion = report["completion_tokens"]["answer"]
+    assert report["cost_usd"] == round((1000 * 1 + completion * 2) / 1000, 6)
+    assert report["max_tokens"] == {"answer": 16000}
@@ -0,0 +1,105 @@
+import io
+import os
+import shutil
+import subprocess
+
+import msgpack
+import pytest
+
+from ipc_framing import (
+    HEADER, MAX_FRAME_BYTES, pack, pack_envelope, read_frame, result_frame, unpack, write_frame,
+)
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT = {"answer": "¿Qué es RAG?", "answer2": "ok", "timings": {"embed": 1.5}, "chunks": [1, 2]}
+
+
+def frames(*messages):
+    stream = io.BytesIO()
+    for message in messages:
+        write_frame(stream, message)
+    stream.seek(0)
+    return stream
+
+
+@pytest.mark.parametrize("ipc_format", ["msgpack", "json"])
+def test_frames_round_trip(monkeypatch, ipc_format):
+    monkeypatch.setenv("IPC_FORMAT", ipc_format)
+    stream = frames({"id": "1", "op": "ask", "question": "hola"}, {"type": "ready"})
+    assert read_frame(stream) == {"id": "1", "op": "ask", "question": "hola"}
+    assert read_frame(stream) == {"type": "ready"}
+    assert read_frame(stream) is None
+
+
+def test_reader_accepts_both_formats_in_one_stream(monkeypatch):
+    stream = io.BytesIO()
+    monkeypatch.setenv("IPC_FORMAT", "json")
+    write_frame(stream, {"type": "a"})
+    monkeypatch.setenv("IPC_FORMAT", "msgpack")
+    write_frame(stream, {"type": "b"})
+    stream.seek(0)
+    assert [read_frame(stream)["type"], read_frame(stream)["type"]] == ["a", "b"]
+
+
+def test_truncated_and_oversized_frames():
+    payload = pack({"type": "ready"})
+    assert read_frame(io.BytesIO(HEADER.pack(len(payload)) + payload[:-1])) is None
+    with pytest.raises(ValueError):
+        read_frame(io.BytesIO(HEADER.pack(MAX_FRAME_BYTES + 1)))
+
+
+@pytest.mark.parametrize("ipc_format", ["msgpack", "json"])
+def test_result_frame_keeps_output_encoded(monkeypatch, ipc_format):
+    monkeypatch.setenv("IPC_FORMAT", ipc_format)
+    frame = read_frame(frames(result_frame("7", OUTPUT)))
+    assert frame["id"] == "7"
+    assert frame["timings"] == OUTPUT["timings"]
+    output = frame["output"]
+    if ipc_format == "json":
+        assert isinstance(output, str)
+        assert read_frame(io.BytesIO(HEADER.pack(len(output.encode())) + output.encode())) == OUTPUT
+    else:
+        assert unpack(output) == OUTPUT
+
+
+def test_pack_envelope_embeds_packed_output():
+    body = pack_envelope({"success": True, "question": "q"}, "response", pack(OUTPUT))
+    assert msgpack.unpackb(body, raw=False) == {"success": True, "question": "q", "response": OUTPUT}
+
+
+def node_ipc_format():
+    if shutil.which("node") is None:
+        return None
+    script = "console.log(require('./src/services/ipcFraming').IPC_ENV.IPC_FORMAT)"
+    done = subprocess.run(["node", "-e", script], cwd=API_DIR, capture_output=True, text=True)
+    return done.stdout.strip() or None
+
+
+# Node lee los frames de Python, decodifica la salida con PackedOutput y
+# devuelve cada mensaje con encodeFrame
+NODE_ECHO = """
+const { createFrameReader, encodeFrame, PackedOutput } = require('./src/services/ipcFraming');
+const out = [];
+process.stdin.on('data', createFrameReader((message) => {
+  if (message.type === 'result') message.output = PackedOutput.fromFrame(message).decode();
+  out.push(encodeFrame(message));
+}, (error) => { throw error; }));
+process.stdin.on('end', () => process.stdout.write(Buffer.concat(out)));
+"""
+
+
+def test_node_round_trip(monkeypatch):
+    ipc_format = node_ipc_format()
+    if ipc_format is None:
+        pytest.skip("node no está disponible")
+    # Como lanza Node a los workers (IPC_ENV)
+    monkeypatch.setenv("IPC_FORMAT", ipc_format)
+    ask = {"id": "1", "op": "ask", "question": "¿hola?"}
+    sent = frames(ask, result_frame("1", OUTPUT)).getvalue()
+
+    done = subprocess.run(["node", "-e", NODE_ECHO], cwd=API_DIR, input=sent, capture_output=True, check=True)
+
+    stream = io.BytesIO(done.stdout)
+    assert read_frame(stream) == ask
+    assert read_frame(stream) == {"id": "1", "type": "result", "timings": OUTPUT["timings"], "output": OUTPUT}
+    assert read_frame(stream) is None
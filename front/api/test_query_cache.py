@@ -0,0 +1,57 @@
+from query_cache import CachedQueryEmbeddings, QueryEmbeddingCache, cache_key, normalize_question
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 0.5]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def make_cache(tmp_path, **kwargs):
+    return QueryEmbeddingCache(path=str(tmp_path / "query.sqlite"), **kwargs)
+
+
+def test_normalize_question():
+    assert normalize_question("  ¿Qué   es RAG? ") == "qué es rag"
+    assert cache_key("m", "What is RAG?") == cache_key("m", "what is rag")
+    assert cache_key("m", "what is rag") != cache_key("other-model", "what is rag")
+
+
+def test_near_identical_questions_embed_once(tmp_path):
+    embeddings = CountingEmbeddings()
+    cached = CachedQueryEmbeddings(embeddings, "m", make_cache(tmp_path))
+    first = cached.embed_query("What is RAG?")
+    assert cached.embed_query("  what is rag ") == first
+    assert embeddings.calls == 1
+    assert cached.cache.stats()["memory_hits"] == 1
+
+
+def test_disk_level_is_shared_between_instances(tmp_path):
+    make_cache(tmp_path).put("k", [1.0, 2.0])
+    other = make_cache(tmp_path)
+    assert other.get("k") == [1.0, 2.0]
+    assert other.get("k") == [1.0, 2.0]
+    stats = other.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_memory_lru_and_disk_eviction(tmp_path):
+    # Cada vector de 2 floats son 8 bytes: caben dos en disco
+    cache = make_cache(tmp_path, memory_size=1, max_bytes=16)
+    cache.put("a", [1.0, 1.0])
+    cache.put("b", [2.0, 2.0])
+    assert list(cache.memory) == ["b"]
+    cache.get("a")  # "a" pasa a ser la más reciente en disco
+    cache.put("c", [3.0, 3.0])
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["disk_entries"] == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0, 1.0]
@@ -0,0 +1,76 @@
+from langchain_core.documents import Document
+
+from rerank import VECTOR_KEY, mmr_select, rerank, rerank_settings, trim_overlaps
+from vector_search import rrf_fuse
+
+
+def doc(chunk_id, text="", **metadata):
+    return Document(page_content=text or chunk_id, metadata={"chunk_id": chunk_id, **metadata})
+
+
+def test_rrf_rewards_chunks_found_by_both_searches():
+    vector = [doc("a", distance=0.1), doc("b", distance=0.2), doc("c", distance=0.3)]
+    text = [doc("c", text_score=9), doc("d", text_score=5)]
+
+    fused = rrf_fuse([vector, text], [1.0, 1.0], k=3)
+
+    assert [d.metadata["chunk_id"] for d in fused] == ["c", "a", "b"]
+    # El chunk de las dos listas junta los metadatos de ambas
+    assert fused[0].metadata["distance"] == 0.3
+    assert fused[0].metadata["text_score"] == 9
+    assert fused[0].metadata["rrf_score"] == round(1 / 63 + 1 / 61, 6)
+
+
+def test_rrf_weights_favor_one_list():
+    vector = [doc("a"), doc("b")]
+    text = [doc("b"), doc("a")]
+    assert rrf_fuse([vector, text], [1.0, 0.2], k=1)[0].metadata["chunk_id"] == "a"
+    assert rrf_fuse([vector, text], [0.2, 1.0], k=1)[0].metadata["chunk_id"] == "b"
+
+
+def test_mmr_prefers_diverse_chunks_and_drops_duplicates():
+    query = [1.0, 0.0, 0.0]
+    vectors = [
+        [1.0, 0.0, 0.0],    # el más relevante
+        [0.99, 0.01, 0.0],  # casi idéntico al primero
+        [0.8, 0.6, 0.0],    # relevante y distinto
+        [0.0, 0.0, 1.0],    # irrelevante
+    ]
+    selected, duplicates = mmr_select(query, vectors, k=3, lambda_mult=0.7, dedup_threshold=0.95)
+    assert selected[:2] == [0, 2]
+    assert 1 not in selected
+    assert duplicates == 1
+
+
+def test_mmr_lambda_one_is_plain_relevance_order():
+    query = [1.0, 0.0]
+    vectors = [[0.6, 0.8], [1.0, 0.0], [0.8, 0.6]]
+    selected, _ = mmr_select(query, vectors, k=3, lambda_mult=1.0, dedup_threshold=1.1)
+    assert selected == [1, 2, 0]
+
+
+def test_mmr_accepts_rrf_relevance():
+    vectors = [[1.0, 0.0], [0.0, 1.0]]
+    selected, _ = mmr_select([1.0, 0.0], vectors, k=1, relevance=[0.01, 0.03])
+    assert selected == [1]
+
+
+def test_trim_overlaps_removes_repeated_prefix():
+    shared = "x" * 50
+    first = doc("a", "start of the chunk " + shared, source="f.pdf")
+    second = doc("b", shared + " rest of the next chunk", source="f.pdf")
+    other = doc("c", shared + " other file", source="g.pdf")
+
+    assert trim_overlaps([first, second, other], max_chars=300) == 1
+    assert second.page_content == "rest of the next chunk"
+    assert second.metadata["overlap_trimmed"] == 50
+    assert other.page_content.startswith(shared)
+
+
+def test_rerank_without_vectors_keeps_the_order(monkeypatch):
+    monkeypatch.delenv("RETRIEVAL_MMR_LAMBDA", raising=False)
+    docs = [doc("a"), doc("b", **{VECTOR_KEY: [1.0, 0.0]})]
+    chosen, stats = rerank([1.0, 0.0], docs, 1, rerank_settings())
+    assert [d.metadata["chunk_id"] for d in chosen] == ["a"]
+    assert stats == {"candidates": 2, "duplicates": 0, "trimmed": 0}
+    assert VECTOR_KEY not in docs[1].metadata
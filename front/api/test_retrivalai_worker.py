@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+from ipc_framing import read_frame, unpack, write_frame
+from retrivalai import LateUpdateGate
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_gate_holds_update_until_release():
+    sent = []
+    gate = LateUpdateGate(sent.append)
+    gate({"answer2": "late"})
+    assert sent == []
+    gate.release()
+    assert sent == [{"answer2": "late"}]
+    gate({"answer2": "later"})
+    assert sent[-1] == {"answer2": "later"}
+
+
+def test_gate_release_without_update_sends_nothing():
+    sent = []
+    gate = LateUpdateGate(sent.append)
+    gate.release()
+    assert sent == []
+
+
+def test_worker_sends_result_before_its_late_update(tmp_path):
+    env = dict(
+        os.environ, RETRIEVAL_FAKE_BACKENDS="1", ANSWER_CACHE="0",
+        ANSWER2_MODE="partial", ANSWER2_GRACE_S="0", FAKE_JITTER="0.5",
+        FAKE_EMBED_LATENCY_MS="0", FAKE_SEARCH_LATENCY_MS="0", FAKE_CHAT_LATENCY_MS="20",
+        QUERY_CACHE_PATH=str(tmp_path / "query.sqlite"), TRACE_LOG_PATH=str(tmp_path / "trace.jsonl"),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "retrivalai.py", "--worker"], cwd=API_DIR, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        assert read_frame(proc.stdout)["type"] == "ready"
+        questions = 20
+        for i in range(questions):
+            write_frame(proc.stdin, {"id": str(i), "op": "ask", "question": f"question {i}"})
+
+        results, pending, updates = set(), set(), 0
+        while len(results) < questions or updates < len(pending):
+            frame = read_frame(proc.stdout)
+            if frame["type"] == "result":
+                results.add(frame["id"])
+                if unpack(frame["output"])["answer2_status"] == "pending":
+                    pending.add(frame["id"])
+            elif frame["type"] == "update":
+                assert frame["id"] in results, "update sent before its result"
+                updates += 1
+            else:
+                raise AssertionError(frame)
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=10)
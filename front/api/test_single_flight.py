@@ -0,0 +1,108 @@
+import asyncio
+import threading
+
+import pytest
+
+from chat_service import ChatService, service_settings
+from single_flight import SingleFlight, flight_key
+
+
+def test_flight_key_normalizes_the_question():
+    assert flight_key("acme", "  ¿What is RAG? ", "ask") == flight_key("acme", "what is   rag", "ask")
+    assert flight_key("acme", "what is rag", "ask") != flight_key("other", "what is rag", "ask")
+    assert flight_key("acme", "what is rag", "ask") != flight_key("acme", "what is rag", "stream")
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        flights = SingleFlight()
+        runs = []
+        release = asyncio.Event()
+
+        async def start(flight):
+            runs.append(1)
+            flight.emit("answer", "hel")
+            await release.wait()
+            flight.emit("answer", "lo")
+            return "hello"
+
+        leader_tokens, follower_tokens = [], []
+        leader = asyncio.ensure_future(flights.run("k", start, lambda f, t: leader_tokens.append(t)))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.run("k", start, lambda f, t: follower_tokens.append(t)))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await leader == ("hello", False)
+        assert await follower == ("hello", True)
+        assert runs == [1]
+        # El que se une tarde recibe primero los tokens ya emitidos
+        assert leader_tokens == follower_tokens == ["hel", "lo"]
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_followers_get_the_leader_error_and_the_key_is_freed():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fail(flight):
+            await release.wait()
+            raise RuntimeError("llm down")
+
+        waiting = [asyncio.ensure_future(flights.run("k", fail)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        for task in waiting:
+            with pytest.raises(RuntimeError):
+                await task
+
+        async def ok(flight):
+            return "ok"
+
+        assert await flights.run("k", ok) == ("ok", False)
+
+    asyncio.run(scenario())
+
+
+class BlockingEngine:
+    """timed_answer espera a `release` para que las preguntas coincidan en el tiempo."""
+
+    costumer = "DEFAULT"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def init_engine(self):
+        pass
+
+    def timed_answer(self, question, request_id, on_late_answer2, on_token):
+        self.calls.append(request_id)
+        self.release.wait(5)
+        return {"answer": question}
+
+
+def test_same_question_from_different_tenants_is_not_shared(monkeypatch):
+    monkeypatch.delenv("CHAT_COALESCE", raising=False)
+
+    async def scenario():
+        engine = BlockingEngine()
+        service = ChatService(engine, service_settings())
+        await service.start(None)
+        asks = [
+            asyncio.ensure_future(service.ask("What is RAG?", "r1", tenant="acme")),
+            asyncio.ensure_future(service.ask("what is rag", "r2", tenant="acme")),
+            asyncio.ensure_future(service.ask("What is RAG?", "r3", tenant="other")),
+        ]
+        await asyncio.sleep(0.1)
+        engine.release.set()
+        results = await asyncio.gather(*asks)
+        service.executor.shutdown()
+        return engine, results
+
+    engine, results = asyncio.run(scenario())
+    assert sorted(engine.calls) == ["r1", "r3"]
+    assert [coalesced for _, coalesced in results] == [False, True, False]
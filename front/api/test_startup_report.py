@@ -0,0 +1,23 @@
+import json
+import os
+import subprocess
+import sys
+
+from startup_report import API_DIR, DEFAULT_FORBID, eager_imports
+
+BACKEND_DIR = os.environ["BACKEND_DIR"]
+
+
+def test_eager_imports_match_by_prefix():
+    modules = ["json", "langchain_core.documents", "oracledb.base_impl", "ocib", "numpy.core"]
+    assert eager_imports(modules, ["langchain", "oracledb", "numpy"]) == ["langchain_core", "numpy", "oracledb"]
+
+
+def test_import_retrivalai_does_not_load_heavy_packages():
+    # Proceso limpio: lo que ya haya importado pytest no cuenta
+    code = "import json, sys, retrivalai; print(json.dumps(sorted(sys.modules)))"
+    env = dict(os.environ, BACKEND_DIR=BACKEND_DIR)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=API_DIR, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    loaded = json.loads(proc.stdout.splitlines()[-1])
+    assert eager_imports(loaded, DEFAULT_FORBID.split(",")) == []
@@ -0,0 +1,171 @@
+# ----------------------------------------
+# Búsqueda vectorial sobre MY_DEMO
+#
+# Sustituye al retriever de OracleVS para poder elegir el modo de
+# búsqueda por cliente (.env_<COSTUMER>):
+#   RETRIEVAL_SEARCH_MODE=approx     approx (usa el índice HNSW/IVF) | exact
+#   RETRIEVAL_TARGET_ACCURACY=       % objetivo en approx (vacío = el del índice)
+#   RETRIEVAL_K=5                    chunks que se devuelven
+# La tabla tiene el formato de OracleVS: id, text, metadata, embedding.
+#
+# Búsqueda híbrida (RETRIEVAL_HYBRID=1): además de la vectorial se consulta
+# el índice Oracle Text de MY_DEMO (dbai/text_index.py, lo mantiene la
+# ingesta) con los términos de la pregunta, y ambas listas se combinan con
+# reciprocal rank fusion: score = sum(peso / (RETRIEVAL_RRF_K + posición)).
+#   RETRIEVAL_HYBRID_CANDIDATES=20   candidatos de cada lista antes de fusionar
+#   RETRIEVAL_RRF_K=60
+#   RETRIEVAL_VECTOR_WEIGHT=1.0
+#   RETRIEVAL_TEXT_WEIGHT=1.0
+# Si el índice de texto no existe se sigue sólo con la vectorial.
+#
+# RETRIEVAL_MMR=1 trae además los embeddings de los candidatos para el
+# re-ranking por diversidad de rerank.py.
+# ----------------------------------------
+import array
+import json
+import os
+import re
+import sys
+
+import oracledb
+from langchain_core.documents import Document
+
+from dbpool import connection
+
+
+def search_settings():
+    accuracy = os.getenv("RETRIEVAL_TARGET_ACCURACY")
+    return {
+        "mode": os.getenv("RETRIEVAL_SEARCH_MODE", "approx").lower(),
+        "accuracy": int(accuracy) if accuracy else None,
+        "k": int(os.getenv("RETRIEVAL_K", "5")),
+        "hybrid": os.getenv("RETRIEVAL_HYBRID", "0") == "1",
+        "mmr": os.getenv("RETRIEVAL_MMR", "0") == "1",
+        "candidates": int(os.getenv("RETRIEVAL_HYBRID_CANDIDATES", "20")),
+        "rrf_k": int(os.getenv("RETRIEVAL_RRF_K", "60")),
+        "vector_weight": float(os.getenv("RETRIEVAL_VECTOR_WEIGHT", "1.0")),
+        "text_weight": float(os.getenv("RETRIEVAL_TEXT_WEIGHT", "1.0")),
+    }
+
+
+def _search_sql(table_name, mode, accuracy, with_vectors=False):
+    if mode == "exact":
+        fetch = "FETCH EXACT FIRST :k ROWS ONLY"
+    else:
+        fetch = "FETCH APPROX FIRST :k ROWS ONLY"
+        if accuracy:
+            fetch += f" WITH TARGET ACCURACY {int(accuracy)}"
+    return f"""
+        SELECT text, metadata, VECTOR_DISTANCE(embedding, :query_vector, DOT) AS distance{_VECTOR_COLUMN if with_vectors else ""}
+        FROM {table_name}
+        ORDER BY distance
+        {fetch}"""
+
+
+def _read(value):
+    return value.read() if hasattr(value, "read") else value
+
+
+# Con with_vectors el embedding de cada chunk viaja en metadata["_embedding"]
+# hasta rerank.py, que lo quita antes de que llegue a la salida
+_VECTOR_COLUMN = ", embedding"
+
+
+def _documents(rows, score_key):
+    docs = []
+    for text, metadata, score, *vector in rows:
+        metadata = _read(metadata)
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        doc = Document(page_content=_read(text), metadata=dict(metadata or {}))
+        doc.metadata[score_key] = float(score)
+        if vector:
+            doc.metadata["_embedding"] = vector[0]
+        docs.append(doc)
+    return docs
+
+
+def search_chunks(pool, table_name, query_vector, k, mode="approx", accuracy=None, with_vectors=False):
+    with connection(pool) as conn:
+        with conn.cursor() as cursor:
+            cursor.setinputsizes(query_vector=oracledb.DB_TYPE_VECTOR)
+            cursor.execute(
+                _search_sql(table_name, mode, accuracy, with_vectors),
+                query_vector=array.array("f", query_vector),
+                k=k,
+            )
+            rows = cursor.fetchall()
+    return _documents(rows, "distance")
+
+
+# ---- Búsqueda léxica (Oracle Text) ----
+# Mismos caracteres que TEXT_INDEX_PRINTJOINS: S_CONTACT y ORA-01418 son un solo término
+_TERM = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-]*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or that the "
+    "this to what when where which who why with you your".split()
+)
+_text_index_missing = False
+
+
+def text_query(question, max_terms=24):
+    """Términos de la pregunta en sintaxis CONTAINS: {term}, {term}, ... (ACCUM)."""
+    terms = []
+    for term in _TERM.findall(question):
+        term = term.strip("-_")
+        if len(term) > 1 and term.lower() not in _STOPWORDS and term.lower() not in terms:
+            terms.append(term.lower())
+    return ", ".join(f"{{{term}}}" for term in terms[:max_terms]) or None
+
+
+def search_text(pool, table_name, question, k, with_vectors=False):
+    global _text_index_missing
+    query = text_query(question)
+    if query is None or _text_index_missing:
+        return []
+    try:
+        with connection(pool) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT text, metadata, SCORE(1) AS score{_VECTOR_COLUMN if with_vectors else ""}
+                    FROM {table_name}
+                    WHERE CONTAINS(text, :query, 1) > 0
+                    ORDER BY score DESC
+                    FETCH FIRST :k ROWS ONLY""",
+                    query=query,
+                    k=k,
+                )
+                rows = cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        # La parte léxica nunca tumba la pregunta: se sigue sólo con la vectorial.
+        # DRG-10599 (la columna no tiene índice CONTEXT) no se reintenta en este proceso
+        if "DRG-10599" in str(e):
+            _text_index_missing = True
+        print(f"⚠️ Text search on {table_name} failed, using vector results only: {e}", file=sys.stderr)
+        return []
+    return _documents(rows, "text_score")
+
+
+def _doc_key(doc):
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def rrf_fuse(ranked_lists, weights, k, rrf_k=60):
+    """Reciprocal rank fusion de varias listas de Documents ya ordenadas."""
+    fused = {}
+    for docs, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(docs, start=1):
+            key = _doc_key(doc)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = [0.0, doc]
+            else:
+                # Mismo chunk en las dos listas: se juntan distance y text_score
+                entry[1].metadata.update(doc.metadata)
+            entry[0] += weight / (rrf_k + rank)
+
+    best = sorted(fused.values(), key=lambda entry: entry[0], reverse=True)[:k]
+    for score, doc in best:
+        doc.metadata["rrf_score"] = round(score, 6)
+    return [doc for _, doc in best]
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 import os
 import json
+import time
 import hashlib
+import msgpack
 import requests
 import pandas as pd
 import streamlit as st
@@ -9,6 +11,8 @@ import subprocess
 from streamlit_chat import message  # Importamos la librería para mensajes de chat con estilo
 
 # === Utilidad para cargar archivo .env ===
+# Cacheada: no se relee en cada rerun (se limpia al reescribir el .env)
+@st.cache_data
 def cargar_env(path="/app/backend/.env"):
     if not os.path.exists(path):
         return {}
@@ -39,6 +43,7 @@ ICON_FEEDBACK_JSON   = "feedback/fback_icon.json"
 def hash_password(pw: str) -> str:
     return hashlib.sha256(pw.encode()).hexdigest()
 
+@st.cache_data
 def load_users() -> dict:
     if os.path.exists(CREDENTIALS_PATH):
         return json.load(open(CREDENTIALS_PATH))
@@ -47,12 +52,37 @@ def load_users() -> dict:
 def save_users(users: dict):
     os.makedirs(os.path.dirname(CREDENTIALS_PATH), exist_ok=True)
     json.dump(users, open(CREDENTIALS_PATH, "w"), indent=2)
+    load_users.clear()
 
-# Ensure default admin exists
-users = load_users()
-if "admin" not in users:
-    users["admin"] = hash_password("admin")
-    save_users(users)
+# Ensure default admin exists (una vez por proceso, no en cada rerun)
+@st.cache_resource
+def ensure_default_admin():
+    users = load_users()
+    if "admin" not in users:
+        users["admin"] = hash_password("admin")
+        save_users(users)
+
+ensure_default_admin()
+
+# === Detección del cliente (COSTUMER en /app/marketplace/) ===
+# El archivo se escribe al arrancar el contenedor: se lee una vez por proceso
+@st.cache_resource
+def detectar_costumer():
+    marketplace_dir = "/app/marketplace/"
+    try:
+        files = [f for f in os.listdir(marketplace_dir) if os.path.isfile(os.path.join(marketplace_dir, f))]
+        if files:
+            costumer_file = os.path.join(marketplace_dir, files[0])
+        else:
+            costumer_file = "/app/marketplace/oracle"
+    except Exception:
+        costumer_file = "/app/marketplace/oracle"
+    if os.path.exists(costumer_file):
+        with open(costumer_file) as f:
+            for line in f:
+                if line.startswith("COSTUMER="):
+                    return line.strip().split("=", 1)[1]
+    return "default"
 
 # === Authentication flow ===
 if "authenticated" not in st.session_state:
@@ -88,46 +118,56 @@ with st.sidebar:
         unsafe_allow_html=True
     )
 
+    # Cada sección es un fragment: enviarla sólo vuelve a ejecutar esa parte
     st.markdown("## ⚙️ Account Settings")
-    with st.expander("🔑 Change Password"):
-        with st.form("change_password_form"):
-            current_pw = st.text_input("Current password", type="password")
-            new_pw     = st.text_input("New password", type="password")
-            confirm_pw = st.text_input("Confirm new password", type="password")
-            if st.form_submit_button("Submit"):
-                users = load_users()
-                uname = st.session_state.username
-                if users.get(uname) != hash_password(current_pw):
-                    st.error("Current password is incorrect.")
-                elif new_pw != confirm_pw:
-                    st.error("New passwords do not match.")
-                else:
-                    users[uname] = hash_password(new_pw)
-                    save_users(users)
-                    st.success("Password updated successfully!")
 
+    @st.fragment
+    def change_password():
+        with st.expander("🔑 Change Password"):
+            with st.form("change_password_form"):
+                current_pw = st.text_input("Current password", type="password")
+                new_pw     = st.text_input("New password", type="password")
+                confirm_pw = st.text_input("Confirm new password", type="password")
+                if st.form_submit_button("Submit"):
+                    users = load_users()
+                    uname = st.session_state.username
+                    if users.get(uname) != hash_password(current_pw):
+                        st.error("Current password is incorrect.")
+                    elif new_pw != confirm_pw:
+                        st.error("New passwords do not match.")
+                    else:
+                        users[uname] = hash_password(new_pw)
+                        save_users(users)
+                        st.success("Password updated successfully!")
+
+    change_password()
 
     # Feedback Section
     st.markdown("## 📝 Feedback")
-    fb_text = st.text_area("What would you improve?", height=100, key="feedback_area")
-    if st.button("Submit Feedback", key="feedback_button"):
-        if fb_text.strip():
-            entry = {
-                "username":  st.session_state.username,
-                "feedback":  fb_text.strip()
-            }
-            pd.DataFrame([entry]).to_csv(
-                GENERAL_FEEDBACK_CSV,
-                mode="a",
-                header=not os.path.exists(GENERAL_FEEDBACK_CSV),
-                index=False
-            )
-            arr = json.load(open(GENERAL_FEEDBACK_JSON)) if os.path.exists(GENERAL_FEEDBACK_JSON) else []
-            arr.append(entry)
-            json.dump(arr, open(GENERAL_FEEDBACK_JSON, "w"), indent=2)
-            st.success("✅ Thank you for your feedback!")
-        else:
-            st.warning("Please enter feedback before submitting.")
+
+    @st.fragment
+    def general_feedback():
+        fb_text = st.text_area("What would you improve?", height=100, key="feedback_area")
+        if st.button("Submit Feedback", key="feedback_button"):
+            if fb_text.strip():
+                entry = {
+                    "username":  st.session_state.username,
+                    "feedback":  fb_text.strip()
+                }
+                pd.DataFrame([entry]).to_csv(
+                    GENERAL_FEEDBACK_CSV,
+                    mode="a",
+                    header=not os.path.exists(GENERAL_FEEDBACK_CSV),
+                    index=False
+                )
+                arr = json.load(open(GENERAL_FEEDBACK_JSON)) if os.path.exists(GENERAL_FEEDBACK_JSON) else []
+                arr.append(entry)
+                json.dump(arr, open(GENERAL_FEEDBACK_JSON, "w"), indent=2)
+                st.success("✅ Thank you for your feedback!")
+            else:
+                st.warning("Please enter feedback before submitting.")
+
+    general_feedback()
 
 # === FORMULARIO DE CONFIGURACIÓN DE ENTORNO ===
 with st.expander("📦 VECTOR DATABASE CONFIGURATION", expanded=False):
@@ -138,23 +178,8 @@ with st.expander("📦 VECTOR DATABASE CONFIGURATION", expanded=False):
         submitted = st.form_submit_button("🚀 CREATE DATABASE")
 
         if submitted:
-            # Leer COSTUMER desde archivo dinámico en /app/marketplace/
-            marketplace_dir = "/app/marketplace/"
-            costumer = "default"
-            costumer_filename = None
-            try:
-                files = [f for f in os.listdir(marketplace_dir) if os.path.isfile(os.path.join(marketplace_dir, f))]
-                if files:
-                    costumer_filename = files[0]
-                    costumer_file = os.path.join(marketplace_dir, costumer_filename)
-                    with open(costumer_file) as f:
-                        for line in f:
-                            if line.startswith("COSTUMER="):
-                                costumer = line.strip().split("=", 1)[1]
-                                break
-            except Exception:
-                costumer_file = "/app/marketplace/oracle"
-            # costumer_file ahora apunta al archivo dinámico
+            # COSTUMER desde el archivo dinámico en /app/marketplace/
+            costumer = detectar_costumer()
 
             env_filename = f".env_{costumer}"
             env_path = f"/app/backend/{env_filename}"
@@ -173,6 +198,7 @@ IP={ip}
             try:
                 with open(env_path, "w") as f:
                     f.write(env_content)
+                cargar_env.clear()
 
                 st.success(f"✅ Parameters updated in:\n{env_path}")
                 st.code(env_content, language="bash")
@@ -195,86 +221,74 @@ IP={ip}
                 st.error(f"❌ Error writing .env: {e}")
 
 # === CARGAR .env dinámicamente desde .env_<COSTUMER> ===
-def detectar_costumer():
-    marketplace_dir = "/app/marketplace/"
-    try:
-        files = [f for f in os.listdir(marketplace_dir) if os.path.isfile(os.path.join(marketplace_dir, f))]
-        if files:
-            costumer_file = os.path.join(marketplace_dir, files[0])
-        else:
-            costumer_file = "/app/marketplace/oracle"
-    except Exception:
-        costumer_file = "/app/marketplace/oracle"
-    if os.path.exists(costumer_file):
-        with open(costumer_file) as f:
-            for line in f:
-                if line.startswith("COSTUMER="):
-                    return line.strip().split("=", 1)[1]
-    return "default"
-
 costumer = detectar_costumer()
 env_path = f"/app/backend/.env_{costumer}"
-env_vars = cargar_env(env_path)
 
 # === UPLOAD PDFS + EMBEDDING + DELETE DB ===
-with st.expander("📄 UPLOAD & PROCESS PDFs", expanded=False):
-    if not env_vars.get("VOLUME_PATH"):
-        st.warning("⚠️ No VOLUME_PATH found in {env_path}")
-    else:
-        uploaded_files = st.file_uploader(
-            "Upload your PDF files to be indexed",
-            type=["pdf"],
-            accept_multiple_files=True
-        )
-
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            if st.button("📥 Upload PDFs", help="Upload selected PDF files"):
-                if uploaded_files:
-                    path_destino = env_vars["VOLUME_PATH"]
-                    os.makedirs(path_destino, exist_ok=True)
-                    success_files = []
-                    for file in uploaded_files:
-                        with open(os.path.join(path_destino, file.name), "wb") as f:
-                            f.write(file.read())
-                        success_files.append(file.name)
-                    st.success(f"✅ Uploaded {len(success_files)} files: {', '.join(success_files[:3])}{'...' if len(success_files) > 3 else ''}")
-                else:
-                    st.warning("No files selected for upload.")
-
-        with col2:
-            if st.button("🧠 Embed PDFs", help="Process and embed PDFs into vector database"):
-                try:
-                    with st.spinner("Processing PDFs..."):
-                        result = subprocess.run(
-                            ["/bin/bash", "/app/backend/trigger_embed.py"],
-                            capture_output=True, text=True, check=True
-                        )
-                    st.success("✅ PDFs embedded successfully!")
-                    with st.expander("View processing output"):
-                        st.text(result.stdout)
-                        if result.stderr:
-                            st.text("Errors:")
-                            st.text(result.stderr)
-                except subprocess.CalledProcessError as e:
-                    st.error(f"❌ Error during embedding:\n{e.stderr}")
+# Fragment: subir archivos o pulsar sus botones no vuelve a pintar el chat
+@st.fragment
+def upload_section():
+    env_vars = cargar_env(env_path)
+    with st.expander("📄 UPLOAD & PROCESS PDFs", expanded=False):
+        if not env_vars.get("VOLUME_PATH"):
+            st.warning("⚠️ No VOLUME_PATH found in {env_path}")
+        else:
+            uploaded_files = st.file_uploader(
+                "Upload your PDF files to be indexed",
+                type=["pdf"],
+                accept_multiple_files=True
+            )
 
-        with col3:
-            if st.button("🗑️ Delete Database", help="Delete the current vector database"):
-                try:
-                    with st.spinner("Deleting database..."):
-                        result = subprocess.run(
-                            ["/bin/bash", "/app/backend/delete.sh"],
-                            capture_output=True, text=True, check=True
-                        )
-                    st.success("✅ Database deleted successfully!")
-                    with st.expander("View deletion output"):
-                        st.text(result.stdout)
-                        if result.stderr:
-                            st.text("Errors:")
-                            st.text(result.stderr)
-                except subprocess.CalledProcessError as e:
-                    st.error(f"❌ Error during deletion:\n{e.stderr}")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if st.button("📥 Upload PDFs", help="Upload selected PDF files"):
+                    if uploaded_files:
+                        path_destino = env_vars["VOLUME_PATH"]
+                        os.makedirs(path_destino, exist_ok=True)
+                        success_files = []
+                        for file in uploaded_files:
+                            with open(os.path.join(path_destino, file.name), "wb") as f:
+                                f.write(file.read())
+                            success_files.append(file.name)
+                        st.success(f"✅ Uploaded {len(success_files)} files: {', '.join(success_files[:3])}{'...' if len(success_files) > 3 else ''}")
+                    else:
+                        st.warning("No files selected for upload.")
+
+            with col2:
+                if st.button("🧠 Embed PDFs", help="Process and embed PDFs into vector database"):
+                    try:
+                        with st.spinner("Processing PDFs..."):
+                            result = subprocess.run(
+                                ["/bin/bash", "/app/backend/trigger_embed.py"],
+                                capture_output=True, text=True, check=True
+                            )
+                        st.success("✅ PDFs embedded successfully!")
+                        with st.expander("View processing output"):
+                            st.text(result.stdout)
+                            if result.stderr:
+                                st.text("Errors:")
+                                st.text(result.stderr)
+                    except subprocess.CalledProcessError as e:
+                        st.error(f"❌ Error during embedding:\n{e.stderr}")
+
+            with col3:
+                if st.button("🗑️ Delete Database", help="Delete the current vector database"):
+                    try:
+                        with st.spinner("Deleting database..."):
+                            result = subprocess.run(
+                                ["/bin/bash", "/app/backend/delete.sh"],
+                                capture_output=True, text=True, check=True
+                            )
+                        st.success("✅ Database deleted successfully!")
+                        with st.expander("View deletion output"):
+                            st.text(result.stdout)
+                            if result.stderr:
+                                st.text("Errors:")
+                                st.text(result.stderr)
+                    except subprocess.CalledProcessError as e:
+                        st.error(f"❌ Error during deletion:\n{e.stderr}")
+
+upload_section()
 
 # === Initialize chat history & metadata ===
 if "history" not in st.session_state:
@@ -283,6 +297,8 @@ if "metadata" not in st.session_state:
     st.session_state.metadata = []
 if "feedback_mode" not in st.session_state:
     st.session_state.feedback_mode = {}
+if "pending_answer2" not in st.session_state:
+    st.session_state.pending_answer2 = {}
 
 # === Main title with better styling ===
 st.markdown("""
@@ -295,95 +311,197 @@ st.markdown("""
 # === Chat container with better styling ===
 chat_container = st.container()
 
-# === Capture user prompt ===
-user_prompt = st.chat_input("Type your question here...", key="chat_input")
-if user_prompt:
-    st.session_state.history.append(("user", user_prompt))
-
-    with st.spinner("💭 Thinking..."):
-        try:
-            resp = requests.post(
-                "http://localhost:5000/api/v1/chatbot",
-                json={"question": user_prompt},
-                headers={"Content-Type": "application/json"},
-                timeout=60
-            )
+# === Respuesta del backend -> historial ===
+def append_answers(parsed: dict) -> list:
+    # Extraer ambas respuestas
+    context_answer = parsed.get("answer", "No answer from context")
+    technical_answer = parsed.get("answer2", "No technical answer")
+
+    # answer2 puede llegar más tarde (ANSWER2_MODE=partial) o fallar por timeout
+    answer2_status = parsed.get("answer2_status", "ok")
+    if answer2_status == "pending":
+        technical_answer = "⏳ Still generating..."
+        if parsed.get("request_id"):
+            st.session_state.pending_answer2[len(st.session_state.history) + 1] = parsed["request_id"]
+    elif answer2_status == "failed":
+        technical_answer = f"⚠️ Not available ({parsed.get('answer2_error', 'error')})"
+
+    # Agregar ambas respuestas al historial como mensajes separados y roles distintos
+    st.session_state.history.append(("assistant", f"·Well-founded Answer:\n{context_answer}"))
+    st.session_state.history.append(("assistant2", f"·Free-form Answer:\n{technical_answer}"))
+    return parsed.get("retrieved_chunks_metadata", [])
+
+# === Streaming SSE: pinta los tokens a medida que llegan ===
+CHATBOT_URL = "http://localhost:5000/api/v1/chatbot"
+USE_STREAMING = os.getenv("CHATBOT_STREAMING", "1") != "0"
+
+def stream_answers(question: str) -> dict:
+    boxes = {"answer": st.empty(), "answer2": st.empty()}
+    titles = {"answer": "·Well-founded Answer:", "answer2": "·Free-form Answer:"}
+    texts = {"answer": "", "answer2": ""}
+    boxes["answer"].info("💭 Thinking...")
+
+    # Sin timeout de lectura total: sólo entre fragmentos
+    try:
+        with requests.post(f"{CHATBOT_URL}/stream", json={"question": question},
+                           stream=True, timeout=(10, 240)) as resp:
             resp.raise_for_status()
-            payload = resp.json()
-            raw_response = payload.get("response", "")
-            try:
-                parsed = json.loads(raw_response)
-                # Extraer ambas respuestas
-                context_answer = parsed.get("answer", "No answer from context")
-                technical_answer = parsed.get("answer2", "No technical answer")
-                meta_chunks = parsed.get("retrieved_chunks_metadata", [])
-                
-                # Agregar ambas respuestas al historial como mensajes separados y roles distintos
-                st.session_state.history.append(("assistant", f"·Well-founded Answer:\n{context_answer}"))
-                st.session_state.history.append(("assistant2", f"·Free-form Answer:\n{technical_answer}"))
-                
-            except json.JSONDecodeError:
-                bot_answer = raw_response
-                meta_chunks = []
+            event = None
+            for line in resp.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event == "token":
+                        field = data.get("field", "answer")
+                        texts[field] += data.get("text", "")
+                        boxes[field].markdown(f"**{titles[field]}**\n\n{texts[field]}▌")
+                    elif event == "done":
+                        return data
+                    elif event == "error":
+                        raise RuntimeError(data.get("message", "streaming error"))
+        raise RuntimeError("Stream closed before completion")
+    finally:
+        # La respuesta completa se pinta en el historial en esta misma ejecución
+        for box in boxes.values():
+            box.empty()
+
+# === Pregunta -> backend -> historial ===
+def ask(question: str):
+    st.session_state.history.append(("user", question))
+
+    if USE_STREAMING:
+        try:
+            meta_chunks = append_answers(stream_answers(question))
         except Exception as e:
-            bot_answer = f"❌ Error: {str(e)}"
+            st.session_state.history.append(("assistant", f"❌ Error: {str(e)}"))
             meta_chunks = []
+    else:
+        with st.spinner("💭 Thinking..."):
+            try:
+                # msgpack: la salida de retrivalai llega como map, sin JSON dentro de JSON
+                resp = requests.post(
+                    CHATBOT_URL,
+                    json={"question": question},
+                    headers={"Content-Type": "application/json", "Accept": "application/msgpack"},
+                    timeout=60
+                )
+                resp.raise_for_status()
+                payload = msgpack.unpackb(resp.content, raw=False)
+                meta_chunks = append_answers(payload.get("response") or {})
+            except Exception as e:
+                st.session_state.history.append(("assistant", f"❌ Error: {str(e)}"))
+                meta_chunks = []
 
     st.session_state.metadata = meta_chunks
-    st.rerun()
 
-# === Render chat bubbles with streamlit-chat ===
+# === Completar respuestas libres que quedaron pendientes ===
+def poll_answer2(hist_idx):
+    request_id = st.session_state.pending_answer2[hist_idx]
+    try:
+        late = requests.get(f"{CHATBOT_URL}/answer2/{request_id}", timeout=5).json()
+    except Exception:
+        return False
+    status = late.get("answer2_status", "pending")
+    if status == "pending":
+        return False
+    if status == "ok":
+        text = late.get("answer2", "")
+    else:
+        text = f"⚠️ Not available ({late.get('answer2_error', 'error')})"
+    st.session_state.history[hist_idx] = ("assistant2", f"·Free-form Answer:\n{text}")
+    del st.session_state.pending_answer2[hist_idx]
+    return True
+
+ANSWER2_POLL_S = float(os.getenv("ANSWER2_POLL_S", "3"))
+ANSWER2_WAIT_S = float(os.getenv("ANSWER2_WAIT_S", "240"))
+
+def wait_answer2(hist_idx):
+    # Como el streaming: la ejecución que hizo la pregunta espera a answer2
+    box = st.empty()
+    box.info("⏳ Free-form answer still generating...")
+    deadline = time.monotonic() + ANSWER2_WAIT_S
+    try:
+        while not poll_answer2(hist_idx) and time.monotonic() < deadline:
+            time.sleep(ANSWER2_POLL_S)
+    finally:
+        box.empty()
 
-with chat_container:
-    for idx, (role, content) in enumerate(st.session_state.history):
-        if role == "user":
-            message(content, is_user=True, key=f"user_{idx}",
-                   avatar_style="bottts-neutral", seed="Demo9")
-        elif role == "assistant":
-            message(content, key=f"assistant_{idx}",
-                   avatar_style="bottts", seed="OracleBot")
-        elif role == "assistant2":
-            message(content, key=f"assistant2_{idx}",
-                   avatar_style="bottts", seed="TechBot")
-
-        if role.startswith("assistant"):
-            # Feedback buttons with better styling
-            cols = st.columns([0.8, 0.1, 0.1])
-            with cols[1]:
-                if st.button("👍", key=f"like_{idx}", help="This response was helpful"):
-                    st.session_state.feedback_mode[idx] = "like"
-                    st.rerun()
-            with cols[2]:
-                if st.button("👎", key=f"dislike_{idx}", help="This response was not helpful"):
-                    st.session_state.feedback_mode[idx] = "dislike"
-                    st.rerun()
-
-            # Feedback form if button was clicked
-            if idx in st.session_state.feedback_mode:
-                choice = st.session_state.feedback_mode[idx]
-                st.markdown(f"**You selected:** {choice.upper()}")
-                cmnt = st.text_area("Leave your comment:", key=f"comment_{idx}")
-                if st.button("Submit feedback", key=f"submit_fb_{idx}"):
-                    q = ""
-                    if idx > 0 and st.session_state.history[idx-1][0] == "user":
-                        q = st.session_state.history[idx-1][1]
-                    record = {
-                        "username":  st.session_state.username,
-                        "question":  q,
-                        "answer":    content,
-                        "icon":      choice,
-                        "feedback":  cmnt.strip()
-                    }
-                    arr = json.load(open(ICON_FEEDBACK_JSON)) if os.path.exists(ICON_FEEDBACK_JSON) else []
-                    arr.append(record)
-                    os.makedirs(os.path.dirname(ICON_FEEDBACK_JSON), exist_ok=True)
-                    json.dump(arr, open(ICON_FEEDBACK_JSON, "w"), indent=2, ensure_ascii=False)
-                    st.success("✅ Feedback submitted!")
-                    del st.session_state.feedback_mode[idx]
-                    st.rerun()
+# === Render chat bubbles with streamlit-chat ===
+# Cada respuesta con sus botones es un fragment: 👍/👎 y el envío del
+# comentario sólo vuelven a ejecutar ese mensaje, no el script entero
+def draw_message(idx):
+    role, content = st.session_state.history[idx]
+    if role == "user":
+        message(content, is_user=True, key=f"user_{idx}",
+               avatar_style="bottts-neutral", seed="Demo9")
+    elif role == "assistant":
+        message(content, key=f"assistant_{idx}",
+               avatar_style="bottts", seed="OracleBot")
+    elif role == "assistant2":
+        message(content, key=f"assistant2_{idx}",
+               avatar_style="bottts", seed="TechBot")
+
+    if role.startswith("assistant"):
+        # Feedback buttons with better styling
+        cols = st.columns([0.8, 0.1, 0.1])
+        with cols[1]:
+            if st.button("👍", key=f"like_{idx}", help="This response was helpful"):
+                st.session_state.feedback_mode[idx] = "like"
+        with cols[2]:
+            if st.button("👎", key=f"dislike_{idx}", help="This response was not helpful"):
+                st.session_state.feedback_mode[idx] = "dislike"
+
+        # Feedback form if button was clicked
+        if idx in st.session_state.feedback_mode:
+            choice = st.session_state.feedback_mode[idx]
+            st.markdown(f"**You selected:** {choice.upper()}")
+            cmnt = st.text_area("Leave your comment:", key=f"comment_{idx}")
+            if st.button("Submit feedback", key=f"submit_fb_{idx}"):
+                q = ""
+                if idx > 0 and st.session_state.history[idx-1][0] == "user":
+                    q = st.session_state.history[idx-1][1]
+                record = {
+                    "username":  st.session_state.username,
+                    "question":  q,
+                    "answer":    content,
+                    "icon":      choice,
+                    "feedback":  cmnt.strip()
+                }
+                arr = json.load(open(ICON_FEEDBACK_JSON)) if os.path.exists(ICON_FEEDBACK_JSON) else []
+                arr.append(record)
+                os.makedirs(os.path.dirname(ICON_FEEDBACK_JSON), exist_ok=True)
+                json.dump(arr, open(ICON_FEEDBACK_JSON, "w"), indent=2, ensure_ascii=False)
+                st.success("✅ Feedback submitted!")
+                del st.session_state.feedback_mode[idx]
+                st.rerun(scope="fragment")
+
+@st.fragment
+def chat_message(idx):
+    draw_message(idx)
+
+# answer2 que quedó pendiente en una ejecución interrumpida: este mensaje
+# consulta el backend cada ANSWER2_POLL_S hasta resolverse; después cada
+# tick sólo lo repinta (sin red) hasta la siguiente ejecución completa
+@st.fragment(run_every=ANSWER2_POLL_S)
+def pending_chat_message(idx):
+    if idx in st.session_state.pending_answer2:
+        poll_answer2(idx)
+    draw_message(idx)
+
+def history_message(idx):
+    role, _ = st.session_state.history[idx]
+    if role == "user":
+        draw_message(idx)
+    elif idx in st.session_state.pending_answer2:
+        pending_chat_message(idx)
+    else:
+        chat_message(idx)
 
 # === Display retrieved-chunk metadata in expandable section ===
-if st.session_state.metadata:
+def draw_metadata():
+    if not st.session_state.metadata:
+        return
     st.markdown("---")
     with st.expander("📚 Source Documents", expanded=False):
         for chunk in st.session_state.metadata:
@@ -395,3 +513,29 @@ if st.session_state.metadata:
     with st.expander("🔍 Raw Metadata", expanded=False):
         st.json(st.session_state.metadata)
 
+# === Conversación ===
+# El historial hasta esta ejecución completa se pinta una vez, fuera del
+# fragment. Preguntar sólo vuelve a ejecutar new_exchanges, que pinta lo
+# posterior a `start` (la pregunta nueva y sus respuestas) y las fuentes:
+# el coste de una pregunta no crece con el historial.
+@st.fragment
+def new_exchanges(start):
+    messages = st.container()
+    user_prompt = st.chat_input("Type your question here...", key="chat_input")
+    with messages:
+        end = len(st.session_state.history)
+        for idx in range(start, end):
+            draw_message(idx)
+        if user_prompt:
+            ask(user_prompt)
+            for idx in range(end, len(st.session_state.history)):
+                if idx in st.session_state.pending_answer2:
+                    wait_answer2(idx)
+                draw_message(idx)
+    draw_metadata()
+
+with chat_container:
+    rendered = len(st.session_state.history)
+    for idx in range(rendered):
+        history_message(idx)
+    new_exchanges(rendered)